@@ -0,0 +1,6 @@
+#-------------------------------------------------------------------------------
+# Benchmarks of the Covid-19 package, on synthetic data in the JHU daily-report layouts
+#     python -m benchmarks.synth OUT_DIR [--scale N] [--days N]     - write synthetic daily files
+#     python -m benchmarks.bench [--scale 1 10] [--days N] [--out results.json]
+#     python -m benchmarks.bench --compare old.json new.json
+#-------------------------------------------------------------------------------
@@ -0,0 +1,151 @@
+#-------------------------------------------------------------------------------
+# This file compares the raw cache in the archive format (oveds_archive: the locations once, a file
+# of arrays per month) with the former layout (the original CSV of each date, gzipped), on the
+# synthetic daily files of benchmarks.synth:
+#     disk      - the size of the cache directory
+#     frames    - reading the whole history into DataFrames (raw.iter_days), as the cleaning does
+#     parse     - the same, with the columns and dtypes the cleaning keeps (as ingest.parse reads them)
+#     content   - rebuilding the original CSV content of every date (raw.get)
+#     add       - adding one more day to each cache (raw.add), as load_raw does every day
+# The former cache is converted with raw.convert_files (timed), and the content hash of every date
+# is checked against the original file.
+#
+# Usage:  python -m benchmarks.archive [--days N] [--scale N] [--repeat N] [--keep DIR]
+#-------------------------------------------------------------------------------
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import timedelta
+import pandas as pd
+from benchmarks import synth
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import oveds_raw as raw
+import oveds_accs as oda
+
+
+def former_cache(mirror, path):
+    """
+    Write the daily files of a mirror as a cache of the former layout (a gzipped CSV file per date)
+    :param mirror: string (directory of MM-DD-YYYY.csv files)
+    :param path: string (cache directory)
+    :return: dict {date: bytes (the original CSV content)}
+    """
+    os.makedirs(path)
+    contents = {}
+    index = {'last': None, 'dates': {}}
+    for file_name in sorted(os.listdir(mirror)):
+        the_date = pd.to_datetime(file_name[:10], format='%m-%d-%Y').date()
+        with open(os.path.join(mirror, file_name), 'rb') as file:
+            contents[the_date] = file.read()
+        gz_name = the_date.isoformat() + '.csv.gz'
+        with gzip.open(os.path.join(path, gz_name), 'wb') as file:
+            file.write(contents[the_date])
+        index['dates'][the_date.isoformat()] = {'file': gz_name, 'size': len(contents[the_date]),
+                                                'hash': raw.content_hash(contents[the_date]), 'etag': None}
+    index['last'] = max(index['dates'])
+    with open(os.path.join(path, raw.INDEX), 'w') as file:
+        json.dump(index, file, indent=1)
+    return contents
+
+
+def former_add(found, path):
+    """
+    Add daily files to a cache of the former layout, as raw.add did: a gzipped file per date, and the index
+    """
+    index = raw.read_index(path)
+    for the_date, content in found.items():
+        gz_name = the_date.isoformat() + '.csv.gz'
+        with gzip.open(os.path.join(path, gz_name), 'wb') as file:
+            file.write(content)
+        index['dates'][the_date.isoformat()] = {'file': gz_name, 'size': len(content),
+                                                'hash': raw.content_hash(content), 'etag': None}
+    index['last'] = max(index['dates'])
+    with open(os.path.join(path, raw.INDEX), 'w') as file:
+        json.dump(index, file, indent=1)
+
+
+def disk_size(path):
+    return sum(os.path.getsize(os.path.join(path, file_name)) for file_name in os.listdir(path))
+
+
+def timed(func, repeat):
+    """
+    :return: float (seconds: the best of 'repeat' runs)
+    """
+    best = None
+    for ii in range(repeat):
+        raw._month = raw._locations_read = None                     # nothing decoded yet
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the archive raw cache with gzipped daily files')
+    parser.add_argument('--days', type=int, default=500, help='number of days of synthetic data')
+    parser.add_argument('--scale', type=int, default=1, help='volume, in multiples of the real data')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each read (the best is kept)')
+    parser.add_argument('--keep', help='work in this directory, and keep it (default: a temporary one)')
+    args = parser.parse_args(argv)
+
+    work = args.keep or tempfile.mkdtemp(prefix='oveds_archive_')
+    mirror, former, archived = (os.path.join(work, name) for name in ['mirror', 'former', 'archive'])
+    for directory in [mirror, former, archived]:
+        shutil.rmtree(directory, ignore_errors=True)
+    try:
+        synth.write(mirror, args.scale, args.days)
+        contents = former_cache(mirror, former)
+        days = sorted(contents)
+        shutil.copytree(former, archived)
+        start = time.perf_counter()
+        raw.convert_files(archived)
+        convert_seconds = time.perf_counter() - start
+        hashes_ok = all(raw.content_hash(raw.get(the_date, archived)) == raw.content_hash(contents[the_date])
+                        for the_date in days)
+
+        def frames(path):
+            return lambda: [frame for the_date, frame in raw.iter_days(days, path)]
+
+        def parse(path):
+            return lambda: [frame for the_date, frame in raw.iter_days(days, path, oda.clean_columns)]
+
+        def content(path):
+            return lambda: [raw.get(the_date, path) for the_date in days]
+
+        def add(path, add_day):
+            added = []                                              # a new day after the last one, at every run
+
+            def run():
+                added.append(days[-1] + timedelta(len(added) + 1))
+                add_day({added[-1]: contents[days[-1]]}, path)
+            return run
+
+        print('%d days, %d rows a day; converted in %.1f s; content hashes %s' %
+              (len(days), len(raw.read_day(days[-1], archived)), convert_seconds, 'equal' if hashes_ok else 'DIFFER'))
+        print('%-8s %12s %12s %8s' % ('case', 'former', 'archive', 'ratio'))
+        size_former, size_archive = disk_size(former), disk_size(archived)
+        print('%-8s %9.1f MB %9.1f MB %7.1fx' % ('disk', size_former / 2**20, size_archive / 2**20,
+                                                 size_former / size_archive))
+        for name, former_read, archive_read in [('frames', frames(former), frames(archived)),
+                                                ('parse', parse(former), parse(archived)),
+                                                ('content', content(former), content(archived)),
+                                                ('add', add(former, former_add), add(archived, raw.add))]:
+            former_seconds, archive_seconds = timed(former_read, args.repeat), timed(archive_read, args.repeat)
+            print('%-8s %10.2f s %10.2f s %7.1fx' % (name, former_seconds, archive_seconds,
+                                                     former_seconds / archive_seconds))
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
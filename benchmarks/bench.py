@@ -0,0 +1,205 @@
+#-------------------------------------------------------------------------------
+# This file times the Covid-19 pipeline on synthetic data (benchmarks.synth):
+# ingestion (load_raw from a local mirror, of the daily files and of the time-series files), cleaning, store load, and each report function.
+# Every stage records wall time, CPU time, peak memory and rows; results are written
+# as JSON, so runs of different versions can be compared (--compare old.json new.json).
+# The peak memory is the growth of the peak RSS during the stage (Linux), or else the peak of the
+# traced Python allocations (tracemalloc); the 'memory' field and the reports say which.
+#-------------------------------------------------------------------------------
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import contextlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')                                               # no GUI
+from benchmarks import synth
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import oveds_accs as oda
+import oveds_func as ovf
+import oveds_data as ds
+import oveds_store as store
+import oveds_prof as prof
+
+REPORTS = [('plot_daily', {'country': 'World', 'province': '', 'option': 'Confirmed'}),
+           ('plot_daily', {'country': 'US', 'province': '', 'option': 'Deaths'}),
+           ('plot_all4', {'country': 'US'}),
+           ('stats_for_all_over', {'option': 'Deaths', 'over': 1000}),
+           ('world_per_region', {}),
+           ('by_province_region', {'country': 'US', 'option': 'Confirmed'}),
+           ('top_countries', {'top': 20, 'option': 'Deaths'}),
+           ('no_recover', {}),
+           ('all_died', {}),
+           ('all_recovered', {}),
+           ('region_report', {'lat': 40.7, 'lon': -74.0, 'km': 500, 'option': 'Deaths'}),
+           ('ranking_changes', {'top': 20, 'option': 'Deaths', 'days': 30, 'per_million': True})]
+
+MEMORY = {'rss': 'peak RSS', 'tracemalloc': 'traced allocations'}  # what the peak memory of a stage is (see measure)
+
+
+def measure(func, repeat=1):
+    """
+    Time a stage: the best of 'repeat' runs, with its peak memory.
+    Peak RSS is used where the peak mark can be reset (Linux); elsewhere the peak of
+    traced Python allocations (tracemalloc, which slows the stage down)
+    :param func: function without arguments (returns the number of rows processed, or None)
+    :param repeat: int
+    :return: dict (seconds, cpu_seconds, peak_mb, memory, rows)
+    """
+    best = None
+    for ii in range(repeat):
+        rss = prof.reset_peak_rss()
+        if rss:
+            start_mb = prof.rss_mb('VmRSS')
+        else:
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = func()
+        result = {'seconds': time.perf_counter() - wall, 'cpu_seconds': time.process_time() - cpu, 'rows': rows}
+        if rss:
+            result.update(peak_mb=max(prof.rss_mb('VmHWM') - start_mb, 0), memory='rss')
+        else:
+            result.update(peak_mb=tracemalloc.get_traced_memory()[1] / 2**20, memory='tracemalloc')
+            tracemalloc.stop()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def store_rows(path=store.STORE_DIR):
+    return sum(part['rows'] for part in store.read_manifest(path)['partitions'].values())
+
+
+def run_scale(scale, days, work_dir, repeat, out_format):
+    """
+    Run all stages at one scale
+    :return: dict {stage: measurement}
+    """
+    mirror = os.path.join(work_dir, 'synth-%dx-%s' % (scale, days or 'all'))
+    if not os.path.exists(mirror):
+        print('Generating synthetic data:', mirror)
+        synth.write(mirror + '.tmp', scale, days)
+        os.replace(mirror + '.tmp', mirror)
+    ts_mirror = mirror + '-timeseries'
+    if not os.path.exists(ts_mirror):
+        synth.write_time_series(ts_mirror + '.tmp', scale, days)
+        os.replace(ts_mirror + '.tmp', ts_mirror)
+
+    run_dir = os.path.join(work_dir, 'run-%dx' % scale)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    old_dir = os.getcwd()
+    os.chdir(run_dir)                                               # the package works in the current directory
+    try:
+        stages = {}
+        os.makedirs('timeseries')
+        os.chdir('timeseries')                                      # a raw cache of its own
+        stages['ingest_timeseries'] = measure(lambda: oda.load_raw(source=ts_mirror, source_type='timeseries')
+                                              and None)
+        os.chdir(run_dir)
+        stages['ingest'] = measure(lambda: oda.load_raw(source=mirror) and None)
+        stages['clean'] = measure(lambda: oda.clean_data(incremental=False, workers=1) or store_rows())
+        if (os.cpu_count() or 1) > 1:
+            stages['clean_parallel'] = measure(lambda: oda.clean_data(incremental=False, workers=os.cpu_count())
+                                               or store_rows())
+        stages['store_load'] = measure(lambda: len(store.read()), repeat)
+        stages['store_load_projected'] = measure(
+            lambda: len(store.read(['Date', 'Confirmed', 'Deaths'], countries=['US'])), repeat)
+        stages['dataset_open'] = measure(lambda: sum(len(ds.Dataset().cube(level)) for level in
+                                                     ['world', 'country', 'province']), repeat)
+
+        data = ds.Dataset()
+        data.cube('world'), data.cube('country'), data.cube('province')
+        oda.output_dir = os.path.join(run_dir, 'reports')
+        oda.output_format = out_format
+        os.makedirs(oda.output_dir)
+        for report, kwargs in REPORTS:
+            name = 'report:' + report + ''.join(':' + str(value) for value in kwargs.values() if value)
+            stages[name] = measure(lambda: getattr(ovf, report)(data, **kwargs), repeat)
+        return stages
+    finally:
+        oda.output_dir = None
+        os.chdir(old_dir)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(old_file, new_file):
+    """
+    Print the stage times of two result files side by side
+    """
+    with open(old_file) as file:
+        old = json.load(file)
+    with open(new_file) as file:
+        new = json.load(file)
+    old_runs = {run['scale']: run['stages'] for run in old['runs']}
+    print('%-45s %6s %10s %10s %8s %10s %10s  %s' % ('stage', 'scale', 'old (s)', 'new (s)', 'speedup',
+                                                     'old (MB)', 'new (MB)', 'memory'))
+    for run in new['runs']:
+        for stage, result in run['stages'].items():
+            before = old_runs.get(run['scale'], {}).get(stage)
+            if before is None:
+                continue
+            memory = MEMORY[result['memory']]
+            if before['memory'] != result['memory']:                # the peaks are not comparable
+                memory = MEMORY[before['memory']] + ' vs ' + memory
+            print('%-45s %5dx %10.3f %10.3f %7.2fx %10.1f %10.1f  %s' % (
+                stage, run['scale'], before['seconds'], result['seconds'],
+                before['seconds'] / max(result['seconds'], 1e-9), before['peak_mb'], result['peak_mb'], memory))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Covid-19 pipeline on synthetic data')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1], help='data volumes (e.g. 1 10 100)')
+    parser.add_argument('--days', type=int, help='number of days from 22-Jan-2020 (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of the fast stages (the best is kept)')
+    parser.add_argument('--format', default='csv', choices=['csv', 'png', 'svg'], help='report output format')
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'oveds_bench'),
+                        help='work directory (synthetic data is kept there between runs)')
+    parser.add_argument('--out', default='bench_results.json', help='JSON results file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    out_file = os.path.abspath(args.out)
+    results = {'meta': {'date': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                        'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                        'platform': platform.platform(), 'days': args.days, 'format': args.format},
+               'runs': []}
+    for scale in args.scale:
+        stages = run_scale(scale, args.days, args.work, args.repeat, args.format)
+        results['runs'].append({'scale': scale, 'stages': stages})
+        for stage, result in stages.items():
+            print('%5dx %-45s %9.3fs %9.1fMB %s' % (scale, stage, result['seconds'], result['peak_mb'],
+                                                     MEMORY[result['memory']]))
+
+    with open(out_file, 'w') as file:
+        json.dump(results, file, indent=1)
+    print('Results written to', out_file)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
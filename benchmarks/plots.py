@@ -0,0 +1,148 @@
+#-------------------------------------------------------------------------------
+# This file compares the plot engine (oveds_draw) with the way the reports drew before it:
+# a new figure for every plot, every point of every series drawn, a tick every 14 days
+# (and seaborn.lineplot for several series). Two cases, on synthetic cumulative series:
+#     single   - one long series (--days)
+#     overlay  - many locations on one axes (--locations)
+# For each: the render time (to PNG, the best of --repeat), the points drawn, and the output:
+# whether the highest and lowest point of every series is drawn, the largest gap between the
+# drawn line and the data (in % of the range of the series), and the pixels that differ from
+# a drawing of all the points on the same axes.
+#
+# Usage:  python -m benchmarks.plots [--days N] [--locations N] [--repeat N]
+#-------------------------------------------------------------------------------
+import os
+import io
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')                                               # no GUI
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import oveds_draw as draw
+
+DPI = 100
+
+
+def series(days, locations, seed=0):
+    """
+    Synthetic cumulative counts, with waves and a few reporting spikes
+    :param days: int
+    :param locations: int
+    :param seed: int
+    :return: DataFrame (indexed by date, a column per location)
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-22', periods=days, freq='D')
+    tt = np.arange(days)[:, None]
+    waves = 1 + np.sin(tt / rng.uniform(30, 90, locations) + rng.uniform(0, 6, locations))
+    daily = rng.poisson(waves * rng.uniform(10, 1000, locations))
+    spikes = rng.random((days, locations)) < 0.005                  # backlog dumps
+    daily = daily + spikes * rng.uniform(5, 50, locations) * daily.mean(axis=0)
+    return pd.DataFrame(daily.cumsum(axis=0), index=dates, columns=['Location %d' % ii for ii in range(locations)])
+
+
+def old_plot(df):
+    """
+    Draw as before: a new figure, all points, a tick every 14 days
+    :return: Figure
+    """
+    import matplotlib.dates as mdates
+    plt = draw.pyplot()
+    fig = plt.figure()
+    if df.shape[1] > 1:
+        try:
+            import seaborn as sb
+            sb.lineplot(data=df, legend=False)
+        except ImportError:
+            plt.plot(df.index, df.to_numpy())
+    else:
+        plt.plot(df.index, df.iloc[:, 0])
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%B-%d'))
+    plt.gca().xaxis.set_major_locator(mdates.DayLocator(interval=14))
+    plt.xticks(rotation = 30)
+    plt.grid(True)
+    return fig
+
+
+def new_plot(df, max_points=draw.MAX_POINTS):
+    """
+    Draw with the engine: the reused figure, downsampled series
+    :return: Figure
+    """
+    fig, ax = draw.figure()
+    draw.lines(ax, df.index, df, labels=[None] * df.shape[1], max_points=max_points)
+    ax.grid(True)
+    return fig
+
+
+def render(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=DPI)
+    return buffer.getbuffer().nbytes
+
+
+def timed(plot, df, repeat):
+    """
+    :return: float (seconds: the best of 'repeat' draws and renders)
+    """
+    best = None
+    for ii in range(repeat):
+        start = time.perf_counter()
+        fig = plot(df)
+        render(fig)
+        seconds = time.perf_counter() - start
+        if plot is old_plot:
+            draw.pyplot().close(fig)                                # as show_plot did (close('all'))
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def fidelity(df, max_points=draw.MAX_POINTS):
+    """
+    How close the downsampled series are to the data
+    :return: dict (peaks_kept (Boolean), max_error_pct, pixels_differ_pct)
+    """
+    values = df.to_numpy(dtype=np.float64).T
+    xs = draw.date_numbers(df.index)
+    rows = draw.lttb(xs, values, max_points)
+    kept = np.take_along_axis(values, rows, axis=1)
+    peaks_kept = bool(np.all(kept.max(axis=1) == values.max(axis=1)) and np.all(kept.min(axis=1) == values.min(axis=1)))
+    errors = [np.abs(np.interp(xs, xs[rows[ii]], kept[ii]) - values[ii]).max() / np.ptp(values[ii])
+              for ii in range(len(values))]
+
+    images = []
+    for points in [len(xs), max_points]:                            # the same axes, all points vs downsampled
+        fig = new_plot(df, points)
+        fig.canvas.draw()
+        images.append(np.asarray(fig.canvas.buffer_rgba()).copy())
+    differ = np.any(images[0] != images[1], axis=2).mean()
+    return {'peaks_kept': peaks_kept, 'max_error_pct': 100 * max(errors), 'pixels_differ_pct': 100 * differ}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the plot engine with drawing every point on a new figure')
+    parser.add_argument('--days', type=int, default=1143, help='length of the series')
+    parser.add_argument('--locations', type=int, default=200, help='series drawn on one axes (overlay)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each render (the best is kept)')
+    args = parser.parse_args(argv)
+
+    cases = [('single', series(args.days, 1)), ('overlay', series(args.days, args.locations, seed=1))]
+    print('%-8s %9s %9s %8s %8s %7s %8s %8s' % ('case', 'old (s)', 'new (s)', 'speedup', 'points', 'peaks',
+                                              'err %', 'pixels %'))
+    for name, df in cases:
+        old_seconds = timed(old_plot, df, args.repeat)
+        new_seconds = timed(new_plot, df, args.repeat)
+        result = fidelity(df)
+        points = min(args.days, draw.MAX_POINTS) * df.shape[1]
+        print('%-8s %9.3f %9.3f %7.1fx %8d %7s %8.2f %8.2f' % (name, old_seconds, new_seconds, old_seconds / new_seconds,
+                                                             points, 'kept' if result['peaks_kept'] else 'LOST',
+                                                             result['max_error_pct'], result['pixels_differ_pct']))
+
+
+if __name__ == '__main__':
+    main()
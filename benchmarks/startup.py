@@ -0,0 +1,91 @@
+#-------------------------------------------------------------------------------
+# This file times the start of the Covid-19 program: from launching oveds_main.py to its menu
+# (with a store of synthetic data in place, and no new daily files to fetch), and the import
+# of the package modules alone. Each is a fresh interpreter, timed a few times (the best is kept).
+# The plotting libraries must not be imported before the first plot; --max-seconds fails the run
+# when the menu takes longer than that.
+#
+# Usage:  python -m benchmarks.startup [--days N] [--repeat N] [--max-seconds S]
+#-------------------------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from benchmarks import synth
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['oveds_accs', 'oveds_func', 'oveds_data', 'oveds_store', 'oveds_cube', 'oveds_derive']
+LAZY_MODULES = ['matplotlib']                                      # imported only when a plot is drawn
+
+
+def prepare(work_dir, days):
+    """
+    A run directory with the raw cache and the cleaned data store of synthetic data
+    :param work_dir: string
+    :param days: int
+    :return: tuple (run directory, local mirror of the daily files)
+    """
+    mirror = os.path.join(work_dir, 'synth-%d' % days)
+    if not os.path.exists(mirror):
+        synth.write(mirror, days=days)
+    run_dir = os.path.join(work_dir, 'run-%d' % days)
+    if not os.path.exists(run_dir):
+        os.makedirs(run_dir)
+        subprocess.run([sys.executable, '-c', 'import oveds_accs as oda; oda.load_raw(source=%r); oda.clean_data()'
+                        % mirror], cwd=run_dir, env=dict(os.environ, PYTHONPATH=REPO_DIR),
+                       stdout=subprocess.DEVNULL, check=True)
+    return run_dir, mirror
+
+
+def time_command(args, cwd, env, stdin=None, repeat=5):
+    """
+    The best wall time of a command, in a fresh interpreter each time
+    :return: float (seconds)
+    """
+    best = None
+    for ii in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=cwd, env=env, input=stdin, stdout=subprocess.DEVNULL, check=True, text=True)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the start of the Covid-19 program, up to its menu')
+    parser.add_argument('--days', type=int, default=60, help='days of synthetic data in the store')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each measurement (the best is kept)')
+    parser.add_argument('--max-seconds', type=float, help='fail if the menu takes longer than this')
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'oveds_startup'),
+                        help='work directory (synthetic data is kept there between runs)')
+    args = parser.parse_args(argv)
+
+    run_dir, mirror = prepare(args.work, args.days)
+    env = dict(os.environ, PYTHONPATH=REPO_DIR, OVEDS_SOURCE=mirror, MPLBACKEND='Agg')
+    env.pop('OVEDS_PROFILE', None)
+
+    interpreter = time_command([sys.executable, '-c', 'pass'], run_dir, env, repeat=args.repeat)
+    imports = time_command([sys.executable, '-c', 'import ' + ', '.join(MODULES)], run_dir, env,
+                           repeat=args.repeat)
+    menu = time_command([sys.executable, os.path.join(REPO_DIR, 'oveds_main.py')], run_dir, env, stdin='0\n',
+                        repeat=args.repeat)
+    check = subprocess.run([sys.executable, '-c', 'import sys, %s; print(*[name for name in %r if name in sys.modules])'
+                            % (', '.join(MODULES), LAZY_MODULES)], cwd=run_dir, env=env, capture_output=True,
+                           text=True, check=True)
+    eager = check.stdout.split()
+
+    print('%-40s %7.3fs' % ('python (no imports)', interpreter))
+    print('%-40s %7.3fs' % ('import the package modules', imports))
+    print('%-40s %7.3fs' % ('oveds_main.py, up to the menu and exit', menu))
+    if eager:
+        print('Imported before any plot:', ', '.join(eager))
+    if eager or (args.max_seconds is not None and menu > args.max_seconds):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
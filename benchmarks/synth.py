@@ -0,0 +1,203 @@
+#-------------------------------------------------------------------------------
+# This file writes synthetic Covid-19 daily-report files, in the JHU layouts and file names:
+#     until 29-Feb-2020   Province/State, Country/Region, Last Update, Confirmed, Deaths, Recovered
+#     until 21-Mar-2020   ... + Latitude, Longitude
+#     until 28-May-2020   FIPS, Admin2, Province_State, Country_Region, Last_Update, Lat, Long_, Confirmed,
+#                         Deaths, Recovered, Active, Combined_Key (US rows per county from now on)
+#     until 08-Nov-2020   ... + Incidence_Rate, Case-Fatality_Ratio
+#     from 09-Nov-2020    ... + Incident_Rate, Case_Fatality_Ratio
+# At scale 1 there are about 4,000 rows a day (as the real files); the scale multiplies the number
+# of US counties and of provinces. Country names include the variants mapped by country_dict,
+# and the cruise ships.
+# write_time_series writes the same data as the JHU time-series files instead: the three global wide
+# files (a column per date, the US in a single row) and the lookup table of the populations.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+FIRST_DATE = date(2020, 1, 22)
+LAST_DATE = date(2023, 3, 9)                                        # the last JHU daily report
+
+LAYOUT_B = date(2020, 3, 1)
+LAYOUT_C = date(2020, 3, 22)
+LAYOUT_D = date(2020, 5, 29)
+LAYOUT_E = date(2020, 11, 9)
+
+RAW_NAMES = ['Mainland China', 'Korea, South', 'Iran (Islamic Republic of)', 'Taiwan*', 'Czechia',
+             'United Kingdom', 'Viet Nam', 'Bahamas, The', 'Gambia, The', 'Congo (Kinshasa)',
+             'Congo (Brazzaville)', 'Cabo Verde', 'Holy See', 'Russian Federation', 'West Bank and Gaza',
+             'Diamond Princess', 'MS Zaandam', 'Canada', 'Australia', 'Italy', 'Israel', 'France', 'Germany']
+
+N_COUNTRIES = 190                                                   # besides the US
+N_STATES = 58
+N_COUNTIES = 3300                                                   # US counties, at scale 1
+N_PROVINCES = 500                                                   # provinces of 15 other countries, at scale 1
+
+
+def locations(scale=1, seed=0):
+    """
+    The synthetic locations
+    :param scale: int
+    :param seed: int
+    :return: DataFrame (one row per location), US counties first, ordered by state
+    """
+    rng = np.random.default_rng(seed)
+    n_counties = N_COUNTIES * scale
+    n_provinces = N_PROVINCES * scale
+    countries = RAW_NAMES + ['Country %03d' % ii for ii in range(N_COUNTRIES - len(RAW_NAMES))]
+
+    state = np.sort(rng.integers(0, N_STATES, n_counties))
+    us = pd.DataFrame({'Country': 'US', 'Province': ['State %02d' % ss for ss in state],
+                       'Admin2': ['County %05d' % ii for ii in range(n_counties)],
+                       'FIPS': 1000 + np.arange(n_counties)})
+    with_provinces = countries[:15]
+    prov_country = rng.integers(0, len(with_provinces), n_provinces)
+    provinces = pd.DataFrame({'Country': [with_provinces[cc] for cc in prov_country],
+                              'Province': ['Province %05d' % ii for ii in range(n_provinces)]})
+    others = pd.DataFrame({'Country': countries[15:], 'Province': None})
+
+    locs = pd.concat([us, provinces, others], ignore_index=True)
+    n = len(locs)
+    locs['Lat'] = np.round(rng.uniform(-50, 65, n), 5)
+    locs['Long'] = np.round(rng.uniform(-160, 170, n), 5)
+    locs['Population'] = rng.integers(1000, 5000000, n)
+    locs['Start'] = rng.integers(0, 90, n)                          # days from the first date to the first case
+    locs['Attack'] = rng.uniform(0.05, 0.4, n)                      # final share of population infected
+    locs['Speed'] = rng.uniform(0.002, 0.02, n)
+    locs['CFR'] = rng.uniform(0.005, 0.03, n)
+    locs.loc[locs['Country'].isin(['Diamond Princess', 'MS Zaandam']), 'Population'] = 3700
+    parts = [locs['Admin2'].fillna(''), locs['Province'].fillna(''), locs['Country']]
+    locs['Combined_Key'] = [', '.join(item for item in items if item) for items in zip(*parts)]
+    return locs
+
+
+def counts(locs, day):
+    """
+    Cumulative counts of all locations on a given day (non-decreasing over time)
+    :param locs: DataFrame (locations)
+    :param day: int (days from the first date)
+    :return: tuple of numpy arrays (confirmed, deaths, recovered)
+    """
+    elapsed = np.maximum(day - locs['Start'].to_numpy() + 1, 0)
+    confirmed = np.floor(locs['Population'].to_numpy() * locs['Attack'].to_numpy() *
+                         (1 - np.exp(-locs['Speed'].to_numpy() * elapsed)))
+    deaths = np.floor(confirmed * locs['CFR'].to_numpy())
+    recovered = np.floor(np.maximum(confirmed - deaths, 0) * 0.9)
+    return confirmed, deaths, recovered
+
+
+def day_frame(locs, the_date):
+    """
+    The synthetic daily-report of a date, in the layout of that date
+    :param locs: DataFrame (locations)
+    :param the_date: date
+    :return: DataFrame
+    """
+    confirmed, deaths, recovered = counts(locs, (the_date - FIRST_DATE).days)
+    last_update = the_date.strftime('%Y-%m-%d') + ' 04:21:33'
+    is_us = (locs['Country'] == 'US').to_numpy()
+
+    if the_date < LAYOUT_C:                                         # US rows per state
+        keys = locs['Province'].fillna('')
+        frame = pd.DataFrame({'Province/State': locs['Province'], 'Country/Region': locs['Country'],
+                              'Last Update': last_update, 'Confirmed': confirmed, 'Deaths': deaths,
+                              'Recovered': recovered, 'Latitude': locs['Lat'], 'Longitude': locs['Long']})
+        frame = frame.groupby([locs['Country'], keys], sort=False).agg(
+            {'Province/State': 'first', 'Country/Region': 'first', 'Last Update': 'first', 'Confirmed': 'sum',
+             'Deaths': 'sum', 'Recovered': 'sum', 'Latitude': 'first', 'Longitude': 'first'}).reset_index(drop=True)
+        frame = frame[frame['Confirmed'] > 0]                       # only locations with cases
+        if the_date < LAYOUT_B:
+            frame = frame.drop(columns=['Latitude', 'Longitude'])
+        return frame
+
+    countries = locs['Country'].replace({'Mainland China': 'China'})
+    frame = pd.DataFrame({'FIPS': locs['FIPS'], 'Admin2': locs['Admin2'], 'Province_State': locs['Province'],
+                          'Country_Region': countries, 'Last_Update': last_update, 'Lat': locs['Lat'],
+                          'Long_': locs['Long'], 'Confirmed': confirmed, 'Deaths': deaths,
+                          'Recovered': np.where(is_us, 0, recovered),
+                          'Active': confirmed - deaths - np.where(is_us, 0, recovered),
+                          'Combined_Key': locs['Combined_Key']})
+    if the_date >= LAYOUT_D:
+        rate = 'Incidence_Rate' if the_date < LAYOUT_E else 'Incident_Rate'
+        ratio = 'Case-Fatality_Ratio' if the_date < LAYOUT_E else 'Case_Fatality_Ratio'
+        frame[rate] = confirmed / locs['Population'].to_numpy() * 1e5
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame[ratio] = np.where(confirmed > 0, 100 * deaths / confirmed, np.nan)
+    return frame
+
+
+def write(out_dir, scale=1, days=None, seed=0):
+    """
+    Write the synthetic daily files (MM-DD-YYYY.csv) of all dates
+    :param out_dir: string
+    :param scale: int
+    :param days: int (number of days from 22-Jan-2020; None --> up to the last JHU report)
+    :param seed: int
+    :return: int (number of files written)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    locs = locations(scale, seed)
+    if days is None:
+        days = (LAST_DATE - FIRST_DATE).days + 1
+    for ii in range(days):
+        the_date = FIRST_DATE + timedelta(ii)
+        day_frame(locs, the_date).to_csv(os.path.join(out_dir, the_date.strftime('%m-%d-%Y') + '.csv'),
+                                         index=False, float_format='%.10g')
+    return days
+
+
+def write_time_series(out_dir, scale=1, days=None, seed=0):
+    """
+    Write the synthetic time-series files (confirmed, deaths, recovered) and the lookup table
+    :param out_dir: string
+    :param scale: int
+    :param days: int (number of days from 22-Jan-2020; None --> up to the last JHU report)
+    :param seed: int
+    :return: int (number of dates)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    locs = locations(scale, seed)
+    locs['Country'] = locs['Country'].replace({'Mainland China': 'China'})
+    locs.loc[locs['Country'] == 'US', 'Province'] = None                 # the global files have a single US row
+    if days is None:
+        days = (LAST_DATE - FIRST_DATE).days + 1
+    daily = [counts(locs, ii) for ii in range(days)]
+    keys = [locs['Country'], locs['Province'].fillna('')]
+    first = locs.groupby(keys, sort=False).agg(Province=('Province', 'first'), Country=('Country', 'first'),
+                                               Lat=('Lat', 'first'), Long=('Long', 'first'),
+                                               Population=('Population', 'sum')).reset_index(drop=True)
+    headers = ['%d/%d/%s' % (dd.month, dd.day, dd.strftime('%y'))
+               for dd in (FIRST_DATE + timedelta(ii) for ii in range(days))]
+    for kk, name in enumerate(['confirmed', 'deaths', 'recovered']):
+        values = pd.DataFrame(np.column_stack([day[kk] for day in daily]), columns=headers)
+        values = values.groupby(keys, sort=False).sum().reset_index(drop=True).astype(np.int64)
+        wide = pd.concat([first[['Province', 'Country', 'Lat', 'Long']].set_axis(
+            ['Province/State', 'Country/Region', 'Lat', 'Long'], axis=1), values], axis=1)
+        wide.to_csv(os.path.join(out_dir, 'time_series_covid19_%s_global.csv' % name), index=False)
+    lookup = pd.DataFrame({'UID': np.arange(len(first)), 'Admin2': None, 'Province_State': first['Province'],
+                           'Country_Region': first['Country'], 'Population': first['Population']})
+    lookup.to_csv(os.path.join(out_dir, 'UID_ISO_FIPS_LookUp_Table.csv'), index=False)
+    return days
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic JHU daily-report files')
+    parser.add_argument('out_dir')
+    parser.add_argument('--scale', type=int, default=1, help='volume, in multiples of the real data')
+    parser.add_argument('--days', type=int, help='number of days from 22-Jan-2020 (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-series', action='store_true', help='write the time-series files instead')
+    args = parser.parse_args(argv)
+    if args.time_series:
+        print('Wrote', write_time_series(args.out_dir, args.scale, args.days, args.seed), 'dates of time-series to',
+              args.out_dir)
+    else:
+        print('Wrote', write(args.out_dir, args.scale, args.days, args.seed), 'daily files to', args.out_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
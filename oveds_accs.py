@@ -1,321 +1,523 @@
-#-------------------------------------------------------------------------------
-# This library has some accessories for the Covid-19 package
-# Written by Oved Dahari on Nov 7, 2020.
-# Version 1.6a (corrected for NaN countries)
-# Version 1.7 (23-March-2021): New name 'Incident_rate" converted to old 'Incidence_Rate'
-#-------------------------------------------------------------------------
-import pandas as pd
-from datetime import datetime, timedelta, date
-import pickle
-import oveds_func as ovf
-import matplotlib.pyplot as plt
-import sys
-
-def load_raw():
-    """
-    Read the latest COVID-19 data from the GitHub website, and dump to a file using pickle
-    The program load only dates that have not been loaded before
-    :return: Boolean (new data found)
-    """
-    cov_data_dict = {}
-    today = datetime.today().date()
-    # today = temp.('%m-%d-%Y')
-    print('today =', today)
-
-    try:
-        with open('raw_data.p', 'rb') as file:
-            cov_data_dict = pickle.load(file)                      # load from disk
-        latest = max(cov_data_dict.keys()) + timedelta(1)           # the first date to load
-        print('first date to load =', latest)
-    except:
-        # latest = datetime.strptime('22-01-2020', '%d-%m-%Y')        # start at 22-Jan-20
-        latest = date(2020, 1, 22)
-        print('Starting from: ', latest)
-        # cov_data_dict = {}
-
-    mypath = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/' \
-            'csse_covid_19_daily_reports/'
-
-    cov_df = pd.DataFrame()
-    nfound = 0
-
-#    while latest != datetime.today().date():               # load up to yesterday
-    while latest != today:  # load up to yesterday
-        print('latest =', latest)
-        try:
-            date_name = latest.strftime('%m-%d-%Y') + '.csv'
-            cov_df = pd.read_csv(mypath + date_name)
-            cov_data_dict[latest] = cov_df                  # add to dictionary
-            print('found:', latest)
-            latest += timedelta(1)
-            nfound += 1
-        except:
-            print('last found:', latest)
-
-    ndates = len(cov_data_dict)
-    print('Total dates:', ndates, ', found new:', nfound)
-    if nfound > 0:
-        #print(sorted(cov_data_dict.keys()))
-        with open('raw_data.p', 'wb') as file:                  # dump to a pickle file
-            pickle.dump(cov_data_dict, file)
-        return True
-    else:
-        return False
-
-#---------------------------------------------------
-
-def clean_data():
-    """
-    Read to raw data from (pickle) file, than "clean it" and
-    combine all data to a single unified dataFrame
-    :return: None
-    """
-    with open('raw_data.p', 'rb') as file:                                      # read from file
-        df_dict = pickle.load(file)
-
-
-#    for col in df_dict.columns:
-#        print(col)
-#     print(df_dict.columns)
-# clist = sorted(list(pd.unique(df_dict['Country/Region'])))
-# for item in clist:
-       #  print(item)
-
-    # sys.exit()
-
-    column_dict = {'Province/State': 'Province_State',                          # columns with multiple names
-                'Country/Region': 'Country_Region',
-                'Last Update': 'Last_Update',
-                'Long_': 'Longitude',
-                'Lat': 'Latitude',
-                'Incident_Rate': 'Incidence_Rate'
-                }
-
-    country_dict = {'Bahamas, The': 'Bahamas',                                  # countries with multiple names
-                    'The Bahamas': 'Bahamas',
-                    'Gambia, The': 'Gambia',
-                    'Hong Kong SAR': 'Hong Kong',
-                    'Iran (Islamic Republic of)': 'Iran',
-                    'Macao SAR': 'Macao',
-                    'Mainland China': 'China',
-                    'Republic of Ireland': 'Ireland',
-                    'Republic of Korea': 'South Korea',
-                    'Korea, South': 'South Korea',
-                    'Republic of Moldova': 'Moldova',
-                    'Republic of the Congo': 'Congo',
-                    'Russian Federation': 'Russia',
-                    'Saint Martin:': 'St. Martin',
-                    'The Gambia': 'Gambia',
-                    'Taiwan*': 'Taiwan',
-                    'United Kingdom': 'UK',
-                    'Holy See': 'Vatican City',
-                    'Viet Nam': 'Vietnam',
-                    'occupied Palestinian territory': 'Palestine',
-                    ' Azerbaijan': 'Azerbaijan',
-                    'West Bank and Gaza': 'Palestine',
-                    'Taipei and environs': 'Taiwan',
-                    'Congo (Brazzaville)': 'Congo',
-                    'Congo (Kinshasa)': 'Congo',
-                    'Cabo Verde': 'Cape Verde',
-                    'Czechia': 'Czech Republic',
-                    'Timor-Leste': 'East Timor'
-                    }
-
-    df_list = []
-    for the_date in df_dict:                                                    # clean the data
-        tdf = df_dict[the_date]
-        tdf.rename(columns = column_dict, inplace = True)                       # rename column names to current
-        tdf['Country_Region'] = tdf['Country_Region'].replace(country_dict)     # update country names
-        tdf['Date'] = [the_date for ii in range(tdf.shape[0])]                  # add a column of the date
-        tdf2 = tdf[tdf['Country_Region'].notna()]                               # drop when country == None
-        df_list.append(tdf2)
-
-    comb = pd.concat(df_list, sort = True)                                      # create a single DataFrame
-
-    cruise_ships = ['Cruise Ship', 'Diamond Princess', 'MS Zaandam']
-    comb1 =  comb[comb['Country_Region'].isin(cruise_ships) == False]           # drop the cruise ships, and 'Others'
-
-    proc_df = comb1[['Country_Region', 'Province_State', 'Admin2',               # use only relevant colummns
-                    'Confirmed', 'Deaths', 'Recovered', 'Active', 'Case-Fatality_Ratio',
-                    'Incidence_Rate', 'Date', 'Latitude', 'Longitude']]
-
-    with open('cleaned_data.p', 'wb') as file:                                  # write to a pickle file
-        pickle.dump(proc_df, file)
-
-#------------------------------------------------------------------
-def select_data(country):
-    """
-    Present the names of the 4 data columns, and return the selected option
-    :param: country: string
-    :return: string (option chosen)
-    """
-    options = {'1': 'Confirmed', '2': 'Deaths', '3': 'Death_Rate', '4': 'Recovered', '5': 'Active'}
-    valid = False
-    chosen = ''
-    while not valid:
-        if country == 'US':
-            print('Available data options:\n',
-                  '-----------------------\n',
-                  '1: Confirmed\n',
-                  '2: Deaths\n',
-                  '3: Death Rate\n')
-        else:
-            print('Available data options:\n',
-                  '-----------------------\n',
-                  '1: Confirmed\n',
-                  '2: Deaths\n',
-                  '3: Death_Rate\n '
-                  '4: Recovered\n',
-                  '5: Active\n',
-                  )
-
-        chosen = input('Choose an option: ')
-
-        if country == 'US':
-            poss = '1 2 3'.split(' ')
-        else:
-            poss = '1 2 3 4 5'.split(' ')
-
-        if chosen in poss:
-            valid = True
-        else:
-            print('select a proper number...')
-
-    return options[chosen]
-
-def exit_option(df_all):
-    sys.exit()
-
-#-----------------------------------------------------------------
-
-def select_option():
-    """
-    Select an option of data plot/print
-    :return: String (function to be performed)
-    """
-    opt_dict = {'0': exit_option, '1': ovf.plot_daily, '2': ovf.plot_all4, '3': ovf.stats_for_all_over,
-                '4': ovf.world_per_region, '5': ovf.by_province_region, '6': ovf.top_countries, '7': ovf.print_5rows,
-                '8': ovf.no_recover, '9': ovf.all_died, '10': ovf.all_recovered}
-
-    print('\n The options in this program are::\n',
-          ' -----------------------------------\n',
-          '0: exit\n',
-          '1: Plot Time-series of selected country/province/datay or the World (Total and Daily)\n',
-          '2: Plot time-series of all data for a single-country (on a single plot)\n',
-          '3: Plot selected data (total and per million) for all countries with total deaths > selected\n',
-          '4: Print Confirmed and Deaths for all world regions/states\n',
-          '5: Plot selected latest data for all states/regions in a country\n',
-          '6: Plot top countries in selected latest data (total, and per million)\n',
-          '7: Print the first 5 rows of the data, along with various parameters\n',
-          '8: Print data for countries with no Recovered cases\n',
-          '9: Print data for countries where all Confirmed cases died\n',
-          '10: Print countries where all confirmed cases recovered\n',
-          )
-    while True:
-        inp = input('Enter option number:')
-        if inp.isnumeric() and int(inp) < 11:
-            return opt_dict[inp]
-        else:
-            print('Try again...')
-
-#-----------------------------------------------------------------------------
-def select_country(df_all):
-    """
-    Returns a country (or the whole World) selected by the user
-    :param: DataFrame (the whole data)
-    :return: string (country name)
-    """
-    country = ''
-    while True:
-        clist = sorted(list(pd.unique(df_all['Country_Region'])))
-        country = input('Enter country name, or World (all --> print list):')
-        if country == 'all':
-            for cc in clist:
-                print(cc)
-        elif country in clist or country == 'World':
-            return country
-        else:
-            print('try again...')
-
-def select_province(df_all, country):
-    """
-    Select a province/state for a given country
-    :param df_all: DataFrame (all data)
-    :param country: String
-    :return: String
-    """
-    # province = ''
-    latest = df_all['Date'].max()
-    tdf = df_all.loc[df_all['Country_Region'] == country]
-    prov_df = tdf.loc[tdf['Date'] == latest].groupby(['Province_State']).sum()
-    prov_list = sorted(list(prov_df.index))
-    print('Province/State list for ' + country + ':')
-    print('----------------------------------')
-    prov_dict = {}
-    for ii in range(1, len(prov_list) +1):
-        prov_dict[str(ii)] = prov_list[ii-1]
-    for ii in prov_dict:
-        print(ii, prov_dict[ii])
-
-    found = False
-    sel = ''
-    while not found:
-        sel = input('Select a province/state by number (or <CR> for the whole country):')
-        if sel == '':
-            return ''             # return empty string
-        if sel.isnumeric() and int(sel) < len(prov_list) + 1:
-            found = True
-        else:
-            print('try again...')
-    return prov_dict[sel]
-
-#----------------------------------------------------------------------------------
-
-import matplotlib.dates as mdates
-def oveds_plot(x_data, y_data, typ, title):
-    """
-    Plot the data, with various inputs
-    :param x_data: DF series or numpy array
-    :param y_data: same
-    :param typ: string
-    :param title: string
-    :return: none
-    """
-    if typ == 'line':                                                       # plot a simple graph
-        plt.title(title)
-        plt.plot(x_data, y_data)
-        plt.grid(True)
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%B-%d'))      # set x-axis ticks
-        plt.gca().xaxis.set_major_locator(mdates.DayLocator(interval=14))
-        plt.xticks(rotation = 30)
-
-    elif typ == 'bar':
-        fig, ax = plt.subplots()                                           # plot a bar-plot
-        ax.set_title(title)
-        ax.bar(x = x_data, height = y_data)
-        plt.setp(ax.get_xticklabels(), rotation=45, ha="right")             # make the x-axis tick labels readable
-        plt.grid(True, axis = 'y')                                          # plot horizontal grid
-
-    else:
-        print('Plot type invalid')
-        return
-
-    plt.annotate('\xa9Oved_Dahari', (x_data[0], max(y_data) * 0.95))        # enter logo
-    plt.show()
-
-#-------------------------------- main (for testing) -------------------------
-
-def main():
-
-    # with open('cleaned_data.p', 'rb') as file:
-    #    df_all = pickle.load(file)                                    # load from disk
-
-#     print('Today =', make_GH_date(0))
-#     print('Yesterday =', make_GH_date(1))
-    # print('You selected option', select_option())
-    # load_raw()
-    clean_data()
-    # print(select_province(df_all, 'Canada'))
-
-if __name__ == '__main__':
-    main()
+#-------------------------------------------------------------------------------
+# This library has some accessories for the Covid-19 package
+# Written by Oved Dahari on Nov 7, 2020.
+# Version 1.6a (corrected for NaN countries)
+# Version 1.7 (23-March-2021): New name 'Incident_rate" converted to old 'Incidence_Rate'
+# Version 1.8: daily files are fetched concurrently by oveds_fetch (retries, stop at first missing date)
+# Version 1.9: plots are drawn by oveds_draw (a reused figure, long series downsampled)
+# Version 1.10: countries and provinces are selected by name, prefix or alias, from oveds_catalog
+# Version 1.11: the raw cache is a compact monthly archive (oveds_archive), cleaned without parsing CSV text
+#-------------------------------------------------------------------------
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta, date
+import os
+import re
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import oveds_prof as prof
+import oveds_fetch as fetch
+import oveds_sources as sources
+import oveds_raw as raw
+import oveds_store as store
+import oveds_population as population
+import oveds_cube as cube
+import oveds_derive as derive
+import oveds_draw as draw
+import oveds_catalog as catalog
+import oveds_func as ovf
+import sys
+
+@prof.timed()
+def load_raw(source=None, workers=fetch.WORKERS, source_type=None, path=raw.RAW_DIR):
+    """
+    Read the latest COVID-19 data from the GitHub website, and add it to the raw cache (oveds_raw),
+    one file per month. The program load only dates that have not been loaded before
+    :param source: string (base URL or local directory of the source), default: $OVEDS_SOURCE, else GitHub
+    :param workers: int (number of concurrent requests)
+    :param source_type: string ('daily' or 'timeseries', see oveds_sources), default: $OVEDS_SOURCE_TYPE, else 'daily'
+    :param path: string (raw cache directory)
+    :return: Boolean (new data found)
+    """
+    today = datetime.today().date()
+    print('today =', today)
+
+    if not raw.exists(path) and os.path.exists('raw_data.p'):
+        raw.convert_pickle(path=path)                               # convert the old raw data pickle
+    raw.convert_files(path)                                         # convert a cache of gzipped files, if any
+
+    last = raw.watermark(path)
+    if last is not None:
+        latest = last + timedelta(1)                                # the first date to load
+        print('first date to load =', latest)
+    else:
+        latest = date(2020, 1, 22)                                  # start at 22-Jan-20
+        print('Starting from: ', latest)
+
+    found = sources.get(source_type, source).fetch(latest, today, workers)     # load up to yesterday
+    raw.add(found, path)                                            # write only the new dates
+
+    nfound = len(found)
+    print('Total dates:', len(raw.read_index(path)['dates']), ', found new:', nfound)
+    return nfound > 0
+
+
+REVISION_DAYS = 14                                                          # lookback of sync_raw
+
+
+def sync_raw(days=REVISION_DAYS, source=None, workers=fetch.WORKERS, source_type=None, path=raw.RAW_DIR):
+    """
+    Recheck the last cached dates for upstream revisions (JHU rewrites past daily reports), and replace
+    the files that have changed in the raw cache; clean_data then re-cleans only those dates
+    :param days: int (the lookback window: the number of last cached dates to recheck)
+    :param source: string (base URL or local directory of the source), default: $OVEDS_SOURCE, else GitHub
+    :param workers: int (number of concurrent requests)
+    :param source_type: string ('daily' or 'timeseries', see oveds_sources), default: $OVEDS_SOURCE_TYPE, else 'daily'
+    :param path: string (raw cache directory)
+    :return: list of dates (the revised ones)
+    """
+    recent = raw.dates(path)[-days:] if days > 0 else []
+    if not recent:
+        return []
+    checked = sources.get(source_type, source).recheck(recent, raw.etags(recent, path), workers)
+    revised = raw.revise(checked, path)
+    print('Rechecked', len(recent), 'dates from', recent[0], ', revised:', len(revised),
+          '(' + ', '.join(str(the_date) for the_date in revised) + ')' if revised else '')
+    return revised
+
+#---------------------------------------------------
+
+country_dict = catalog.country_dict                                         # countries with multiple names
+
+cruise_ships = ['Cruise Ship', 'Diamond Princess', 'MS Zaandam']
+
+location_columns = ['Country_Region', 'Province_State', 'Admin2']
+
+count_columns = ['Confirmed', 'Deaths', 'Recovered', 'Active']
+
+clean_columns = ['Country_Region', 'Province_State', 'Admin2',             # use only relevant colummns
+                 'Confirmed', 'Deaths', 'Recovered', 'Active', 'Case-Fatality_Ratio',
+                 'Incidence_Rate', 'Date', 'Latitude', 'Longitude']
+
+
+def clean_day(tdf, the_date):
+    """
+    "Clean" the raw data of a single date
+    :param tdf: DataFrame (raw data of the date, as oveds_ingest.parse reads it)
+    :param the_date: date
+    :return: DataFrame (with the columns of clean_columns)
+    """
+    tdf['Country_Region'] = tdf['Country_Region'].replace(country_dict)     # update country names
+    tdf['Date'] = pd.Timestamp(the_date)                                    # add a column of the date
+    tdf = tdf[tdf['Country_Region'].notna()]                                # drop when country == None
+    tdf = tdf[tdf['Country_Region'].isin(cruise_ships) == False]            # drop the cruise ships, and 'Others'
+    tdf = tdf.reindex(columns = clean_columns)                              # missing (older) columns --> NaN
+    for col in location_columns:
+        tdf[col] = tdf[col].astype(object)                                  # keep strings, even if all NaN
+    return tdf
+
+
+def _downcast(values):
+    """
+    The smallest of int32 / float32 / float64 that holds the count values without loss
+    :param values: Series (float64)
+    :return: Series
+    """
+    arr = values.to_numpy(dtype = 'float64')
+    if not np.isnan(arr).any() and (arr == np.round(arr)).all() and np.abs(arr).max(initial = 0) < 2 ** 31:
+        return values.astype('int32')
+    if np.array_equal(arr.astype('float32').astype('float64'), arr, equal_nan = True):
+        return values.astype('float32')
+    return values.astype('float64')
+
+
+@prof.timed()
+def compact(df):
+    """
+    Compact the cleaned data: categorical location columns, datetime64 dates,
+    and int32/float32 counts where that is lossless
+    :param df: DataFrame (cleaned data)
+    :return: DataFrame
+    """
+    out = df.copy()
+    for col in location_columns:
+        out[col] = out[col].astype('category')
+    out['Date'] = pd.to_datetime(out['Date'])
+    for col in count_columns:
+        out[col] = _downcast(out[col])
+    return out
+
+
+def memory_report(mem_before, mem_after, dtypes):
+    """
+    Print the memory usage of the cleaned data, before and after compaction
+    :param mem_before: Series (bytes per column, see DataFrame.memory_usage)
+    :param mem_after: Series (bytes per column)
+    :param dtypes: Series (dtype per column, after compaction)
+    :return: None
+    """
+    report = pd.DataFrame({'before (MB)': mem_before / 2**20, 'after (MB)': mem_after / 2**20,
+                           'dtype': dtypes.astype(str)})
+    print(report.round(2))
+    print('Total memory: %.1fMB --> %.1fMB' % (mem_before.sum() / 2**20, mem_after.sum() / 2**20))
+
+
+CLEAN_BUDGET_MB = 256           # memory for the raw data of a batch of dates being cleaned
+RAW_EXPANSION = 5               # memory used while cleaning a daily file, in multiples of its (CSV) size
+
+
+def batches(dates, budget_mb=CLEAN_BUDGET_MB, raw_path=raw.RAW_DIR):
+    """
+    Split the dates to clean into batches that fit in the memory budget, estimated from the sizes of the
+    raw files. A full batch is cut at its last month boundary, if that is in its second half, so that
+    most months of the store are written once
+    :param dates: sorted list of dates (cached in oveds_raw)
+    :param budget_mb: float
+    :param raw_path: string (raw cache directory)
+    :return: generator of lists of dates
+    """
+    entries = raw.read_index(raw_path)['dates']
+    budget = budget_mb * 2**20
+    batch, used = [], 0
+    for the_date in dates:
+        cost = entries[the_date.isoformat()]['size'] * RAW_EXPANSION
+        if batch and used + cost > budget:
+            cut = max([ii for ii in range(len(batch) // 2, len(batch)) if batch[ii].month != batch[ii - 1].month],
+                      default=len(batch))
+            yield batch[:cut]
+            batch = batch[cut:]
+            used = sum(entries[day.isoformat()]['size'] * RAW_EXPANSION for day in batch)
+        batch.append(the_date)
+        used += cost
+    if batch:
+        yield batch
+
+
+def _clean_one(the_date, raw_path=raw.RAW_DIR):
+    """
+    Parse and clean the raw data of a single date (also in a worker process)
+    :param the_date: date (cached in oveds_raw)
+    :param raw_path: string (raw cache directory)
+    :return: DataFrame
+    """
+    tdf = raw.read_day(the_date, raw_path, columns=clean_columns)                         # only the columns we keep
+    return clean_day(tdf, the_date)
+
+
+def clean_days(dates, pool=None, raw_path=raw.RAW_DIR):
+    """
+    Clean the raw data of some dates into a single DataFrame
+    :param dates: list of dates (cached in oveds_raw)
+    :param pool: ProcessPoolExecutor (None --> one date after the other, in this process)
+    :param raw_path: string (raw cache directory)
+    :return: tuple (DataFrame of the cleaned data, the same compacted (see compact))
+    """
+    with prof.stage('parse') as st:
+        if pool is None:
+            df_list = [_clean_one(the_date, raw_path) for the_date in dates]    # one file at a time
+        else:
+            df_list = list(pool.map(_clean_one, dates, [raw_path] * len(dates)))     # in date order
+        comb = pd.concat(df_list)                                               # create a single DataFrame
+        st.rows = len(comb)
+    return comb, compact(comb)                                                  # small dtypes
+
+
+@prof.timed()
+def clean_data(incremental = True, budget_mb = None, workers = None, raw_path = raw.RAW_DIR, path = store.STORE_DIR):
+    """
+    Read to raw data from the raw cache, than "clean it" and
+    combine all data to a single unified dataFrame, stored in the cleaned data store (oveds_store).
+    In incremental mode, only the dates after the watermark (the last date already in the store),
+    and the dates whose raw file was revised since they were cleaned, are cleaned, and written to the store.
+    The dates are cleaned in batches (see batches), each written to the store before the next is read,
+    so the memory used does not grow with the number of dates. With several workers, the dates of a batch
+    are cleaned in a process pool; the result is the same as with one
+    :param incremental: Boolean (False --> rebuild the cleaned data from scratch)
+    :param budget_mb: float (memory budget of a batch), default: $OVEDS_CLEAN_BUDGET_MB, else CLEAN_BUDGET_MB
+    :param workers: int (number of processes), default: $OVEDS_CLEAN_WORKERS, else 1 (no pool)
+    :param raw_path: string (raw cache directory)
+    :param path: string (store directory)
+    :return: None
+    """
+    watermark = store.watermark(path) if incremental else None
+    raw_dates, raw_hashes = raw.dates(raw_path), raw.hashes(raw_path)
+    new_dates = [the_date for the_date in raw_dates if watermark is None or the_date > watermark]
+    cleaned_from = store.source_hashes(path) if watermark is not None else {}
+    if cleaned_from is None:                                                    # a store from before the hashes:
+        cleaned_from = {day: raw_hashes[day] for day in raw_hashes if day <= watermark.isoformat()}   # as is
+    revised = [the_date for the_date in raw_dates if watermark is not None and the_date <= watermark and
+               cleaned_from.get(the_date.isoformat(), raw_hashes[the_date.isoformat()]) !=
+               raw_hashes[the_date.isoformat()]]
+    if not new_dates and not revised:
+        print('Cleaned data is up to date')
+        return
+    dates = revised + new_dates
+    if budget_mb is None:
+        budget_mb = float(os.environ.get('OVEDS_CLEAN_BUDGET_MB', CLEAN_BUDGET_MB))
+    if workers is None:
+        workers = int(os.environ.get('OVEDS_CLEAN_WORKERS', 1))
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(dates) > 1 else None
+
+    mem_before = mem_after = 0
+    changed = False                                                             # population of a cube location
+    with pool or contextlib.nullcontext():
+        for ii, batch in enumerate(batches(dates, budget_mb, raw_path)):
+            comb, proc_df = clean_days(batch, pool, raw_path)
+            mem_before = mem_before + comb.memory_usage(index = False, deep = True)
+            mem_after = mem_after + proc_df.memory_usage(index = False, deep = True)
+            del comb
+            hashes = dict(cleaned_from) if ii == 0 else {}
+            hashes.update({the_date.isoformat(): raw_hashes[the_date.isoformat()] for the_date in batch})
+            if watermark is None and ii == 0:
+                store.write(proc_df, path, sources=hashes)                      # rebuild the store
+            else:
+                store.append(proc_df, path, sources=hashes)                     # rewrite only the months cleaned
+            catalog.update(proc_df, path)                                       # the new locations
+            if watermark is not None:
+                changed = population.update(proc_df, path) or changed           # new locations: all aggregates change
+                if not changed:
+                    cube.update(proc_df, path)                                  # roll up only the days cleaned
+    memory_report(mem_before, mem_after, proc_df.dtypes)
+
+    if watermark is None:
+        population.build(path)
+        cube.build(path)
+        derive.build(path)
+    elif changed:
+        cube.build(path)
+        derive.build(path)
+    else:
+        derive.update(dates[0], path)                                           # daily changes of the days cleaned
+    if revised:
+        catalog.build(path)                                                         # locations may be gone
+        print('Re-cleaned', len(revised), 'revised dates, from', revised[0])
+    if new_dates:
+        print('Cleaned', len(new_dates), 'new dates, up to', new_dates[-1])
+
+#------------------------------------------------------------------
+def select_data(country):
+    """
+    Present the names of the 4 data columns, and return the selected option
+    :param: country: string
+    :return: string (option chosen)
+    """
+    options = {'1': 'Confirmed', '2': 'Deaths', '3': 'Death_Rate', '4': 'Recovered', '5': 'Active'}
+    valid = False
+    chosen = ''
+    while not valid:
+        if country == 'US':
+            print('Available data options:\n',
+                  '-----------------------\n',
+                  '1: Confirmed\n',
+                  '2: Deaths\n',
+                  '3: Death Rate\n')
+        else:
+            print('Available data options:\n',
+                  '-----------------------\n',
+                  '1: Confirmed\n',
+                  '2: Deaths\n',
+                  '3: Death_Rate\n '
+                  '4: Recovered\n',
+                  '5: Active\n',
+                  )
+
+        chosen = input('Choose an option: ')
+
+        if country == 'US':
+            poss = '1 2 3'.split(' ')
+        else:
+            poss = '1 2 3 4 5'.split(' ')
+
+        if chosen in poss:
+            valid = True
+        else:
+            print('select a proper number...')
+
+    return options[chosen]
+
+def exit_option(data):
+    sys.exit()
+
+#-----------------------------------------------------------------
+
+def select_option():
+    """
+    Select an option of data plot/print
+    :return: String (function to be performed)
+    """
+    opt_dict = {'0': exit_option, '1': ovf.plot_daily, '2': ovf.plot_all4, '3': ovf.stats_for_all_over,
+                '4': ovf.world_per_region, '5': ovf.by_province_region, '6': ovf.top_countries, '7': ovf.print_5rows,
+                '8': ovf.no_recover, '9': ovf.all_died, '10': ovf.all_recovered, '11': ovf.region_report,
+                '12': ovf.ranking_changes}
+
+    print('\n The options in this program are::\n',
+          ' -----------------------------------\n',
+          '0: exit\n',
+          '1: Plot Time-series of selected country/province/datay or the World (Total and Daily)\n',
+          '2: Plot time-series of all data for a single-country (on a single plot)\n',
+          '3: Plot selected data (total and per million) for all countries with total deaths > selected\n',
+          '4: Print Confirmed and Deaths for all world regions/states\n',
+          '5: Plot selected latest data for all states/regions in a country\n',
+          '6: Plot top countries in selected latest data (total, and per million)\n',
+          '7: Print the first 5 rows of the data, along with various parameters\n',
+          '8: Print data for countries with no Recovered cases\n',
+          '9: Print data for countries where all Confirmed cases died\n',
+          '10: Print countries where all confirmed cases recovered\n',
+          '11: Print and plot data for all locations within a distance of a point\n',
+          '12: Print and plot the changes in the ranks of the top countries in selected data\n',
+          )
+    while True:
+        inp = input('Enter option number:')
+        if inp.isnumeric() and int(inp) < 13:
+            return opt_dict[inp]
+        else:
+            print('Try again...')
+
+#-----------------------------------------------------------------------------
+def select_country(data):
+    """
+    Returns a country (or the whole World) selected by the user: its name in any case, an alias
+    (e.g. 'USA', 'Korea, South') or the start of its name
+    :param: Dataset (oveds_data)
+    :return: string (country name)
+    """
+    names = data.catalog()
+    while True:
+        country = input('Enter country name, or World (all --> print list):')
+        if country == 'all':
+            for cc in names.countries():
+                print(cc)
+        elif country.strip().lower() == 'world':
+            return 'World'
+        elif names.resolve(country) is not None:
+            return names.resolve(country)
+        elif names.suggest(country):
+            print('Did you mean:', ', '.join(names.suggest(country)), '?')
+        else:
+            print('try again...')
+
+def select_province(data, country):
+    """
+    Select a province/state for a given country, by number or by name (or the start of it)
+    :param data: Dataset (oveds_data)
+    :param country: String
+    :return: String
+    """
+    names = data.catalog()
+    prov_list = names.provinces(country)
+    print('Province/State list for ' + country + ':')
+    print('----------------------------------')
+    prov_dict = {}
+    for ii in range(1, len(prov_list) +1):
+        prov_dict[str(ii)] = prov_list[ii-1]
+    for ii in prov_dict:
+        print(ii, prov_dict[ii])
+
+    found = False
+    sel = ''
+    while not found:
+        sel = input('Select a province/state by number or name (or <CR> for the whole country):')
+        if sel == '':
+            return ''             # return empty string
+        if sel.isnumeric() and int(sel) < len(prov_list) + 1:
+            found = True
+        elif not sel.isnumeric() and names.resolve(sel, country) is not None:
+            return names.resolve(sel, country)
+        elif not sel.isnumeric() and names.suggest(sel, country):
+            print('Did you mean:', ', '.join(names.suggest(sel, country)), '?')
+        else:
+            print('try again...')
+    return prov_dict[sel]
+
+#----------------------------------------------------------------------------------
+
+output_dir = None               # None --> show plots and print tables; else render them to files in this directory
+output_format = 'png'           # file format of rendered plots: 'png', 'svg', or 'csv' (the plotted data)
+
+def output_path(title, extension):
+    """
+    The output file of a plot or table
+    :param title: string
+    :param extension: string
+    :return: string
+    """
+    name = re.sub(r'[^A-Za-z0-9%]+', '_', title).strip('_').replace('%', 'pct')
+    return os.path.join(output_dir, name + '.' + extension)
+
+
+def show_plot(title, data):
+    """
+    Show the current plot, or render it to a file
+    :param title: string
+    :param data: DataFrame or Series (the plotted data, written in 'csv' format)
+    :return: none
+    """
+    if output_dir is None:
+        draw.pyplot().show()
+        return
+    if output_format == 'csv':
+        data.to_csv(output_path(title, 'csv'))
+    else:
+        draw.pyplot().savefig(output_path(title, output_format), bbox_inches='tight')
+    draw.release()
+
+
+def show_table(table, title):
+    """
+    Print a table, or write it to a CSV file
+    :param table: DataFrame
+    :param title: string
+    :return: none
+    """
+    if output_dir is None:
+        print(table)
+    else:
+        table.to_csv(output_path(title, 'csv'))
+
+
+def oveds_plot(x_data, y_data, typ, title):
+    """
+    Plot the data, with various inputs
+    :param x_data: DF series or numpy array
+    :param y_data: same
+    :param typ: string
+    :param title: string
+    :return: none
+    """
+    if output_dir is not None and output_format == 'csv':                   # only the data, no drawing
+        show_plot(title, pd.Series(list(y_data), index=list(x_data), name=title))
+        return
+
+    if typ not in ('line', 'bar'):
+        print('Plot type invalid')
+        return
+
+    fig, ax = draw.figure()                                                 # the reused figure, cleared
+    ax.set_title(title)
+    if typ == 'line':                                                       # plot a simple graph
+        draw.lines(ax, x_data, np.asarray(y_data, dtype=np.float64))        # downsampled, dated x-axis
+        ax.grid(True)
+    else:
+        ax.bar(x = x_data, height = y_data)                                 # plot a bar-plot
+        draw.pyplot().setp(ax.get_xticklabels(), rotation=45, ha="right")   # make the x-axis tick labels readable
+        ax.grid(True, axis = 'y')                                           # plot horizontal grid
+
+    ax.annotate('\xa9Oved_Dahari', (0.02, 0.95), xycoords='axes fraction')  # enter logo
+    show_plot(title, None)
+
+#-------------------------------- main (for testing) -------------------------
+
+def main():
+
+    # with open('cleaned_data.p', 'rb') as file:
+    #    df_all = pickle.load(file)                                    # load from disk
+
+#     print('Today =', make_GH_date(0))
+#     print('Yesterday =', make_GH_date(1))
+    # print('You selected option', select_option())
+    # load_raw()
+    clean_data()
+    # print(select_province(df_all, 'Canada'))
+
+if __name__ == '__main__':
+    main()
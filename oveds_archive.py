@@ -0,0 +1,588 @@
+#-------------------------------------------------------------------------------
+# This library is the compact archive format of the raw-data cache (oveds_raw).
+# The daily files repeat nearly the same ~4,000 locations every day, with only the counts changing, so:
+#     locations.json          - the location dimension (FIPS, Admin2, Province_State, Country_Region,
+#                               Latitude, Longitude, Combined_Key, as written in the files), stored once;
+#                               a location gets an id the first time it is seen, and keeps it
+#     2020-03-15.npz          - a daily file: its header, the location id of each row (nothing when the rows
+#                               are those of the day before), and the number columns one after the other
+#                               in an array (any other column, such as Last_Update, as codes of its distinct values)
+# A number is kept as written: a decimal mantissa and its digits after the point. What is stored is its
+# difference from a prediction out of the previous days of the same location in the month: the straight
+# line through its last two values or, for the columns JHU derives from the counts, the same formula
+# (Active, Case-Fatality_Ratio; Incidence_Rate in proportion to Confirmed). For cumulative counts most
+# of these differences are 0 or small, so a day compresses far better than the CSV text.
+# The days of a month are thus a chain: a day is decoded after the days before it in its month. The
+# prediction state after a day can be saved (write_state), so that the next day is encoded on its own.
+# The original CSV content of a day is rebuilt on demand, byte for byte: a day is decoded again and
+# compared when it is encoded, and a day that does not come out the same (an odd quoting, a ragged
+# row) is kept verbatim in its file instead.
+# A day can also be read straight into a DataFrame, with no CSV text to parse.
+#-------------------------------------------------------------------------------
+import io
+import os
+import re
+import csv
+import json
+from datetime import date
+import numpy as np
+import pandas as pd
+import oveds_ingest as ingest
+
+LOCATIONS = 'locations.json'
+LOCATION_COLUMNS = ['FIPS', 'Admin2', 'Province_State', 'Country_Region', 'Latitude', 'Longitude', 'Combined_Key']
+NUMERIC_LOCATION_COLUMNS = ['FIPS', 'Latitude', 'Longitude']        # read as numbers into a DataFrame
+DERIVED_COLUMNS = ['Active', 'Case-Fatality_Ratio', 'Incidence_Rate']   # predicted from the counts of the day
+
+EMPTY = 255                     # the scale (digits after the point) of an empty field
+MAX_DIGITS = 18                 # a column with longer numbers is kept as text
+POWERS = np.append(10.0 ** np.arange(EMPTY), 1)                     # 10 ** scale (1 for an empty field)
+BOM = '\ufeff'
+INTEGER = re.compile(r'[+-]?[0-9]{1,18}')                           # a token read_csv reads as an integer
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A',
+             'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']                # what pandas.read_csv reads as NaN
+
+
+def _normal(name):
+    return ingest.column_dict.get(name.strip(), name.strip())
+
+
+def _location_position(name):
+    """
+    :param name: string (a column name, as written in a file)
+    :return: int (its index in LOCATION_COLUMNS), or None for any other column
+    """
+    normal = _normal(name)
+    return LOCATION_COLUMNS.index(normal) if normal in LOCATION_COLUMNS else None
+
+
+def _parsed(tokens, numeric=True):
+    """
+    Tokens as pandas.read_csv reads them
+    :param tokens: numpy array of strings
+    :param numeric: Boolean (False --> never numbers)
+    :return: tuple (numpy array: float64 if all the tokens are numbers or NaN, else object (strings and NaN);
+             numpy array of Booleans: the tokens that are integers, as read_csv reads a column of only those)
+    """
+    column = np.array(tokens, dtype=object)
+    missing = np.isin(column, NA_VALUES)
+    column[missing] = np.nan
+    if numeric:
+        numbers = pd.to_numeric(column, errors='coerce').astype(np.float64)
+        if np.isnan(numbers).sum() == missing.sum():
+            integer = [not na and INTEGER.fullmatch(token) is not None for token, na in zip(column.tolist(), missing)]
+            return numbers, np.array(integer, dtype=bool)
+    return column, np.zeros(len(column), dtype=bool)
+
+
+#-------------------------------------------------------------------------------
+
+class Locations:
+    """
+    The location dimension of an archive directory: a list of tuples (a token per LOCATION_COLUMNS,
+    '' where the file has no such column), the id of each is its index
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = []
+        try:
+            with open(os.path.join(path, LOCATIONS)) as file:
+                self.rows = [tuple(row) for row in json.load(file)['rows']]
+        except FileNotFoundError:
+            pass
+        self._ids = {row: ii for ii, row in enumerate(self.rows)}
+        self._saved = len(self.rows)
+        self._columns = self._fields = self._parsed = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def ids(self, rows):
+        """
+        The ids of locations (new ones are added)
+        :param rows: iterable of tuples
+        :return: numpy array (int32)
+        """
+        ids = self._ids
+        found = []
+        for row in rows:
+            loc = ids.get(row)
+            if loc is None:
+                loc = ids[row] = len(self.rows)
+                self.rows.append(row)
+            found.append(loc)
+        self._columns = self._fields = self._parsed = None
+        return np.array(found, dtype=np.int32)
+
+    def column(self, position):
+        """
+        :param position: int (index in LOCATION_COLUMNS)
+        :return: numpy array of strings (the token of every location, by id)
+        """
+        if self._columns is None:
+            self._columns = [np.array([row[ii] for row in self.rows], dtype=object)
+                             for ii in range(len(LOCATION_COLUMNS))]
+        return self._columns[position]
+
+    def fields(self, position):
+        """
+        :param position: int (index in LOCATION_COLUMNS)
+        :return: numpy array of strings (the token of every location, by id, as written in a CSV row)
+        """
+        if self._fields is None:
+            self._fields = [_fields(self.column(ii)) for ii in range(len(LOCATION_COLUMNS))]
+        return self._fields[position]
+
+    def parsed(self, position):
+        """
+        :param position: int (index in LOCATION_COLUMNS)
+        :return: tuple of numpy arrays (the value of every location, by id, as pandas.read_csv reads it;
+                 which are integers; see _parsed)
+        """
+        if self._parsed is None:
+            self._parsed = [_parsed(self.column(ii), name in NUMERIC_LOCATION_COLUMNS)
+                            for ii, name in enumerate(LOCATION_COLUMNS)]
+        return self._parsed[position]
+
+    def save(self):
+        """
+        Write the locations, if new ones were added
+        :return: None
+        """
+        if len(self.rows) == self._saved:
+            return
+        tmp = os.path.join(self.path, LOCATIONS + '.tmp')
+        with open(tmp, 'w') as file:
+            json.dump({'columns': LOCATION_COLUMNS, 'rows': self.rows}, file)
+        os.replace(tmp, os.path.join(self.path, LOCATIONS))
+        self._saved = len(self.rows)
+
+
+#-------------------------------------------------------------------------------
+
+def _split(content):
+    """
+    Split the CSV content of a daily file
+    :param content: bytes
+    :return: tuple (header, list of columns (tuples of strings), format [BOM, line end, final line end]),
+             or None if the content is not UTF-8, or the rows do not all have the fields of the header
+             (or a column name is repeated)
+    """
+    try:
+        text = content.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    bom = text.startswith(BOM)
+    text = text[1:] if bom else text
+    newline = '\r\n' if '\r\n' in text[:text.find('\n') + 1] else '\n'
+    rows = list(csv.reader(io.StringIO(text, newline='')))
+    if not rows or len(set(rows[0])) < len(rows[0]) or any(len(row) != len(rows[0]) for row in rows):
+        return None
+    header = rows[0]
+    columns = list(zip(*rows[1:])) if len(rows) > 1 else [()] * len(header)
+    return header, columns, [bom, newline, text.endswith(newline)]
+
+
+def _field(token):
+    """
+    :param token: string
+    :return: string (the token in a CSV row, as csv.writer writes it: quoted if it has a comma, a quote or a line end)
+    """
+    if ',' in token or '"' in token or '\r' in token or '\n' in token:
+        return '"' + token.replace('"', '""') + '"'
+    return token
+
+
+def _fields(tokens):
+    """
+    :param tokens: sequence of strings
+    :return: numpy array of strings (object; see _field)
+    """
+    return np.array([_field(token) for token in tokens], dtype=object)
+
+
+def _join(header, fields, text_format):
+    """
+    The CSV content of a daily file (the inverse of _split)
+    :param header: list of strings
+    :param fields: list of columns (of tokens as _field writes them)
+    :param text_format: list [BOM, line end, final line end] (see _split)
+    :return: bytes
+    """
+    bom, newline, final = text_format
+    lines = [','.join(map(_field, header))] + list(map(','.join, zip(*fields)))
+    if len(header) == 1:
+        lines = [line or '""' for line in lines]                    # csv.writer quotes a row of one empty field
+    text = newline.join(lines) + (newline if final else '')
+    return ((BOM if bom else '') + text).encode('utf-8')
+
+
+def _decimals(tokens):
+    """
+    Read a column of tokens as decimal numbers
+    :param tokens: sequence of strings
+    :return: tuple (mantissas (int64), scales (uint8: the digits after the point, EMPTY for '')),
+             or None if a token is not a decimal number as _tokens writes it (e.g. '1e5', '007', '-0')
+    """
+    text = np.array(tokens, dtype=str)
+    if not len(text):                                               # a file with no rows
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    empty = text == ''
+    digits = np.char.replace(text, '.', '')
+    unsigned = np.char.lstrip(digits, '-')
+    if not (empty | np.char.isdigit(unsigned)).all() or (np.char.str_len(unsigned) > MAX_DIGITS).any():
+        return None
+    try:
+        mantissas = np.where(empty, '0', digits).astype(np.int64)
+    except ValueError:                                              # digits of other scripts
+        return None
+    point = np.char.find(text, '.')
+    scales = np.where(empty, EMPTY, np.where(point < 0, 0, np.char.str_len(text) - point - 1)).astype(np.uint8)
+    if not np.array_equal(_tokens(mantissas, scales), text.astype(object)):
+        return None
+    return mantissas, scales
+
+
+def _tokens(mantissas, scales):
+    """
+    The tokens of decimal numbers (the inverse of _decimals)
+    :return: numpy array of strings (object)
+    """
+    tokens = np.full(len(mantissas), '', dtype=object)
+    for scale in np.unique(scales).tolist():
+        if scale == EMPTY:
+            continue
+        rows = scales == scale
+        numbers = mantissas[rows].tolist()
+        if scale == 0:
+            tokens[rows] = list(map(str, numbers))
+            continue
+        whole, fraction = (part.tolist() for part in np.divmod(np.abs(mantissas[rows]), 10 ** scale))
+        tokens[rows] = ['%s%d.%0*d' % ('-' if number < 0 else '', number_whole, scale, number_fraction)
+                        for number, number_whole, number_fraction in zip(numbers, whole, fraction)]
+    return tokens
+
+
+def _values(mantissas, scales):
+    """
+    :return: numpy array (float64; 0 for an empty field)
+    """
+    return mantissas / POWERS[scales]                                 # the mantissa of an empty field is 0
+
+
+def _narrow(values):
+    """
+    :param values: numpy array (int64)
+    :return: numpy array (in the smallest integer dtype that holds the values)
+    """
+    largest = np.abs(values).max(initial=0)
+    for dtype in (np.int8, np.int16, np.int32):
+        if largest < np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values
+
+
+#-------------------------------------------------------------------------------
+
+class Predictor:
+    """
+    The prediction of the number columns of a day, from the previous days of each location (of the month)
+    and the columns of the day already decoded. The encoder and the decoder run the same predictions, in
+    the same order (the derived columns after the counts), so they agree to the last bit
+    """
+
+    def __init__(self):
+        self.ids = None                 # the location ids of the rows of the last day
+        self.previous = {}              # normalized column --> (values on the last day, on the day before), by location
+        self.today = {}                 # normalized column --> values of the current day
+
+    def copy(self):
+        other = Predictor()
+        other.ids = self.ids
+        other.previous = {name: (last.copy(), before.copy()) for name, (last, before) in self.previous.items()}
+        return other
+
+    @staticmethod
+    def order(names):
+        """
+        :param names: list of column names (the number columns of a day)
+        :return: list (in the order to encode and decode them)
+        """
+        return sorted(names, key=lambda name: _normal(name) in DERIVED_COLUMNS)
+
+    def new_day(self, ids):
+        """
+        :param ids: numpy array (the location ids of the rows of the day)
+        :return: None
+        """
+        self.ids = ids
+        self.today = {}
+
+    def _previous(self, name, size):
+        """
+        :return: tuple of numpy arrays (the values of a column on the last day and on the day before, by location;
+                 0 for the locations not seen yet)
+        """
+        last, before = self.previous.get(name, (np.zeros(0), np.zeros(0)))
+        if len(last) < size:                                        # new locations
+            last, before = (np.append(values, np.zeros(size - len(values))) for values in (last, before))
+        self.previous[name] = last, before
+        return last, before
+
+    def predict(self, name, ids, scales):
+        """
+        :param name: string (column name)
+        :param ids: numpy array (the location ids of the rows)
+        :param scales: numpy array (uint8, the scale of each value)
+        :return: numpy array (int64: the predicted mantissas)
+        """
+        name = _normal(name)
+        last, before = (values[ids] for values in self._previous(name, int(ids.max(initial=-1)) + 1))
+        guess = line = 2 * last - before
+        today = self.today
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            if name == 'Active' and all(col in today for col in ['Confirmed', 'Deaths', 'Recovered']):
+                guess = today['Confirmed'] - today['Deaths'] - today['Recovered']
+            elif name == 'Case-Fatality_Ratio' and all(col in today for col in ['Confirmed', 'Deaths']):
+                guess = 100 * today['Deaths'] / today['Confirmed']
+            elif name == 'Incidence_Rate' and 'Confirmed' in today:
+                guess = today['Confirmed'] * (last / self.previous['Confirmed'][1][ids])     # Confirmed: already today's
+            guess = np.where(np.isfinite(guess), guess, line)
+            mantissas = np.rint(guess * POWERS[scales])
+        return np.where(np.isfinite(mantissas) & (np.abs(mantissas) < 2.0 ** 62), mantissas, 0).astype(np.int64)
+
+    def add(self, name, ids, mantissas, scales):
+        """
+        The actual values of a column of the day (after it was predicted)
+        :return: None
+        """
+        name = _normal(name)
+        self.today[name] = values = _values(mantissas, scales)
+        last, before = self.previous[name]
+        before[ids] = last[ids]
+        last[ids] = values
+
+
+def read_state(file_name):
+    """
+    :param file_name: string (a state file)
+    :return: tuple (date: the day it follows, Predictor), or (None, None) if there is no state file
+    """
+    try:
+        with np.load(file_name) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            predictor = Predictor()
+            predictor.ids = arrays['ids'] if 'ids' in arrays else None
+            predictor.previous = {name: (arrays['last.%d' % ii], arrays['before.%d' % ii])
+                                  for ii, name in enumerate(meta['columns'])}
+    except FileNotFoundError:
+        return None, None
+    return date.fromisoformat(meta['date']), predictor
+
+
+def write_state(file_name, the_date, predictor):
+    """
+    Write the prediction state after a day, to encode the next day of its month without decoding the month again
+    :param file_name: string
+    :param the_date: date
+    :param predictor: Predictor
+    :return: None
+    """
+    names = sorted(predictor.previous)
+    arrays = {'meta': np.array(json.dumps({'date': the_date.isoformat(), 'columns': names}))}
+    if predictor.ids is not None:
+        arrays['ids'] = predictor.ids
+    for ii, name in enumerate(names):
+        arrays['last.%d' % ii], arrays['before.%d' % ii] = predictor.previous[name]
+    _save(file_name, arrays)
+
+
+#-------------------------------------------------------------------------------
+
+def day_file(the_date):
+    """
+    :param the_date: date
+    :return: string (the name of its day file)
+    """
+    return the_date.isoformat() + '.npz'
+
+
+def _encode(content, locations, predictor):
+    """
+    :return: dict {name: numpy array} (see encode), or None if the content is not a regular CSV table
+    """
+    parts = _split(content)
+    if parts is None:
+        return None
+    header, columns, text_format = parts
+    n_rows = len(columns[0]) if columns else 0
+    meta = {'header': header, 'format': text_format, 'rows': n_rows, 'columns': {}}
+    arrays = {}
+    location_tokens = [('',) * n_rows] * len(LOCATION_COLUMNS)
+    numbers = {}
+    for col_no, (name, column) in enumerate(zip(header, columns)):
+        position = _location_position(name)
+        if position is not None:
+            location_tokens[position] = column
+            continue
+        decimals = _decimals(column)
+        if decimals is None:                                        # text: codes of its distinct values
+            codes, uniques = pd.factorize(np.array(column, dtype=object))
+            meta['columns'][name] = {'key': 'c%d' % col_no, 'kind': 'text', 'values': [str(value) for value in uniques]}
+            arrays['c%d.codes' % col_no] = _narrow(codes)
+        else:
+            meta['columns'][name] = {'kind': 'number'}
+            numbers[name] = decimals
+    ids = locations.ids(zip(*location_tokens))
+    meta['same_locations'] = predictor.ids is not None and np.array_equal(ids, predictor.ids)
+    if not meta['same_locations']:
+        arrays['location'] = ids
+    predictor.new_day(ids)
+    names = predictor.order(list(numbers))                          # the number columns, in the order of the arrays
+    residuals = []
+    for name in names:
+        mantissas, scales = numbers[name]
+        residuals.append(mantissas - predictor.predict(name, ids, scales))
+        predictor.add(name, ids, mantissas, scales)
+    arrays['scales'] = np.concatenate([numbers[name][1] for name in names] or [np.zeros(0, dtype=np.uint8)])
+    arrays['residuals'] = _narrow(np.concatenate(residuals or [np.zeros(0, dtype=np.int64)]))
+    arrays['meta'] = np.array(json.dumps(meta))
+    return arrays
+
+
+def encode(content, locations, predictor):
+    """
+    Encode a daily file, after the day before in its month. The day is decoded again and compared with
+    its content; a day that does not come out the same is kept verbatim
+    :param content: bytes (the original CSV content)
+    :param locations: Locations (the ids of new locations are added)
+    :param predictor: Predictor (the state after the day before, in its month; a new one for the first day)
+    :return: tuple (dict {name: numpy array} (for a day file), Predictor (the state after this day))
+    """
+    after = predictor.copy()
+    arrays = _encode(content, locations, after)
+    if arrays is not None and Day(arrays, locations, predictor.copy()).content() == content:
+        return arrays, after
+    return {'meta': np.array(json.dumps({'verbatim': True})), 'verbatim': np.frombuffer(content, dtype=np.uint8)}, \
+        predictor
+
+
+def _save(file_name, arrays):
+    tmp = file_name + '.tmp'
+    with open(tmp, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(tmp, file_name)
+
+
+def write(file_name, arrays, locations):
+    """
+    Write a day file (the new locations are saved first)
+    :param file_name: string
+    :param arrays: dict {name: numpy array} (see encode)
+    :param locations: Locations
+    :return: None
+    """
+    locations.save()
+    _save(file_name, arrays)
+
+
+def read(file_name, locations, predictor):
+    """
+    :param file_name: string (a day file)
+    :param locations: Locations (of the same directory)
+    :param predictor: Predictor (the state after the day before, in its month; advanced to this day)
+    :return: Day
+    """
+    with np.load(file_name) as arrays:
+        return Day(arrays, locations, predictor)
+
+
+class Day:
+    """
+    A daily file, decoded
+    """
+
+    def __init__(self, arrays, locations, predictor):
+        """
+        :param arrays: dict {name: numpy array} (see encode), or an open day file
+        :param locations: Locations
+        :param predictor: Predictor (the state after the day before, in its month; advanced to this day)
+        """
+        self.locations = locations
+        meta = json.loads(str(arrays['meta']))
+        self.verbatim = arrays['verbatim'].tobytes() if meta.get('verbatim') else None
+        if self.verbatim is not None:
+            return
+        self.header = meta['header']
+        self.format = meta['format']
+        self.ids = predictor.ids if meta['same_locations'] else arrays['location']
+        self.text = {}                                              # text column --> its distinct values
+        self.values = {}                                            # column --> codes, or (mantissas, scales)
+        numbers = []
+        for name, info in meta['columns'].items():
+            if info['kind'] == 'text':
+                self.text[name] = np.array(info['values'], dtype=object)
+                self.values[name] = arrays[info['key'] + '.codes']
+            else:
+                numbers.append(name)
+        predictor.new_day(self.ids)
+        if numbers:
+            all_scales, all_residuals = arrays['scales'], arrays['residuals'].astype(np.int64)
+        for ii, name in enumerate(predictor.order(numbers)):
+            rows = slice(ii * meta['rows'], (ii + 1) * meta['rows'])
+            scales = all_scales[rows]
+            mantissas = all_residuals[rows] + predictor.predict(name, self.ids, scales)
+            predictor.add(name, self.ids, mantissas, scales)
+            self.values[name] = (mantissas, scales)
+
+    def content(self):
+        """
+        The original CSV content of the day
+        :return: bytes
+        """
+        if self.verbatim is not None:
+            return self.verbatim
+        columns = []
+        for name in self.header:
+            position = _location_position(name)
+            if position is not None:
+                columns.append(self.locations.fields(position)[self.ids])
+            elif name in self.text:
+                columns.append(_fields(self.text[name])[self.values[name]])
+            else:
+                columns.append(_tokens(*self.values[name]))            # numbers: never quoted
+        return _join(self.header, columns, self.format)
+
+    def frame(self, columns=None):
+        """
+        The DataFrame of the day, without the CSV text: as pandas.read_csv reads its CSV content, or as
+        oveds_ingest.parse does (normalized column names, only the wanted columns, with their dtypes)
+        :param columns: list of (normalized) column names to keep (see ingest.parse); None --> all, as in the file
+        :return: DataFrame
+        """
+        if self.verbatim is not None or not len(self.ids):             # (the dtypes of a file with no rows)
+            if columns is not None:
+                return ingest.parse(self.content(), columns)
+            return pd.read_csv(io.BytesIO(self.content()), encoding='utf-8-sig')
+        frame = {}
+        for name in self.header:
+            key = name if columns is None else _normal(name)
+            if columns is not None and key not in columns:
+                continue
+            dtype = None if columns is None else ingest.dtypes.get(key)
+            position = _location_position(name)
+            if position is not None:
+                array, integer = (parsed[self.ids] for parsed in self.locations.parsed(position))
+            elif name in self.text:
+                array, integer = (parsed[self.values[name]] for parsed in _parsed(self.text[name], dtype is not object))
+            elif dtype is object:
+                array, integer = _parsed(_tokens(*self.values[name]), numeric=False)
+            else:
+                mantissas, scales = self.values[name]
+                integer = scales == 0
+                array = mantissas if integer.all() else np.where(scales == EMPTY, np.nan, _values(mantissas, scales))
+            if dtype is None and len(integer) and integer.all():                # as read_csv: a column of integers
+                array = array.astype(np.int64, copy=False)
+            frame[key] = array if dtype is None else pd.Series(array.astype(dtype, copy=False), dtype=dtype, copy=False)
+        return pd.DataFrame(frame, copy=False)
@@ -0,0 +1,149 @@
+#-------------------------------------------------------------------------------
+# This file runs the Covid-19 reports headless, from a spec, and renders them to files
+# (no GUI, no input prompts), fanned out across a process pool.
+#
+# Usage:  python oveds_batch.py spec.json [--out DIR] [--format png|svg|csv] [--workers N] [--profile [OUT]]
+#
+# Spec (JSON):
+#   {"output": "reports", "format": "png",
+#    "reports": [{"report": "plot_daily", "countries": ["World", "Israel"], "options": ["Confirmed", "Deaths"]},
+#                {"report": "top_countries", "top": 10, "options": ["Deaths"], "dates": ["2020-12-31", null]},
+#                {"report": "world_per_region"},
+#                {"report": "region_report", "lat": 51.5, "lon": -0.13, "km": 200, "options": ["Confirmed"]},
+#                {"report": "ranking_changes", "top": 20, "days": 30, "options": ["Deaths"], "per_million": true}]}
+# List-valued keys (countries, provinces, options, dates) are expanded to one render per combination;
+# any other key is passed to the report function as is. A region_report with no lat/lon/km is of REGION.
+#-------------------------------------------------------------------------------
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import builtins
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')                                               # no GUI
+import oveds_accs as oda
+import oveds_func as ovf
+import oveds_data as ds
+import oveds_store as store
+import oveds_prof as prof
+
+REPORTS = ['plot_daily', 'plot_all4', 'stats_for_all_over', 'world_per_region', 'by_province_region',
+           'top_countries', 'no_recover', 'all_died', 'all_recovered', 'region_report', 'ranking_changes']
+
+REGION = {'lat': 40.71, 'lon': -74.01, 'km': 100}                  # the default area of region_report (New York)
+
+EXPAND = {'countries': 'country', 'provinces': 'province', 'options': 'option', 'dates': 'as_of'}
+
+_data = None                                                        # the dataset of a worker process
+
+
+def expand(spec):
+    """
+    Expand the spec to a list of renders
+    :param spec: dict (see the header of this file)
+    :return: list of tuples (report name, dict of keyword arguments)
+    """
+    jobs = []
+    for entry in spec['reports']:
+        entry = dict(entry)
+        report = entry.pop('report')
+        if report not in REPORTS:
+            raise ValueError('Unknown report: ' + str(report))
+        if report == 'plot_daily':
+            entry.setdefault('province', '')                        # the whole country, unless given
+        if report == 'region_report' and not {'lat', 'lon', 'km'} & set(entry):
+            entry.update(REGION)
+        lists = {EXPAND[key]: entry.pop(key) for key in list(entry) if key in EXPAND}
+        for values in itertools.product(*lists.values()):
+            jobs.append((report, dict(entry, **dict(zip(lists, values)))))
+    return jobs
+
+
+def _no_input(prompt=''):
+    raise ValueError('missing parameter in the spec (prompt: ' + prompt.strip() + ')')
+
+
+def _init_worker(path, out_dir, out_format, profile):
+    global _data
+    if profile:
+        prof.ENABLED = True
+    _data = ds.Dataset(path)
+    oda.output_dir = out_dir
+    oda.output_format = out_format
+    builtins.input = _no_input                                      # a batch run never waits for the user
+
+
+def _render(job):
+    """
+    Render a single report (in a worker process)
+    :param job: tuple (report name, dict of keyword arguments)
+    :return: tuple (job, error message or None, list of profile records)
+    """
+    report, kwargs = job
+    first_record = len(prof.records)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            getattr(ovf, report)(_data, **kwargs)
+        error = None
+    except Exception as err:
+        error = '%s: %s' % (type(err).__name__, err)
+    return job, error, prof.records[first_record:]                  # workers never run the atexit dump
+
+
+def run(spec, workers=None, path=store.STORE_DIR):
+    """
+    Render all the reports of a spec
+    :param spec: dict (see the header of this file)
+    :param workers: int (number of processes; None --> number of CPUs)
+    :param path: string (store directory)
+    :return: list of tuples (job, error message) for the renders that failed
+    """
+    out_dir = spec.get('output', 'reports')
+    out_format = spec.get('format', 'png')
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = expand(spec)
+
+    start = time.perf_counter()
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(path, out_dir, out_format, prof.ENABLED)) as pool:
+        for job, error, records in pool.map(_render, jobs):
+            prof.records.extend(records)
+            if error is not None:
+                errors.append((job, error))
+                print('failed:', job[0], job[1], '-', error)
+    print('Rendered', len(jobs) - len(errors), 'of', len(jobs), 'reports to', out_dir,
+          'in %.1f seconds' % (time.perf_counter() - start))
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render Covid-19 reports to files, without the menu')
+    parser.add_argument('spec', help='JSON spec of the reports to render')
+    parser.add_argument('--out', help='output directory (overrides the spec)')
+    parser.add_argument('--format', choices=['png', 'svg', 'csv'], help='output format (overrides the spec)')
+    parser.add_argument('--workers', type=int, help='number of processes (default: number of CPUs)')
+    parser.add_argument('--store', default=store.STORE_DIR, help='cleaned data store directory')
+    parser.add_argument('--profile', nargs='?', const='oveds_profile', metavar='OUT',
+                        help='record stage timings to OUT.json / OUT.csv')
+    args = parser.parse_args(argv)
+    if args.profile:
+        prof.enable(args.profile)
+
+    with open(args.spec) as file:
+        spec = json.load(file)
+    if args.out:
+        spec['output'] = args.out
+    if args.format:
+        spec['format'] = args.format
+    errors = run(spec, args.workers, args.store)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+#-------------------------------------------------------------------------------
+# This library is the catalog of the Covid-19 locations: country --> provinces --> Admin2, with the
+# first and last date each location is reported, built at clean time (oveds_accs.clean_data) and
+# kept in <store>/catalog.json with the data version of the store it was built from.
+#     countries()                   - all country names
+#     provinces(country)            - the provinces/states of a country (reported on its last date)
+#     admin2(country, province)     - the counties (Admin2) of a province
+#     resolve(name, country)        - the location a user means: any case, a country alias (country_dict,
+#                                     ALIASES), or a unique prefix
+#     suggest(name, country)        - the names that start with a prefix, else the closest names (typos)
+# The name lists are sorted once, so a lookup is a binary search rather than a scan of the data.
+# country_dict is also used by clean_data, to give each country a single name.
+#-------------------------------------------------------------------------------
+import os
+import json
+import bisect
+import difflib
+import pandas as pd
+import oveds_prof as prof
+import oveds_store as store
+
+CATALOG = 'catalog.json'
+KEYS = ['Country_Region', 'Province_State', 'Admin2']
+SUGGESTIONS = 10                # names suggested for a name that is not found
+
+country_dict = {'Bahamas, The': 'Bahamas',                                  # countries with multiple names
+                'The Bahamas': 'Bahamas',
+                'Gambia, The': 'Gambia',
+                'Hong Kong SAR': 'Hong Kong',
+                'Iran (Islamic Republic of)': 'Iran',
+                'Macao SAR': 'Macao',
+                'Mainland China': 'China',
+                'Republic of Ireland': 'Ireland',
+                'Republic of Korea': 'South Korea',
+                'Korea, South': 'South Korea',
+                'Republic of Moldova': 'Moldova',
+                'Republic of the Congo': 'Congo',
+                'Russian Federation': 'Russia',
+                'Saint Martin:': 'St. Martin',
+                'The Gambia': 'Gambia',
+                'Taiwan*': 'Taiwan',
+                'United Kingdom': 'UK',
+                'Holy See': 'Vatican City',
+                'Viet Nam': 'Vietnam',
+                'occupied Palestinian territory': 'Palestine',
+                ' Azerbaijan': 'Azerbaijan',
+                'West Bank and Gaza': 'Palestine',
+                'Taipei and environs': 'Taiwan',
+                'Congo (Brazzaville)': 'Congo',
+                'Congo (Kinshasa)': 'Congo',
+                'Cabo Verde': 'Cape Verde',
+                'Czechia': 'Czech Republic',
+                'Timor-Leste': 'East Timor'
+                }
+
+ALIASES = {'USA': 'US',                                                     # names users type, not in the data
+           'United States': 'US',
+           'United States of America': 'US',
+           'Great Britain': 'UK',
+           'Britain': 'UK',
+           'Korea': 'South Korea'}
+
+
+def catalog_path(path=store.STORE_DIR):
+    return os.path.join(path, CATALOG)
+
+
+def _locations(df):
+    """
+    The locations of cleaned data, with their first and last date
+    :param df: DataFrame (cleaned data: the KEYS and Date)
+    :return: DataFrame (the KEYS, First_Date, Last_Date)
+    """
+    rows = df[KEYS].astype(object).assign(Date=df['Date'].to_numpy())
+    grouped = rows.groupby(KEYS, dropna=False, sort=False)['Date']
+    return pd.concat([grouped.min().rename('First_Date'), grouped.max().rename('Last_Date')], axis=1).reset_index()
+
+
+def _merge(old, new):
+    """
+    :return: DataFrame (the locations of both, with the earliest first date and latest last date)
+    """
+    both = pd.concat([old, new], ignore_index=True)
+    grouped = both.groupby(KEYS, dropna=False, sort=False)
+    return grouped.agg(First_Date=('First_Date', 'min'), Last_Date=('Last_Date', 'max')).reset_index()
+
+
+class Catalog:
+    """
+    The locations of the cleaned data, and name lookup
+    """
+
+    def __init__(self, table):
+        """
+        :param table: DataFrame (the KEYS, First_Date, Last_Date)
+        """
+        self.table = table.sort_values(KEYS, na_position='first', kind='stable').reset_index(drop=True)
+        countries = self.table.groupby('Country_Region', sort=True)['Last_Date'].max()
+        self._countries = list(countries.index)
+        self._provinces = {}
+        self._admin2 = {}
+        provinces = self.table[self.table['Province_State'].notna()]
+        for country, rows in provinces.groupby('Country_Region', sort=False):
+            current = rows[rows['Last_Date'] == countries[country]]             # as reported now (not renamed)
+            self._provinces[country] = sorted(current['Province_State'].unique())
+        for (country, province), rows in provinces[provinces['Admin2'].notna()].groupby(KEYS[:2], sort=False):
+            self._admin2[(country, province)] = sorted(rows['Admin2'].unique())
+        self._aliases = {alias.strip(): name for alias, name in {**country_dict, **ALIASES}.items()
+                         if name in countries.index}
+        self._lower = {}                                                        # country ('' for all) --> names
+
+    def __len__(self):
+        return len(self.table)
+
+    def countries(self):
+        """
+        :return: sorted list of all country names
+        """
+        return self._countries
+
+    def provinces(self, country):
+        """
+        :param country: string
+        :return: sorted list of the provinces/states of a country, reported on its last date
+        """
+        return self._provinces.get(country, [])
+
+    def admin2(self, country, province):
+        """
+        :param country: string
+        :param province: string
+        :return: sorted list of the Admin2 (US counties) of a province
+        """
+        return self._admin2.get((country, province), [])
+
+    def _names(self, country):
+        """
+        :return: tuple (sorted lower-case names, the names they stand for, in the same order): countries and
+                 their aliases, or the provinces of a country
+        """
+        key = country or ''
+        if key not in self._lower:
+            if country is None:
+                names = [(name, name) for name in self.countries()] + list(self._aliases.items())
+            else:
+                names = [(name, name) for name in self.provinces(country)]
+            pairs = sorted((alias.lower(), name) for alias, name in names)
+            self._lower[key] = ([lower for lower, name in pairs], [name for lower, name in pairs])
+        return self._lower[key]
+
+    def _prefixed(self, text, country):
+        """
+        :return: tuple (first, last + 1) (the range of the lower-case names that start with text, see _names)
+        """
+        lower = self._names(country)[0]
+        return bisect.bisect_left(lower, text), bisect.bisect_left(lower, text + '\uffff')
+
+    def resolve(self, name, country=None):
+        """
+        The name a user means: the same name (or a country alias) in any case, or the only name with that prefix
+        :param name: string
+        :param country: string (None --> a country name; else a province of this country)
+        :return: string (the name in the data), or None (not found, or more than one name has that prefix)
+        """
+        text = name.strip().lower()
+        if not text:
+            return None
+        lower, names = self._names(country)
+        start, stop = self._prefixed(text, country)
+        if start < stop and lower[start] == text:                               # the name itself, or an alias
+            return names[start]
+        return names[start] if len(set(names[start:stop])) == 1 else None
+
+    def suggest(self, name, country=None, n=SUGGESTIONS):
+        """
+        Names a user may mean: those that start with the name (or an alias that does), else the closest ones
+        :param name: string
+        :param country: string (None --> country names; else the provinces of this country)
+        :param n: int (at most this many)
+        :return: list of strings
+        """
+        text = name.strip().lower()
+        lower, names = self._names(country)
+        start, stop = self._prefixed(text, country)
+        if start < stop:
+            return list(dict.fromkeys(names[start:stop]))[:n]
+        close = difflib.get_close_matches(text, lower, n=n, cutoff=0.6)
+        return list(dict.fromkeys(names[lower.index(match)] for match in close))
+
+
+def _write(table, path):
+    dates = {col: table[col].dt.strftime('%Y-%m-%d') for col in ['First_Date', 'Last_Date']}
+    rows = table.assign(**dates).astype(object).where(table.notna(), None)
+    content = {'version': store.version(path), 'columns': list(rows.columns), 'rows': rows.values.tolist()}
+    tmp = catalog_path(path) + '.tmp'
+    with open(tmp, 'w') as file:
+        json.dump(content, file)
+    os.replace(tmp, catalog_path(path))
+
+
+def _read_table(path):
+    with open(catalog_path(path)) as file:
+        content = json.load(file)
+    table = pd.DataFrame(content['rows'], columns=content['columns'])
+    for col in ['First_Date', 'Last_Date']:
+        table[col] = pd.to_datetime(table[col])
+    return content['version'], table
+
+
+@prof.timed('catalog.build')
+def build(path=store.STORE_DIR):
+    """
+    Build the catalog from all the cleaned data in the store, one month at a time
+    :param path: string (store directory)
+    :return: Catalog
+    """
+    parts = store.read_manifest(path)['partitions']
+    table = _locations(pd.DataFrame({col: pd.Series(dtype=object) for col in KEYS + ['Date']}))
+    for key in sorted(parts):
+        month = store.read(KEYS + ['Date'], parts[key]['first'], parts[key]['last'], path=path)
+        table = _merge(table, _locations(month))
+    _write(table, path)
+    return Catalog(table)
+
+
+def update(df, path=store.STORE_DIR):
+    """
+    Add the locations of newly cleaned days to the catalog, just after they were appended to the store
+    (a catalog that is missing, or older than the store before that append, is built again)
+    :param df: DataFrame (newly cleaned data)
+    :param path: string (store directory)
+    :return: None
+    """
+    if os.path.exists(catalog_path(path)):
+        built_from, table = _read_table(path)
+        if built_from == store.version(path) - 1:
+            _write(_merge(table, _locations(df)), path)
+            return
+    build(path)
+
+
+def load(path=store.STORE_DIR):
+    """
+    The catalog of a store: read, or built again if there is none or the store changed since
+    :param path: string (store directory)
+    :return: Catalog
+    """
+    if os.path.exists(catalog_path(path)):
+        built_from, table = _read_table(path)
+        if built_from == store.version(path):
+            return Catalog(table)
+    return build(path)
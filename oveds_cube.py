@@ -0,0 +1,109 @@
+#-------------------------------------------------------------------------------
+# This library keeps the aggregate "cube" of the Covid-19 cleaned data:
+# the count columns summed by Date (world), by Date x Country, and by Date x Country x Province,
+# with the population of each location (oveds_population) and the counts per million and per 100k.
+# Each level is stored as its own month-partitioned store (oveds_store), under <store>/cubes/<level>,
+# and is updated with the same new days that are appended to the cleaned data.
+#-------------------------------------------------------------------------------
+import os
+import numpy as np
+import oveds_prof as prof
+import oveds_store as store
+import oveds_population as population
+
+LEVELS = {'world': [],                                              # group keys (besides the date)
+          'country': ['Country_Region'],
+          'province': ['Country_Region', 'Province_State']}
+
+SUM_COLUMNS = ['Confirmed', 'Deaths', 'Recovered', 'Active']
+PER_CAPITA = {'_per_million': 1, '_per_100k': 10}                   # suffix: people per unit, in units of 100k
+COLUMNS = SUM_COLUMNS + ['Population'] + [col + suffix for suffix in PER_CAPITA for col in SUM_COLUMNS]
+
+
+def cube_path(level, path=store.STORE_DIR):
+    return os.path.join(path, 'cubes', level)
+
+
+def exists(path=store.STORE_DIR):
+    """
+    :return: Boolean (all levels of the cube are stored, with all COLUMNS)
+    """
+    return all(store.exists(cube_path(level, path)) and
+               set(COLUMNS) <= set(store.read_manifest(cube_path(level, path))['columns']) for level in LEVELS)
+
+
+def rollup(df, level, pop_table):
+    """
+    Sum the count columns of cleaned data at a given level, and add the population and per-capita columns
+    :param df: DataFrame (cleaned data)
+    :param level: string ('world', 'country' or 'province')
+    :param pop_table: DataFrame (the population table, oveds_population)
+    :return: DataFrame (Date, the level keys, and COLUMNS)
+    """
+    values = df[SUM_COLUMNS].astype('float64')
+    keys = ['Date'] + LEVELS[level]
+    for key in keys:
+        values[key] = df[key]
+    cube = values.groupby(keys, observed=True, dropna=False, sort=True)[SUM_COLUMNS].sum().reset_index()
+
+    pops = population.level_population(pop_table, level)             # in millions, by location
+    if LEVELS[level]:
+        locations = cube[LEVELS[level]].astype(object)
+        cube['Population'] = locations.join(pops, on=LEVELS[level])['Population'].to_numpy()
+    else:
+        cube['Population'] = pops.iloc[0]
+    for suffix, units in PER_CAPITA.items():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for col in SUM_COLUMNS:
+                cube[col + suffix] = (cube[col] / (cube['Population'] * units)).astype(np.float32)
+    return cube
+
+
+@prof.timed('cube.update')
+def update(df, path=store.STORE_DIR):
+    """
+    Add the rollups of newly cleaned days to all levels of the cube (rows of those dates are replaced)
+    :param df: DataFrame (cleaned data of whole days)
+    :param path: string (store directory)
+    :return: None
+    """
+    pop_table = population.read(path)
+    for level in LEVELS:
+        store.append(rollup(df, level, pop_table), cube_path(level, path))
+    store.touch(path)
+
+
+@prof.timed('cube.build')
+def build(path=store.STORE_DIR):
+    """
+    Rebuild all levels of the cube from the cleaned data, one month at a time
+    :param path: string (store directory)
+    :return: None
+    """
+    columns = ['Country_Region', 'Province_State', 'Confirmed', 'Deaths', 'Recovered', 'Active', 'Date']
+    pop_table = population.read(path)
+    manifest = store.read_manifest(path)
+    for ii, key in enumerate(sorted(manifest['partitions'])):
+        part = manifest['partitions'][key]
+        month = store.read(columns, part['first'], part['last'], path=path)
+        for level in LEVELS:
+            cube = rollup(month, level, pop_table)
+            if ii == 0:
+                store.write(cube, cube_path(level, path))
+            else:
+                store.append(cube, cube_path(level, path))
+    store.touch(path)
+
+
+def read(level, columns=None, start=None, end=None, countries=None, path=store.STORE_DIR):
+    """
+    Read one level of the cube
+    :param level: string ('world', 'country' or 'province')
+    :param columns: list of column names (None --> all)
+    :param start: date (None --> from the first date)
+    :param end: date, inclusive (None --> up to the last date)
+    :param countries: list of Country_Region names (None --> all; not for the 'world' level)
+    :param path: string (store directory)
+    :return: DataFrame
+    """
+    return store.read(columns, start, end, countries, cube_path(level, path))
@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+# This library gives the Covid-19 report functions access to the data:
+# the cleaned (row-level) data, the aggregate cube and its derived series (daily changes, means,
+# growth rates), each read from the store when first needed, the spatial index and the catalog of the locations.
+# All frames are kept sorted by date, with a date --> row-range index, so any single day
+# (the latest, or an "as of" date) is a slice rather than a scan.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import oveds_store as store
+import oveds_cube as cube
+import oveds_derive as derive
+import oveds_spatial as spatial
+import oveds_catalog as catalog
+
+
+def date_index(dates):
+    """
+    Build a date --> row-range index over a sorted date column
+    :param dates: numpy datetime64 array (sorted)
+    :return: dict {Timestamp: (first row, last row + 1)}
+    """
+    days, starts = np.unique(dates, return_index=True)
+    stops = np.append(starts[1:], len(dates))
+    return {pd.Timestamp(day): (start, stop) for day, start, stop in zip(days, starts, stops)}
+
+
+def version(path=store.STORE_DIR):
+    """
+    The data version of a store directory: goes up on every write to the cleaned data, the cube or the derived
+    series (also when the whole store is written again)
+    :param path: string (store directory)
+    :return: int
+    """
+    return store.data_version(path)
+
+
+def _sorted_by_date(df):
+    dates = df['Date'].to_numpy()
+    if len(dates) and not (dates[1:] >= dates[:-1]).all():
+        df = df.iloc[np.argsort(dates, kind='stable')].reset_index(drop=True)
+    return df
+
+
+class Dataset:
+    """
+    The cleaned data of a store directory, and its aggregate cube
+    """
+
+    def __init__(self, path=store.STORE_DIR):
+        self.path = path
+        self.version = version(path)                               # the data version of the frames in memory
+        self._frame = None
+        self._cubes = {}
+        self._derived = {}
+        self._indexes = {}
+        self._spatial = None
+        self._catalog = None
+
+    def refresh(self):
+        """
+        Drop the frames in memory if the store has changed since they were read (they are read again when needed)
+        :return: Boolean (True if the data changed)
+        """
+        new_version = version(self.path)
+        if new_version == self.version:
+            return False
+        self.version = new_version
+        self._frame = None
+        self._cubes, self._derived, self._indexes = {}, {}, {}
+        self._spatial = None
+        self._catalog = None
+        return True
+
+    @property
+    def frame(self):
+        """
+        All cleaned (row-level) data, sorted by date
+        :return: DataFrame
+        """
+        if self._frame is None:
+            self._frame = _sorted_by_date(store.read(path=self.path))
+        return self._frame
+
+    def cube(self, level):
+        """
+        One level of the aggregate cube ('world', 'country' or 'province'), sorted by date
+        :return: DataFrame
+        """
+        if level not in self._cubes:
+            self._cubes[level] = _sorted_by_date(cube.read(level, path=self.path))
+        return self._cubes[level]
+
+    def derived(self, level):
+        """
+        The derived series of one level of the cube (oveds_derive), sorted by date
+        :return: DataFrame
+        """
+        if level not in self._derived:
+            self._derived[level] = _sorted_by_date(derive.read(level, path=self.path))
+        return self._derived[level]
+
+    def spatial(self):
+        """
+        The spatial index of the locations (oveds_spatial)
+        :return: GridIndex
+        """
+        if self._spatial is None:
+            self._spatial = spatial.build(self.path)
+        return self._spatial
+
+    def catalog(self):
+        """
+        The catalog of the locations, and name lookup (oveds_catalog)
+        :return: Catalog
+        """
+        if self._catalog is None:
+            self._catalog = catalog.load(self.path)
+        return self._catalog
+
+    def _index(self, level):
+        if level not in self._indexes:
+            df = self.frame if level is None else self.cube(level)
+            self._indexes[level] = date_index(df['Date'].to_numpy())
+        return self._indexes[level]
+
+    def day(self, the_date, level=None):
+        """
+        The rows of a single date
+        :param the_date: date
+        :param level: string (a cube level), or None for the row-level data
+        :return: DataFrame (empty if there is no data for that date)
+        """
+        df = self.frame if level is None else self.cube(level)
+        start, stop = self._index(level).get(pd.Timestamp(the_date), (0, 0))
+        return df.iloc[start:stop]
+
+    def latest(self):
+        """
+        The date of the latest data in memory (the store on disk may be newer, until refresh)
+        :return: Timestamp (NaT if there is no data)
+        """
+        index = self._index('world')
+        return max(index) if index else pd.NaT
+
+    def as_of(self, the_date=None):
+        """
+        The latest date with data, on or before a given date
+        :param the_date: date (None --> the latest data)
+        :return: Timestamp
+        """
+        if the_date is None:
+            return self.latest()
+        the_date = pd.Timestamp(the_date)
+        index = self._index('world')
+        if the_date in index:
+            return the_date
+        days = sorted(index)
+        pos = np.searchsorted(np.array(days, dtype='datetime64[ns]'), the_date.to_datetime64(), 'right')
+        if pos == 0:
+            raise ValueError('No data on or before ' + the_date.strftime('%d-%B-%Y'))
+        return days[pos - 1]
+
+    def countries(self):
+        """
+        :return: sorted list of all country names
+        """
+        return self.catalog().countries()
@@ -0,0 +1,150 @@
+#-------------------------------------------------------------------------------
+# This library keeps the derived time-series of the Covid-19 data, for every location at once:
+#     New_<col>        - daily change of each count column (Confirmed, Deaths, Recovered, Active)
+#     Avg_<col>        - WINDOW-day (trailing) mean of the daily change
+#     Growth_<col>     - daily growth rate over the last WINDOW days, in % (Confirmed and Deaths)
+#     Doubling_<col>   - doubling time at that growth rate, in days (Confirmed and Deaths)
+# computed from each level of the cube (oveds_cube) in a single groupwise NumPy pass, and stored
+# as its own month-partitioned store (oveds_store) under <store>/derived/<level>.
+# The changes are taken between calendar days: a day a location is missing from has no change to or
+# from it, and the means (not the growth rates) need every change of their window.
+# New days are derived from a short lookback of the cube, and only their months are rewritten;
+# a rebuild derives one month at a time, the same way.
+#-------------------------------------------------------------------------------
+import os
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import oveds_prof as prof
+import oveds_store as store
+import oveds_cube as cube
+
+WINDOW = 5                                                          # days, for the means and the growth rates
+LOOKBACK = 3 * WINDOW                                               # days of the cube read before the new days
+
+COUNT_COLUMNS = ['Confirmed', 'Deaths', 'Recovered', 'Active']
+GROWTH_COLUMNS = ['Confirmed', 'Deaths']
+
+
+def derived_path(level, path=store.STORE_DIR):
+    return os.path.join(path, 'derived', level)
+
+
+def exists(path=store.STORE_DIR):
+    return all(store.exists(derived_path(level, path)) for level in cube.LEVELS)
+
+
+def derive(cube_df, level, start=None):
+    """
+    Derive the daily changes, means, growth rates and doubling times of all locations of a cube level
+    :param cube_df: DataFrame (one level of the cube; a location may be missing on some days)
+    :param level: string ('world', 'country' or 'province')
+    :param start: date (None --> all dates; else only rows from this date on are returned)
+    :return: DataFrame (Date, the level keys, and the derived columns, as float32)
+    """
+    keys = cube.LEVELS[level]
+    n = len(cube_df)
+    days = cube_df['Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    if keys:
+        group = cube_df.groupby(keys, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    else:
+        group = np.zeros(n, dtype=np.int64)
+    order = np.lexsort((days, group))                               # by location, then by date
+    sorted_group, sorted_days = group[order], days[order]
+    is_first = np.ones(n, dtype=bool)
+    is_first[1:] = sorted_group[1:] != sorted_group[:-1]
+
+    # a grid of every calendar day of each location, from its first day to its last
+    starts = np.flatnonzero(is_first)                               # the first row of each location
+    ends = np.flatnonzero(np.append(is_first[1:], True)[:n])        # ... and its last row
+    location = np.cumsum(is_first) - 1
+    lengths = sorted_days[ends] - sorted_days[starts] + 1
+    offsets = np.cumsum(lengths) - lengths                          # the first cell of each location
+    cell = offsets[location] + sorted_days - sorted_days[starts][location]      # the cell of each row
+    m = int(lengths.sum())
+    grid = np.arange(m)
+    pos = grid - np.repeat(offsets, lengths)                        # days since the location's first day
+    present = np.zeros(m, dtype=bool)
+    present[cell] = True
+    changed = np.zeros(m, dtype=bool)                               # a change from the day before
+    changed[1:] = present[1:] & present[:-1] & (pos[1:] > 0)
+    full = pos >= WINDOW                                            # a whole window of daily changes behind
+    back = np.where(full, grid - WINDOW, 0)
+    missing = np.concatenate([[0], np.cumsum(~changed)])
+    complete = full & (missing[grid + 1] == missing[back + 1])      # ... and none missing
+
+    derived = {}
+    for col in COUNT_COLUMNS:
+        values = np.full(m, np.nan)
+        values[cell] = cube_df[col].to_numpy(dtype=np.float64)[order]
+        new = np.full(m, np.nan)
+        new[1:] = values[1:] - values[:-1]
+        new[~changed] = np.nan                                      # no change after a missing day
+        sums = np.concatenate([[0.0], np.cumsum(np.nan_to_num(new))])
+        derived['New_' + col] = new[cell]
+        derived['Avg_' + col] = np.where(complete, (sums[grid + 1] - sums[back + 1]) / WINDOW, np.nan)[cell]
+        if col in GROWTH_COLUMNS:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratio = np.where(full & (values[back] > 0), values / values[back], np.nan)[cell]
+                derived['Growth_' + col] = 100 * (ratio ** (1 / WINDOW) - 1)
+                derived['Doubling_' + col] = np.where(ratio > 1, WINDOW * np.log(2) / np.log(ratio), np.nan)
+
+    result = cube_df[['Date'] + keys].reset_index(drop=True)
+    names = ['New_' + col for col in COUNT_COLUMNS] + ['Avg_' + col for col in COUNT_COLUMNS] + \
+            ['Growth_' + col for col in GROWTH_COLUMNS] + ['Doubling_' + col for col in GROWTH_COLUMNS]
+    for col in names:
+        column = np.empty(n, dtype=np.float32)
+        column[order] = derived[col]                                # back to the order of the cube
+        result[col] = column
+    if start is not None:
+        result = result[result['Date'] >= pd.Timestamp(start)].reset_index(drop=True)
+    return result
+
+
+@prof.timed('derive.update')
+def update(first, path=store.STORE_DIR):
+    """
+    Derive the series of new days at all levels (rows of those dates are replaced)
+    :param first: date (the first new date; the cube is already updated)
+    :param path: string (store directory)
+    :return: None
+    """
+    start = pd.Timestamp(first).date() - timedelta(LOOKBACK)
+    for level in cube.LEVELS:
+        store.append(derive(cube.read(level, start=start, path=path), level, first), derived_path(level, path))
+    store.touch(path)
+
+
+@prof.timed('derive.build')
+def build(path=store.STORE_DIR):
+    """
+    Rebuild the derived series of all levels from the cube, one month at a time (with a lookback)
+    :param path: string (store directory)
+    :return: None
+    """
+    for level in cube.LEVELS:
+        parts = store.read_manifest(cube.cube_path(level, path))['partitions']
+        if not parts:
+            store.write(derive(cube.read(level, path=path), level), derived_path(level, path))
+        for ii, key in enumerate(sorted(parts)):
+            first = date.fromisoformat(parts[key]['first'])
+            cube_df = cube.read(level, start=first - timedelta(LOOKBACK), end=parts[key]['last'], path=path)
+            if ii == 0:
+                store.write(derive(cube_df, level), derived_path(level, path))
+            else:
+                store.append(derive(cube_df, level, first), derived_path(level, path))
+    store.touch(path)
+
+
+def read(level, columns=None, start=None, end=None, countries=None, path=store.STORE_DIR):
+    """
+    Read the derived series of one level
+    :param level: string ('world', 'country' or 'province')
+    :param columns: list of column names (None --> all)
+    :param start: date (None --> from the first date)
+    :param end: date, inclusive (None --> up to the last date)
+    :param countries: list of Country_Region names (None --> all; not for the 'world' level)
+    :param path: string (store directory)
+    :return: DataFrame
+    """
+    return store.read(columns, start, end, countries, derived_path(level, path))
@@ -0,0 +1,165 @@
+#-------------------------------------------------------------------------------
+# This library is the plot engine of the Covid-19 reports (under oveds_accs.oveds_plot):
+#     figure()        - a single figure, reused (cleared) from plot to plot instead of a new one each time
+#     lines()         - draw one or many time-series on an axes; long series are downsampled to about
+#                       MAX_POINTS points (Largest-Triangle-Three-Buckets, with the highest and lowest
+#                       point of each series always kept), many series are drawn as one collection
+#     date_axis()     - a date axis with a few readable ticks, whatever the time span
+# matplotlib is imported when the first plot is drawn (it is slow to import, and not needed for the menu).
+#-------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 500                # points drawn per series (about the width of the figure, in pixels)
+LEGEND_MAX = 12                 # up to this many series are drawn one by one, with a legend
+
+_plt = None                     # matplotlib.pyplot, once imported
+_figure = None                  # the reused figure
+
+
+def pyplot():
+    """
+    matplotlib.pyplot, imported when the first plot is drawn
+    :return: module
+    """
+    global _plt
+    if _plt is None:
+        import matplotlib.pyplot as plt
+        from pandas.plotting import register_matplotlib_converters
+        register_matplotlib_converters()                            # for plotting with x-axis as dates
+        _plt = plt
+    return _plt
+
+
+def figure(figsize=None):
+    """
+    The reused figure, cleared, with a single axes; it is made the current figure (for plt.title etc.)
+    :param figsize: tuple (width, height) in inches (None --> the matplotlib default)
+    :return: tuple (Figure, Axes)
+    """
+    global _figure
+    plt = pyplot()
+    if _figure is None or not plt.fignum_exists(_figure.number):   # none yet, or closed by the user
+        _figure = plt.figure()
+    else:
+        _figure.clf()
+        plt.figure(_figure.number)
+    _figure.set_size_inches(figsize or plt.rcParams['figure.figsize'])
+    return _figure, _figure.add_subplot()
+
+
+def release():
+    """
+    Close all figures but the reused one (after a plot was shown or saved)
+    :return: None
+    """
+    if _plt is not None:
+        for number in _plt.get_fignums():
+            if _figure is None or number != _figure.number:
+                _plt.close(number)
+
+
+def date_numbers(values):
+    """
+    :param values: dates (list, Index or array)
+    :return: numpy array of matplotlib date numbers (days)
+    """
+    dates = pd.DatetimeIndex(values).to_numpy(dtype='datetime64[s]').astype(np.float64)
+    return dates / 86400                                            # days since 1970-01-01, matplotlib's epoch
+
+
+def lttb(x, y, n_out=MAX_POINTS):
+    """
+    Largest-Triangle-Three-Buckets downsampling of one or many series over the same x: the first and last
+    points are kept, and of each of n_out - 2 buckets the point that makes the largest triangle with the
+    point kept before it and the mean of the next bucket. The bucket of the highest and of the lowest
+    point of a series keeps that point
+    :param x: numpy array (n,)
+    :param y: numpy array (n,), or (m, n) for m series
+    :param n_out: int
+    :return: numpy array of indices into x: (n_out,), or (m, n_out); all of them if n <= n_out
+    """
+    y = np.asarray(y, dtype=np.float64)
+    single = y.ndim == 1
+    y = np.atleast_2d(y)
+    m, n = y.shape
+    if n <= n_out or n_out < 3:
+        rows = np.tile(np.arange(n), (m, 1))
+        return rows[0] if single else rows
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)     # n_out - 2 buckets between first and last
+    edges = np.append(edges, n)                                     # the last "bucket" is the last point
+    finite = np.isfinite(y)
+    peaks = [np.argmax(np.where(finite, y, -np.inf), axis=1), np.argmin(np.where(finite, y, np.inf), axis=1)]
+    series = np.arange(m)
+    chosen = np.empty((m, n_out), dtype=np.int64)
+    chosen[:, 0], chosen[:, -1] = 0, n - 1
+    a = np.zeros(m, dtype=np.int64)
+    for bb in range(n_out - 2):
+        start, stop, next_stop = edges[bb], edges[bb + 1], edges[bb + 2]
+        avg_x = x[stop:next_stop].mean()
+        avg_y = np.nanmean(y[:, stop:next_stop], axis=1) if finite[:, stop:next_stop].any() else np.zeros(m)
+        x_a, y_a = x[a], y[series, a]
+        area = np.abs((x_a - avg_x)[:, None] * (y[:, start:stop] - y_a[:, None]) -
+                      (x_a[:, None] - x[start:stop]) * (avg_y - y_a)[:, None])
+        pick = start + np.argmax(np.where(np.isnan(area), -1, area), axis=1)
+        for peak in peaks:                                          # keep the highest and lowest points
+            pick = np.where((peak >= start) & (peak < stop), peak, pick)
+        chosen[:, bb + 1] = a = pick
+    return chosen[0] if single else chosen
+
+
+def date_axis(ax):
+    """
+    A date x-axis with a few readable ticks (for any time span)
+    :param ax: Axes
+    :return: None
+    """
+    import matplotlib.dates as mdates
+    locator = mdates.AutoDateLocator(minticks=4, maxticks=10)
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+
+def lines(ax, x, ys, labels=None, max_points=MAX_POINTS, legend_max=LEGEND_MAX):
+    """
+    Draw time-series on an axes: each downsampled to max_points; up to legend_max series are drawn one by one,
+    with a legend (if labelled), more as a single collection
+    :param ax: Axes
+    :param x: dates (list, Index or array)
+    :param ys: DataFrame (a column per series), Series, or numpy array (n,) or (m, n)
+    :param labels: list of strings (default: the columns of a DataFrame, the name of a Series)
+    :param max_points: int
+    :param legend_max: int
+    :return: int (number of points drawn)
+    """
+    from matplotlib.collections import LineCollection
+    if isinstance(ys, pd.DataFrame):
+        labels = list(ys.columns) if labels is None else labels
+        values = ys.to_numpy(dtype=np.float64).T
+    elif isinstance(ys, pd.Series):
+        labels = [ys.name] if labels is None and ys.name is not None else labels
+        values = ys.to_numpy(dtype=np.float64)[None, :]
+    else:
+        values = np.atleast_2d(np.asarray(ys, dtype=np.float64))
+    xs = date_numbers(x)
+    if len(xs) == 0:
+        return 0
+
+    rows = lttb(xs, values, max_points)
+    x_drawn = xs[rows]
+    y_drawn = np.take_along_axis(values, rows, axis=1)
+    if len(values) <= legend_max:
+        for ii in range(len(values)):
+            ax.plot(x_drawn[ii], y_drawn[ii], label=None if labels is None else labels[ii])
+        if labels is not None and len(values) > 1:
+            ax.legend()
+    else:
+        cycle = pyplot().rcParams['axes.prop_cycle'].by_key()['color']
+        segments = np.stack([x_drawn, y_drawn], axis=2)
+        ax.add_collection(LineCollection(segments, colors=[cycle[ii % len(cycle)] for ii in range(len(values))],
+                                         linewidths=1))
+        ax.autoscale_view()
+    ax.xaxis_date()
+    date_axis(ax)
+    return rows.size
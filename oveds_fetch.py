@@ -0,0 +1,192 @@
+#-------------------------------------------------------------------------------
+# This library fetches the JHU daily-report files for the Covid-19 package
+# Files are fetched concurrently (bounded thread pool), with a timeout per request,
+# retries with exponential backoff, and a clean stop at the first missing date.
+# The source may be the GitHub URL, any other base URL (a mirror), or a local directory.
+# A file already fetched can be rechecked cheaply: a conditional request with its ETag (for a URL),
+# or its size and modification time (for a local file), downloads it only if it has changed.
+#-------------------------------------------------------------------------------
+import os
+import time
+import urllib.request
+import urllib.error
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import oveds_prof as prof
+
+DAILY_REPORTS_URL = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/' \
+                    'csse_covid_19_daily_reports/'
+
+WORKERS = 8                     # concurrent requests
+TIMEOUT = 30                    # seconds, per request
+RETRIES = 3                     # retries after the first attempt
+BACKOFF = 1.0                   # seconds, doubled on every retry
+
+
+class FetchError(Exception):
+    """A file could not be fetched, even after all retries"""
+
+
+def default_source():
+    """
+    The source of the daily files: $OVEDS_SOURCE if set, else the JHU GitHub repository
+    :return: string (base URL or local directory)
+    """
+    return os.environ.get('OVEDS_SOURCE', DAILY_REPORTS_URL)
+
+
+def file_name(the_date):
+    """
+    The JHU file name of a given date
+    :param the_date: date
+    :return: string
+    """
+    return the_date.strftime('%m-%d-%Y') + '.csv'
+
+
+def is_url(source):
+    return source.startswith(('http://', 'https://', 'file://'))
+
+
+def _request(source, name, headers, timeout, retries, backoff):
+    """
+    A GET request of a file, with retries
+    :return: tuple (status code, bytes (None unless the status is 200), ETag or None)
+    """
+    request = urllib.request.Request(source.rstrip('/') + '/' + name, headers=headers)
+    attempt = 0
+    while True:
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as resp:
+                return resp.status, resp.read(), resp.headers.get('ETag')
+        except urllib.error.HTTPError as err:
+            if err.code in (304, 404):                              # not modified; not published (yet)
+                return err.code, None, err.headers.get('ETag')
+            error = err
+        except (urllib.error.URLError, OSError) as err:             # network errors and timeouts
+            error = err
+        if attempt >= retries:
+            raise FetchError('%s: %s' % (name, error))
+        time.sleep(backoff * 2 ** attempt)                          # back off before the next attempt
+        attempt += 1
+
+
+def _local_etag(path):
+    stat = os.stat(path)
+    return '%x-%x' % (stat.st_size, stat.st_mtime_ns)
+
+
+def fetch_file(source, name, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """
+    Fetch a single file
+    :param source: string (base URL or local directory)
+    :param name: string (file name)
+    :return: bytes (file content), or None if the file does not exist
+    """
+    if not is_url(source):                                          # a local mirror
+        path = os.path.join(source, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as file:
+            return file.read()
+    return _request(source, name, {}, timeout, retries, backoff)[1]
+
+
+def fetch_revision(source, name, etag=None, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """
+    Fetch a file again, unless it is unchanged since it was fetched with the given ETag
+    :param source: string (base URL or local directory)
+    :param name: string (file name)
+    :param etag: string (ETag of the last fetch), or None (--> always fetched)
+    :return: tuple (bytes, or None if not modified or not found; ETag or None)
+    """
+    if not is_url(source):
+        path = os.path.join(source, name)
+        if not os.path.exists(path):
+            return None, None
+        local_etag = _local_etag(path)
+        if local_etag == etag:
+            return None, etag
+        with open(path, 'rb') as file:
+            return file.read(), local_etag
+    status, content, new_etag = _request(source, name, {'If-None-Match': etag} if etag else {},
+                                         timeout, retries, backoff)
+    return content, (new_etag or etag) if status == 304 else new_etag
+
+
+def fetch_one(source, the_date, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """
+    Fetch the daily file of a single date
+    :param source: string (base URL or local directory)
+    :param the_date: date
+    :return: bytes (file content), or None if the file does not exist
+    """
+    return fetch_file(source, file_name(the_date), timeout, retries, backoff)
+
+
+@prof.timed('fetch.recheck')
+def recheck(days, etags, source=None, workers=WORKERS, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """
+    Recheck the daily files of some dates, concurrently (see fetch_revision)
+    :param days: list of dates
+    :param etags: dict {date: ETag} (of the last fetch; a date not in it is always fetched)
+    :param source: string (base URL or local directory), default_source() if None
+    :return: dict {date: (bytes or None, ETag or None)}; dates that failed all retries are left out
+    """
+    if source is None:
+        source = default_source()
+    checked = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {the_date: pool.submit(fetch_revision, source, file_name(the_date), etags.get(the_date),
+                                         timeout, retries, backoff) for the_date in days}
+        for the_date, future in futures.items():
+            try:
+                checked[the_date] = future.result()
+            except FetchError as err:
+                print('failed:', err)
+    return checked
+
+
+@prof.timed('fetch')
+def fetch_range(first, last, source=None, workers=WORKERS, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+    """
+    Fetch the daily files from first up to (not including) last.
+    Up to 'workers' requests are in flight at a time; the results are collected in date order,
+    and fetching stops at the first missing date (or the first date that failed all retries)
+    :param first: date
+    :param last: date
+    :param source: string (base URL or local directory), default_source() if None
+    :return: dict {date: bytes}, for consecutive dates starting at first
+    """
+    if source is None:
+        source = default_source()
+
+    dates = (first + timedelta(ii) for ii in range(max((last - first).days, 0)))
+    found = {}
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit_next():
+            the_date = next(dates, None)
+            if the_date is not None:
+                pending.append((the_date, pool.submit(fetch_one, source, the_date, timeout, retries, backoff)))
+
+        for ii in range(2 * workers):                               # keep the pool busy, but bounded
+            submit_next()
+
+        while pending:
+            the_date, future = pending.popleft()
+            try:
+                content = future.result()
+            except FetchError as err:
+                print('failed:', err)
+                content = None
+            if content is None:
+                print('last found:', the_date - timedelta(1))
+                for other_date, other in pending:                   # stop at the first missing date
+                    other.cancel()
+                break
+            found[the_date] = content
+            submit_next()
+
+    return found
@@ -3,64 +3,62 @@
 # Written by Oved Dahari on September 24, 2020.
 # Version 1.7
 # 'hue' removed from seaborn.lineplot (see row 101). 23-March-2021
+# Version 1.8: plots are drawn by oveds_draw, seaborn is no longer used
 #-------------------------------------------------------------------------
 
 import pandas as pd
-from datetime import datetime, timedelta
-import pickle
+from datetime import timedelta
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sb
 import oveds_accs as oda
-    # this for plotting with x-axis as dates:
-from pandas.plotting import register_matplotlib_converters
-register_matplotlib_converters()
+import oveds_data as ds
+import oveds_derive as derive
+import oveds_query as query
+import oveds_prof as prof
+import oveds_draw as draw
+    # matplotlib is imported when a plot is drawn (see draw.pyplot)
 
 #------------------------------------------------
-def print_5rows(df_all):
+@prof.timed('report:print_5rows')
+def print_5rows(data):
     """
     This function just prints the first 5 rows of the data,
     as well as various parameters of the DataFrame
-    :param df_all: DataFrame
+    :param data: Dataset (oveds_data)
     :return: none
     """
+    df_all = data.frame
     print('First 5 rows of the combined DataFrame:')
     print('---------------------------------------')
     print(df_all.head(5))
     print(df_all.dtypes)
+    print('Memory usage: %.1fMB' % (df_all.memory_usage(deep=True).sum() / 2**20))
     print(df_all.describe())
 
 
-def plot_daily(df_all):
+@prof.timed('report:plot_daily')
+def plot_daily(data, country=None, province=None, option=None):
     """
     This method draws 2 plots: time-series of total and daily-change
     for a single parameter for a single country (or Province/State), chosen by the user
-    :param df_all: DataFrame
+    :param data: Dataset (oveds_data)
+    :param country: string, or 'World' (None --> ask the user)
+    :param province: string, '' for the whole country (None --> ask the user)
+    :param option: string, data column or 'Death_Rate' (None --> ask the user)
     :return: None
     """
-    country = oda.select_country(df_all)                        # select a country (or World)
-    province = ''
-    if country != 'World':
-        province = oda.select_province(df_all, country)         # select a province/region
-
-    option = oda.select_data(country)                           # select the data to display
-
-    if country == 'World':
-        w_df = df_all.groupby(['Date']).sum()
-        if option == 'Death_Rate':
-            w_df[option] = 100 * w_df['Deaths'] / w_df['Confirmed']
-        y_data = list(w_df[option])                             # get the y-axis values from DF
-        x_data = list(ind for ind in w_df.index)                # set x-axis data from dates
-    else:
-        if province == '':
-            sub_df = df_all.loc[df_all['Country_Region'] == country].groupby(['Date', 'Country_Region']).sum()
-        else:
-            country_df = df_all.loc[(df_all['Country_Region'] == country) & (df_all['Province_State'] == province)]
-            sub_df = country_df.groupby(['Date', 'Province_State']).sum()
-        if option == 'Death_Rate':
-            sub_df[option] = 100 * sub_df['Deaths'] / sub_df['Confirmed']
-        y_data = list(sub_df[option])
-        x_data = list(ind[0] for ind in sub_df.index)
+    if country is None:
+        country = oda.select_country(data)                      # select a country (or World)
+    if province is None:
+        province = ''
+        if country != 'World':
+            province = oda.select_province(data, country)       # select a province/region
+
+    if option is None:
+        option = oda.select_data(country)                       # select the data to display
+
+    total = query.series(data, (country, province), option)     # time-series from the cube
+    y_data = list(total)                                        # get the y-axis values
+    x_data = list(total.index)                                  # set x-axis data from dates
 
     if option != 'Death_Rate':
         title = country + ' ' + province + ': Total ' + option + ' vs. time'
@@ -70,56 +68,55 @@ def plot_daily(df_all):
     print('--- Close plot to continue ---')
     oda.oveds_plot(x_data, y_data, 'line', title)
 
-        # now plot the daily-chnage data, averaged over 5 days
+        # now plot the daily-change data, averaged over 5 days (centered on each date)
     if option != 'Death_Rate':
-        x_data1 = x_data[3:-2]
-        y_data2 = np.diff(y_data)
-        filter = np.ones(5) * 0.2                               # delta function over 5 days (sum = 1)
-        y_data = np.convolve(y_data2, filter)[4:-4]             # convolve to smooth the data
-        title = country + ' ' + province + ': 5-day average of daily ' + option + ' vs. time'
-        oda.oveds_plot(x_data1, y_data, 'line', title)
+        avg = query.series(data, (country, province), 'Avg_' + option)
+        avg = avg.shift(-(derive.WINDOW // 2)).dropna()         # the stored mean is trailing
+        title = country + ' ' + province + ': ' + str(derive.WINDOW) + '-day average of daily ' + option + ' vs. time'
+        oda.oveds_plot(list(avg.index), list(avg), 'line', title)
 
 #------------------------------------------------
-def plot_all4(df_all):
+@prof.timed('report:plot_all4')
+def plot_all4(data, country=None):
     """
     Plot time-series the data for a single country or the whole world
-    :param df_all: DataFrame (all data)
+    :param data: Dataset (oveds_data)
+    :param country: string, or 'World' (None --> ask the user)
     :return: None
     """
-    country = oda.select_country(df_all)                        # select a country (or World)
-
-        # build a dataframe with multi-index (date-country)
-    if country == 'World':
-        sub_df = df_all.groupby(['Date']).sum()
-    else:
-        sub_df = df_all.loc[df_all['Country_Region'] == country].groupby(['Date', 'Country_Region']).sum()
+    if country is None:
+        country = oda.select_country(data)                      # select a country (or World)
 
+        # build a dataframe indexed by date
     names = ['Confirmed', 'Deaths', 'Recovered', 'Active']
-    sub_df2 = sub_df[names]
-    sub_df2.index = sub_df2.index.get_level_values(0)
-
-                                                # plot with Seaborn
-    # sb.lineplot(data=sub_df2, hue=names)
-    sb.lineplot(data=sub_df2)
-    plt.title(country + ': Total cases vs. time')
-    plt.annotate('\xa9Oved_Dahari', (sub_df2.index[0], max(sub_df2['Confirmed'] * 0.1)))
+    sub_df2 = query.series(data, country, names)
+
+                                                # plot the 4 series on one axes
+    fig, ax = draw.figure()
+    draw.lines(ax, sub_df2.index, sub_df2)
+    title = country + ': Total cases vs. time'
+    ax.set_title(title)
+    ax.annotate('\xa9Oved_Dahari', (0.02, 0.95), xycoords='axes fraction')
     print('--- Close plot continue ---')
-    plt.xticks(rotation = 30)
-    plt.grid(True)
-    plt.show()
+    ax.grid(True)
+    oda.show_plot(title, sub_df2)
 
 #------------------------------------------------
 
-def stats_for_all_over(df_all):
+@prof.timed('report:stats_for_all_over')
+def stats_for_all_over(data, as_of=None, option=None, over=None):
     """
     Makes plots of latest data for all countries with total death > input, for data selected by the user
-    :param df_all: DataFrame (all data)
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
+    :param option: string, data column or 'Death_Rate' (None --> ask the user)
+    :param over: int, minimum number of deaths (None --> ask the user)
     :return: none
     """
-    option = oda.select_data('all')                      # select the data for display
+    if option is None:
+        option = oda.select_data('all')                  # select the data for display
 
-    inp_ok = False
-    over = 0
+    inp_ok = over is not None
     while not inp_ok:
         inp = input('Enter minimum number of deaths:')
         if inp.isnumeric():
@@ -128,94 +125,90 @@ def stats_for_all_over(df_all):
         else:
             print('Try again...')
 
-    latest = df_all['Date'].max()                                   # get the date of the latest data
-    sub_df1 = df_all.loc[df_all['Date'] == latest]
-    sub_df1a = sub_df1.copy()
-    sub_df1a['Population'] = sub_df1['Confirmed'] / (sub_df1['Incidence_Rate'] * 10)  # produce a population column
-    sub_df2 = sub_df1a.groupby(['Country_Region']).sum()               # group by country
+    latest = data.as_of(as_of)                                      # get the date of the latest data
+    sub_df2 = query.snapshot(data, latest)                          # latest data by country
     sub_df = sub_df2.loc[sub_df2['Deaths'] > over]                      # select only those with deaths > input
 
     print('--- Close plot continue ---')
     title = option + ' as of ' + latest.strftime('%d-%B-%Y') + ' (Deaths >' + str(over) +')'
     if option == 'Death_Rate':
         title = option + ' (in %) as of ' + latest.strftime('%d-%B-%Y') + ' (Deaths >' + str(over) + ')'
-        sub_df1 = sub_df.copy()
-        sub_df1[option] = 100* sub_df['Deaths'] / sub_df['Confirmed']
-        sub_df = sub_df1.copy()
 
-    oda.oveds_plot(sub_df.index, sub_df[option], 'bar', title)
+    oda.oveds_plot(sub_df.index, query.metric_values(sub_df, option), 'bar', title)
                                           # plot the per-million data
     if option != 'Death_Rate':
-        sub_df1 = sub_df.copy()
-        # sub_df1['Population'] = sub_df['Confirmed'] / (sub_df['Incidence_Rate'] * 10)  # produce a population column
-        sub_df3 = sub_df1[sub_df1['Population'].notnull()]
+        sub_df3 = sub_df[sub_df['Population'].notnull()]
         title = option + ' per million, as of ' + latest.strftime('%d-%B-%Y') + ' (Deaths >' + str(over) + ')'
-        hseries = sub_df3[option] / sub_df3['Population']
-        oda.oveds_plot(sub_df3.index, hseries, 'bar', title)
+        oda.oveds_plot(sub_df3.index, sub_df3[option + '_per_million'], 'bar', title)
 
 #-------------------------------------------------------------------
-def world_per_region(df_all):
+@prof.timed('report:world_per_region')
+def world_per_region(data, as_of=None):
     """
     Build a multi-index DF by Country and state/province, and print deaths and recovered
-    :param df_all: DataFrame (all processed data)
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
     :return: none
     """
-    latest = df_all['Date'].max()                       # get latest date
+    latest = data.as_of(as_of)                          # get latest date
     print('\nCovid-19 data as of', latest.strftime("%d-%B-%y"), '\n')
-    sub_df1 = df_all.loc[df_all['Date'] == latest]
-
-        # build the MultiIndex dataframe
-    sub_df = sub_df1.groupby(['Country_Region', 'Province_State']).sum()
+        # the MultiIndex dataframe, by country and province
+    sub_df = query.snapshot(data, latest, 'province')
+    sub_df = sub_df.loc[sub_df.index.get_level_values('Province_State').notna()]
 
         # set the display option to display all data
     pd.set_option('display.max_rows', sub_df.shape[0] + 1)
 
         # print the two columns (along with the indexes)
-    print(sub_df[['Deaths', 'Recovered', 'Confirmed', 'Active']])
+    oda.show_table(sub_df[['Deaths', 'Recovered', 'Confirmed', 'Active']],
+                   'World per region as of ' + latest.strftime('%d-%B-%Y'))
 
 #-------------------------------------------------------------------
-def by_province_region(df_all):
+@prof.timed('report:by_province_region')
+def by_province_region(data, as_of=None, country=None, option=None):
     """
     Plot selected data from the latest database for each province/state of input country
-    :param df_all: DataFrame (all processed data)
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
+    :param country: string (None --> ask the user)
+    :param option: string, data column or 'Death_Rate' (None --> ask the user)
     :return:
     """
-    country = oda.select_country(df_all)
-    option = oda.select_data(country)
+    if country is None:
+        country = oda.select_country(data)
+    if option is None:
+        option = oda.select_data(country)
 
-    latest = df_all['Date'].max()                                               # get the date of the latest data
-    sub_df1 = df_all.loc[df_all['Date'] == latest]
-    sub_df1a = sub_df1.loc[sub_df1['Country_Region'] == country]
-    sub_df1 = sub_df1a[sub_df1a['Province_State'].isin(['Recovered', 'Diamond Princess', 'Grand Princess']) == False]            # drop for the US
-    sub_df1b = sub_df1.copy()
-    sub_df1b['Population'] = sub_df1['Confirmed'] / (sub_df1['Incidence_Rate'] * 10)  # produce a population column
-    sub_df = sub_df1b.groupby(['Province_State']).sum()                        # group by state
+    latest = data.as_of(as_of)                                                  # get the date of the latest data
+    sub_df1 = query.snapshot(data, latest, 'province')
+    sub_df1 = sub_df1.loc[sub_df1.index.get_level_values('Country_Region') == country].droplevel('Country_Region')
+    sub_df1 = sub_df1[sub_df1.index.isin(['Recovered', 'Diamond Princess', 'Grand Princess']) == False]            # drop for the US
+    sub_df = sub_df1[sub_df1.index.notna()]                                     # by state
 
     title = option + ' for ' + country + ' as of ' + latest.strftime('%d-%B-%Y')
     if option == 'Death_Rate':
         title = option + ' (in %) for ' + country + ' as of ' + latest.strftime('%d-%B-%Y')
-        sub_df1 = sub_df.copy()
-        sub_df1[option] = 100* sub_df['Deaths'] / sub_df['Confirmed']
-        sub_df = sub_df1.copy()
 
     print('--- close plot to continue ---')
-    oda.oveds_plot(sub_df.index, sub_df[option], 'bar', title)
+    oda.oveds_plot(sub_df.index, query.metric_values(sub_df, option), 'bar', title)
 
     if option != 'Death_Rate':
         title = option + ' per million for ' + country + ' as of ' + latest.strftime('%d-%B-%Y')
         sub_df3 = sub_df[sub_df['Population'].notnull()]
-        hseries = sub_df3[option] / sub_df3['Population']
-        oda.oveds_plot(sub_df3.index, hseries, 'bar', title)                        # plot the per-million data
+        oda.oveds_plot(sub_df3.index, sub_df3[option + '_per_million'], 'bar', title)    # plot the per-million data
 
 #--------------------------------------------------------------------
-def top_countries(df_all):
+@prof.timed('report:top_countries')
+def top_countries(data, as_of=None, top=None, option=None):
     """
     Plot top countries in a selected category: total, and per million
-    :param myCovDF:
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
+    :param top: int, number of top countries (None --> ask the user)
+    :param option: string, data column or 'Death_Rate' (None --> ask the user)
     :return: none
     """
-    inp_ok = False
-    top = 0
+    inp_ok = top is not None
     while not inp_ok:
         inp = input('Enter number of top countries:')
         if inp.isnumeric():
@@ -224,73 +217,144 @@ def top_countries(df_all):
         else:
             print('Try again...')
 
-    option = oda.select_data('all')
+    if option is None:
+        option = oda.select_data('all')
 
-    latest = df_all['Date'].max()                                   # get the date of the latest data
-    sub_df1 = df_all.loc[df_all['Date'] == latest]
-    sub_df1a = sub_df1.copy()
-    sub_df1a['Population'] = sub_df1['Confirmed'] / (sub_df1['Incidence_Rate'] * 10)       # produce a population column
-    sub_df2 = sub_df1a.groupby(['Country_Region']).sum()                                    # group by country
+    latest = data.as_of(as_of)                                      # get the date of the latest data
 
     title = option + ' for top-' + str(top) + ' countries, as of ' + latest.strftime('%d-%B-%Y')
     if option == 'Death_Rate':
         title = option + ' (in %) for top-' + str(top) + ' countries, as of ' + latest.strftime('%d-%B-%Y')
-        sub_df1 = sub_df2.copy()
-        sub_df1[option] = 100* sub_df2['Deaths'] / sub_df2['Confirmed']
-        sub_df2 = sub_df1.copy()
 
-    sub_df = sub_df2.sort_values(option, ascending=False).head(top)                        # sort and select top
-    print(sub_df)
+    top_values = query.rank(data, option, latest, k=top)                    # sort and select top
+    sub_df = query.snapshot(data, latest).loc[top_values.index]             # their latest data
+    if option == 'Death_Rate':
+        sub_df[option] = top_values
+    oda.show_table(sub_df, title + ' (table)')                               # not the file of the plot
 
     print('--- close plots to continue ---')
     title = option + ' for top-' + str(top) + ' countries, as of ' + latest.strftime('%d-%B-%Y')
 
-    oda.oveds_plot(sub_df.index, sub_df[option], 'bar', title)
+    oda.oveds_plot(top_values.index, top_values, 'bar', title)
 
     if option != 'Death_Rate':
-        sub_df1 = sub_df2[sub_df2['Population'].notnull()]
-        sub_df2 = sub_df1.copy()
-        sub_df2['per_mil'] = sub_df1[option] / sub_df1['Population']
-        sub_df = sub_df2.sort_values('per_mil', ascending = False).head(top)
+        per_mil = query.rank(data, option, latest, per_million=True, k=top)
         title = option + ' per million of top-' + str(top) + ' countries, as of ' + latest.strftime('%d-%B-%Y')
-        oda.oveds_plot(sub_df.index, sub_df['per_mil'], 'bar', title)
+        oda.oveds_plot(per_mil.index, per_mil, 'bar', title)
+
+#--------------------------------------------------------------------
+@prof.timed('report:ranking_changes')
+def ranking_changes(data, as_of=None, top=None, option=None, days=None, per_million=False):
+    """
+    Print the top countries in a selected category, with their rank some days before and the change,
+    and the countries that have left the top since then; plot the ranks of the top countries over time
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
+    :param top: int, number of top countries (None --> ask the user)
+    :param option: string, data column or 'Death_Rate' (None --> ask the user)
+    :param days: int, the days before to compare with (None --> ask the user)
+    :param per_million: Boolean (True --> rank by the data per million)
+    :return: none
+    """
+    inp_ok = top is not None
+    while not inp_ok:
+        inp = input('Enter number of top countries:')
+        if inp.isnumeric() and int(inp) > 0:
+            top = int(inp)
+            inp_ok = True
+        else:
+            print('Try again...')
+
+    if option is None:
+        option = oda.select_data('all')
+
+    inp_ok = days is not None
+    while not inp_ok:
+        inp = input('Enter number of days to compare with:')
+        if inp.isnumeric():
+            days = int(inp)
+            inp_ok = True
+        else:
+            print('Try again...')
+
+    latest = data.as_of(as_of)                                      # get the date of the latest data
+    before = data.as_of(latest - timedelta(days))
+    name = option + (' per million' if per_million else '') + (' (in %)' if option == 'Death_Rate' else '')
+
+    history = query.rank_history(data, option, per_million, top)    # the top countries of every date
+    now = history[history['Date'] == latest].set_index('Country_Region')
+    then = history[history['Date'] == before].set_index('Country_Region')
+    ranks_then = query.metric_matrix(data, option, per_million).loc[before]
+    ranks_then = ranks_then.dropna().sort_values(ascending=False, kind='stable')
+    position = pd.Series(np.arange(1, len(ranks_then) + 1), index=ranks_then.index)
+
+    table = pd.DataFrame({'Rank': now['Rank'], 'Rank ' + before.strftime('%d-%b-%Y'): position.reindex(now.index),
+                          name: now.iloc[:, -1]})
+    table['Change'] = table.iloc[:, 1] - table['Rank']                                 # places gained
+    oda.show_table(table, 'Top-' + str(top) + ' countries in ' + name + ', as of ' + latest.strftime('%d-%B-%Y') +
+                   ', vs ' + before.strftime('%d-%B-%Y'))
+    left = then.index.difference(now.index)
+    if len(left):
+        print('Left the top-' + str(top) + ' since', before.strftime('%d-%B-%Y') + ':', ', '.join(left))
+
+    print('--- close plot to continue ---')
+    title = 'Rank in ' + name + ' of the top-' + str(top) + ' countries, ' + before.strftime('%d-%B-%Y') + \
+            ' to ' + latest.strftime('%d-%B-%Y')
+    ranks = pd.DataFrame({country: query.rank_series(data, country, option, per_million).loc[before:latest]
+                          for country in now.index})
+    if oda.output_dir is not None and oda.output_format == 'csv':
+        oda.show_plot(title, ranks)
+        return
+    fig, ax = draw.figure(figsize = (12, 6))
+    draw.lines(ax, ranks.index, ranks, legend_max = len(ranks.columns))    # a legend entry per country
+    ax.invert_yaxis()                                               # rank 1 on top
+    ax.set_title(title)
+    ax.set_ylabel('Rank')
+    ax.legend(loc = 'upper left', bbox_to_anchor = (1, 1), fontsize = 'small')
+    ax.grid(True)
+    fig.tight_layout()
+    oda.show_plot(title, ranks)
 
 #--------------------------------------------------------------------------------------
-def no_recover(df_all):
+@prof.timed('report:no_recover')
+def no_recover(data, as_of=None):
     """
     Print data for countries with no recover cases.
-    :param df_all: DataFrame (all data)
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
     :return: none
     """
 
-    latest = df_all['Date'].max()                       # get latest date
+    latest = data.as_of(as_of)                          # get latest date
 
     # print header
     print('\nCovid-19 data for countries with no recovered cases, as of', latest.strftime('%d-%B-%Y'), '\n')
 
-    sub_df = df_all.loc[df_all['Date'] == latest].groupby(['Country_Region']).sum()         # sum over per country
+    sub_df = query.snapshot(data, latest)                                                   # latest data by country
 
         # find those with Recovered = 0
     no_rec = sub_df.loc[sub_df['Recovered'] == 0][['Confirmed', 'Deaths', 'Recovered', 'Active']]
     if len(no_rec) == 0:
         print('No counries found with number of recovered = 0')
     else:
-        print(no_rec)                    # print data for these countries
+        oda.show_table(no_rec, 'No recovered cases as of ' + latest.strftime('%d-%B-%Y'))   # print data for these countries
 
 #-----------------------------------------------------------------------
-def all_died(df_all):
+@prof.timed('report:all_died')
+def all_died(data, as_of=None):
     """
     Print data for countries where all Confirmed cases died.
-    :param df_all: DataFrame (all data)
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
     :return: none
     """
 
-    latest = df_all['Date'].max()                       # get latest date
+    latest = data.as_of(as_of)                          # get latest date
 
     # print header
     print('\nCovid-19 data for countries where all confirmed cases died, as of', latest.strftime('%d-%B-%Y'), '\n')
 
-    sub_df = df_all.loc[df_all['Date'] == latest].groupby(['Country_Region']).sum()         # sum over per country
+    sub_df = query.snapshot(data, latest)                                                   # latest data by country
 
         # find those with Confirmed = Deaths
     all_dead = sub_df.loc[sub_df['Confirmed'] == sub_df['Deaths']][['Confirmed', 'Deaths', 'Recovered', 'Active']]
@@ -298,22 +362,24 @@ def all_died(df_all):
     if len(all_dead) == 0:
         print('No counries found with number of deaths = number of confirmed cases')
     else:
-        print(all_dead)                    # print data for these countries
+        oda.show_table(all_dead, 'All died as of ' + latest.strftime('%d-%B-%Y'))         # print data for these countries
 
 #-------------------------------------------------------------------
-def all_recovered(df_all):
+@prof.timed('report:all_recovered')
+def all_recovered(data, as_of=None):
     """
     Print data for countries where all confirmed cases recovered.
-    :param df_all: DataFrame (all data)
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
     :return: none
     """
 
-    latest = df_all['Date'].max()                       # get latest date
+    latest = data.as_of(as_of)                          # get latest date
 
     # print header
     print('\nCovid-19 data for countries where all confirmed cases recovered, as of', latest.strftime('%d-%B-%Y'), '\n')
 
-    sub_df = df_all.loc[df_all['Date'] == latest].groupby(['Country_Region']).sum()         # sum over per country
+    sub_df = query.snapshot(data, latest)                                                   # latest data by country
 
         # find those with Confirmed = Deaths
     all_rec = sub_df.loc[sub_df['Confirmed'] == sub_df['Recovered']][['Confirmed', 'Deaths', 'Recovered', 'Active']]
@@ -321,26 +387,87 @@ def all_recovered(df_all):
     if len(all_rec) == 0:
         print('No counries found where all confirmed cases recovered')
     else:
-        print(all_rec)                    # print data for these countries
+        oda.show_table(all_rec, 'All recovered as of ' + latest.strftime('%d-%B-%Y'))     # print data for these countries
+
+#-------------------------------------------------------------------
+def _ask_numbers(prompt, count):
+    """
+    Ask the user for numbers, separated by commas
+    :param prompt: string
+    :param count: int (how many)
+    :return: list of floats
+    """
+    while True:
+        try:
+            values = [float(item) for item in input(prompt).split(',')]
+            if len(values) == count:
+                return values
+        except ValueError:
+            pass
+        print('Try again...')
+
+
+@prof.timed('report:region_report')
+def region_report(data, as_of=None, lat=None, lon=None, km=None, option=None, top=20):
+    """
+    Print the data of all locations (countries, provinces, US counties) within a distance of a point,
+    and their totals, and plot the top locations in selected data
+    :param data: Dataset (oveds_data)
+    :param as_of: date (None --> the latest data)
+    :param lat: float, latitude of the point (None --> ask the user, with lon)
+    :param lon: float, longitude of the point
+    :param km: float, radius (None --> ask the user)
+    :param option: string, data column or 'Death_Rate' (None --> ask the user)
+    :param top: int, number of locations in the plot
+    :return: none
+    """
+    if lat is None or lon is None:
+        lat, lon = _ask_numbers('Enter latitude, longitude (e.g. 40.71, -74.01):', 2)
+    if km is None:
+        km = _ask_numbers('Enter radius in km:', 1)[0]
+    if option is None:
+        option = oda.select_data('all')
+
+    latest = data.as_of(as_of)                                      # get the date of the latest data
+    rows = query.region(data, ('radius', lat, lon, km), latest)     # from the spatial index
+    where = 'within %g km of (%g, %g)' % (km, lat, lon)
+    if len(rows) == 0:
+        print('No locations found', where)
+        return
+
+    names = rows[['Admin2', 'Province_State', 'Country_Region']].fillna('')
+    rows.index = [', '.join(item for item in items if item) for items in names.itertuples(index=False)]
+    table = rows[['Distance_km', 'Confirmed', 'Deaths', 'Recovered', 'Active']].round({'Distance_km': 1})
+    oda.show_table(table, 'Locations ' + where + ' as of ' + latest.strftime('%d-%B-%Y'))
+    totals = rows[['Confirmed', 'Deaths', 'Recovered', 'Active']].sum()
+    print('\nTotal of', len(rows), 'locations:', ', '.join('%s %d' % item for item in totals.items()))
+    if option == 'Death_Rate':
+        print('Death_Rate (in %%): %.2f' % (100 * totals['Deaths'] / totals['Confirmed']))
+
+    values = query.metric_values(rows, option).sort_values(ascending=False, kind='stable').head(top)
+    title = option + ' for locations ' + where + ', as of ' + latest.strftime('%d-%B-%Y')
+    if option == 'Death_Rate':
+        title = option + ' (in %) for locations ' + where + ', as of ' + latest.strftime('%d-%B-%Y')
+    print('--- close plot to continue ---')
+    oda.oveds_plot(values.index, values, 'bar', title)
 
 #------------------------- main (for testing) ----------------------
 
 def main():
 
-    with open('cleaned_data.p', 'rb') as file:
-        df_all = pickle.load(file)
+    data = ds.Dataset()
 
-    # plot_daily(df_all)
-    # plot_all4(df_all)
+    # plot_daily(data)
+    # plot_all4(data)
 
-    stats_for_all_over(df_all)
-    # world_per_region(df_all)
-    # by_province_region(df_all)
-    # top_countries(df_all)
-    # print_5rows(df_all)
-    # no_recover(df_all)
-    # all_died(df_all)
-    # all_recovered(df_all)
+    stats_for_all_over(data)
+    # world_per_region(data)
+    # by_province_region(data)
+    # top_countries(data)
+    # print_5rows(data)
+    # no_recover(data)
+    # all_died(data)
+    # all_recovered(data)
 
 if __name__ == '__main__':
     main()
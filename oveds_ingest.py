@@ -0,0 +1,57 @@
+#-------------------------------------------------------------------------------
+# This library parses the JHU daily-report files of the Covid-19 package
+# The known header variants are normalized at parse time, and only the wanted columns
+# are parsed, with explicit dtypes (no type inference, no later rename pass).
+#-------------------------------------------------------------------------------
+import io
+import csv
+import pandas as pd
+
+column_dict = {'Province/State': 'Province_State',                      # columns with multiple names
+               'Country/Region': 'Country_Region',
+               'Last Update': 'Last_Update',
+               'Long_': 'Longitude',
+               'Lat': 'Latitude',
+               'Incident_Rate': 'Incidence_Rate',
+               'Case_Fatality_Ratio': 'Case-Fatality_Ratio'
+               }
+
+dtypes = {'Country_Region': object,                                     # parse dtype of each (normalized) column
+          'Province_State': object,
+          'Admin2': object,
+          'Combined_Key': object,
+          'Last_Update': object,
+          'FIPS': 'float64',
+          'Confirmed': 'float64',
+          'Deaths': 'float64',
+          'Recovered': 'float64',
+          'Active': 'float64',
+          'Case-Fatality_Ratio': 'float64',
+          'Incidence_Rate': 'float64',
+          'Latitude': 'float64',
+          'Longitude': 'float64'
+          }
+
+
+def header(content):
+    """
+    The column names of a daily file, as written in the file
+    :param content: bytes (CSV content)
+    :return: list of strings
+    """
+    first_line = content.split(b'\n', 1)[0].decode('utf-8-sig')      # some files start with a BOM
+    return next(csv.reader([first_line.strip()]))
+
+
+def parse(content, columns=None):
+    """
+    Parse a daily file into a DataFrame with normalized column names
+    :param content: bytes (CSV content)
+    :param columns: list of (normalized) column names to keep; None --> all
+    :return: DataFrame (wanted columns that are missing in the file are not added)
+    """
+    names = header(content)
+    normal = [column_dict.get(name.strip(), name.strip()) for name in names]
+    keep = [ii for ii, name in enumerate(normal) if columns is None or name in columns]
+    return pd.read_csv(io.BytesIO(content), encoding='utf-8-sig', header=0, names=normal, usecols=keep,
+                       dtype={name: dtypes[name] for name in normal if name in dtypes})
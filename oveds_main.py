@@ -6,19 +6,49 @@
 #---------------------------------------------------------------------
 
 import oveds_accs as acc
-import pickle
+import oveds_store as store
+import oveds_population as population
+import oveds_cube as cube
+import oveds_derive as derive
+import oveds_data as ds
+import os
+import argparse
+import oveds_prof as prof
+import oveds_sources as sources
+
+parser = argparse.ArgumentParser(description='Covid-19 data analysis')
+parser.add_argument('--profile', nargs='?', const=True, metavar='OUT',
+                    help='time the stages, and write them at exit (to OUT, if given)')
+parser.add_argument('--source-type', choices=list(sources.SOURCES),
+                    help='the raw data: daily reports or time-series files (default: $OVEDS_SOURCE_TYPE, else daily)')
+parser.add_argument('--sync', nargs='?', type=int, const=acc.REVISION_DAYS, default=0, metavar='DAYS',
+                    help='also recheck the last DAYS dates (default: %d) for revised daily files' % acc.REVISION_DAYS)
+args = parser.parse_args()
+
+if args.profile:
+    prof.enable(None if args.profile is True else args.profile)     # stage timing, written at exit
 
 print('Welcome. You are running Covid-19 data analysis,\nversion 1.7 \xa9Oved_Dahari\n')
 
-new = acc.load_raw()
+new = acc.load_raw(source_type=args.source_type)
+if args.sync:
+    new = acc.sync_raw(args.sync, source_type=args.source_type) or new     # revised files are cleaned again
+
+if not store.exists() and os.path.exists('cleaned_data.p'):
+    store.convert_pickle()                                      # convert the old cleaned data pickle
 
 if new:
     acc.clean_data()
 
-with open('cleaned_data.p', 'rb') as file:
-    myDF = pickle.load(file)                                    # load from disk
-print('First 10 Confirmed:', myDF['Confirmed'].head(10))
-print('First 10 Incidence_Rate:', myDF['Incidence_Rate'].head(10))
+if store.exists() and not population.exists():
+    population.build()                                          # population of each location
+if store.exists() and not cube.exists():
+    cube.build()                                                # aggregate the cleaned data
+    derive.build()
+if store.exists() and not derive.exists():
+    derive.build()                                              # daily changes, means and growth rates
+
+myDF = ds.Dataset()                                             # the data is read from disk when first needed
 
 option = ''
 while option != '0':
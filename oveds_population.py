@@ -0,0 +1,160 @@
+#-------------------------------------------------------------------------------
+# This library keeps the population table of the Covid-19 data, built once at clean time:
+# the population of each location (Country_Region, Province_State, Admin2) is estimated as
+# Confirmed / Incidence_Rate * 100,000, the median of its RECENT latest reliable rows
+# (Confirmed >= MIN_CONFIRMED; a location with none falls back to any row with cases).
+# The table is kept in <store>/population.csv. The population of a cube location (a country,
+# a province, the World) is the sum over the locations it reports on its last date, so a country
+# that changed from one row to rows per province is not counted twice.
+#-------------------------------------------------------------------------------
+import os
+import numpy as np
+import pandas as pd
+import oveds_prof as prof
+import oveds_store as store
+
+TABLE = 'population.csv'
+KEYS = ['Country_Region', 'Province_State', 'Admin2']
+MIN_CONFIRMED = 100             # rows with fewer cases give a rounded, unreliable Incidence_Rate
+RECENT = 30                     # reliable rows (the latest) per location, of which the median is taken
+
+LEVEL_KEYS = {'world': [],                                          # the levels of the cube (oveds_cube.LEVELS)
+              'country': ['Country_Region'],
+              'province': ['Country_Region', 'Province_State']}
+
+
+def table_path(path=store.STORE_DIR):
+    return os.path.join(path, TABLE)
+
+
+def exists(path=store.STORE_DIR):
+    return os.path.exists(table_path(path))
+
+
+def estimate(df):
+    """
+    Estimate the population of each location in cleaned data
+    :param df: DataFrame (cleaned data: the KEYS, Confirmed, Incidence_Rate and Date)
+    :return: DataFrame (the KEYS, Population (people; NaN if unknown), Last_Date, Reliable)
+    """
+    keys = df[KEYS].astype(object)
+    confirmed = df['Confirmed'].to_numpy(dtype=np.float64)
+    rate = df['Incidence_Rate'].to_numpy(dtype=np.float64)
+    rows = pd.DataFrame({'Date': df['Date'].to_numpy()}).join(keys.reset_index(drop=True))
+    last = rows.groupby(KEYS, dropna=False, sort=False)['Date'].max().rename('Last_Date')
+
+    usable = (rate > 0) & (confirmed > 0)
+    rows['Reliable'] = usable & (confirmed >= MIN_CONFIRMED)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rows['Population'] = confirmed * 1e5 / rate
+    rows = rows[usable]
+    has_reliable = rows.groupby(KEYS, dropna=False, sort=False)['Reliable'].transform('any')
+    rows = rows[rows['Reliable'] | ~has_reliable].sort_values('Date', kind='stable')   # fallback: any row with cases
+    recent = rows.groupby(KEYS, dropna=False, sort=False).tail(RECENT)
+    pops = recent.groupby(KEYS, dropna=False, sort=False).agg(Population=('Population', 'median'),
+                                                              Reliable=('Reliable', 'any'))
+
+    table = last.to_frame().join(pops)
+    table['Reliable'] = table['Reliable'].fillna(False).astype(bool)
+    return table.reset_index()[KEYS + ['Population', 'Last_Date', 'Reliable']]
+
+
+def recent_rows(df):
+    """
+    The rows of cleaned data that estimate() uses: the first and last rows of each location (the first keeps
+    the order of the table), and its RECENT latest rows with cases and reliable rows (so the table can be
+    built one month at a time)
+    :param df: DataFrame (cleaned data in date order: the KEYS, Confirmed, Incidence_Rate and Date)
+    :return: DataFrame (a subset of the rows, in the same order)
+    """
+    keys = df[KEYS].astype(object).reset_index(drop=True)
+    confirmed = df['Confirmed'].to_numpy(dtype=np.float64)
+    rate = df['Incidence_Rate'].to_numpy(dtype=np.float64)
+    usable = (rate > 0) & (confirmed > 0)
+    grouped = keys.groupby(KEYS, dropna=False, sort=False)
+    keep = (grouped.cumcount().to_numpy() == 0) | (grouped.cumcount(ascending=False).to_numpy() == 0)
+    for mask in [usable, usable & (confirmed >= MIN_CONFIRMED)]:
+        rows = np.flatnonzero(mask)
+        last = keys.iloc[rows].groupby(KEYS, dropna=False, sort=False).cumcount(ascending=False).to_numpy()
+        keep[rows[last < RECENT]] = True
+    return df[keep]
+
+
+def read(path=store.STORE_DIR):
+    """
+    Read the population table
+    :param path: string (store directory)
+    :return: DataFrame (see estimate); empty if there is none
+    """
+    if not exists(path):
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in KEYS}).assign(
+            Population=np.nan, Last_Date=pd.Series(dtype='datetime64[ns]'), Reliable=False)
+    table = pd.read_csv(table_path(path), keep_default_na=False, na_values=[''], dtype={col: object for col in KEYS})
+    table['Last_Date'] = pd.to_datetime(table['Last_Date'])
+    return table
+
+
+def _write(table, path):
+    tmp = table_path(path) + '.tmp'
+    table.to_csv(tmp, index=False, date_format='%Y-%m-%d')
+    os.replace(tmp, table_path(path))
+
+
+@prof.timed('population.build')
+def build(path=store.STORE_DIR):
+    """
+    Build the population table from all the cleaned data in the store, one month at a time
+    (only the recent rows of each location are kept from month to month)
+    :param path: string (store directory)
+    :return: DataFrame (the table)
+    """
+    columns = KEYS + ['Confirmed', 'Incidence_Rate', 'Date']
+    parts = store.read_manifest(path)['partitions']
+    rows = None
+    for key in sorted(parts):
+        month = store.read(columns, parts[key]['first'], parts[key]['last'], path=path)
+        rows = recent_rows(month if rows is None else pd.concat([rows, month], ignore_index=True))
+    table = estimate(store.read(columns, path=path) if rows is None else rows)
+    _write(table, path)
+    print('Population of', int(table['Reliable'].sum()), 'locations estimated, of', len(table))
+    return table
+
+
+@prof.timed('population.update')
+def update(df, path=store.STORE_DIR):
+    """
+    Add the locations of newly cleaned days to the table. The population of a location already in the
+    table is kept (so the aggregates stored so far stay valid); only new locations, or locations that
+    had no estimate, get one
+    :param df: DataFrame (newly cleaned data)
+    :param path: string (store directory)
+    :return: Boolean (True if the population of any cube location has changed)
+    """
+    old = read(path)
+    rows = pd.concat([old.assign(Old=True), estimate(df).assign(Old=False)], ignore_index=True)
+    rows['Last_Date'] = rows.groupby(KEYS, dropna=False, sort=False)['Last_Date'].transform('max')
+    known = rows['Population'].notna()
+    rows['Rank'] = np.where(known & rows['Old'], 0, np.where(known, 1, 2))     # keep an old estimate, else a new one
+    table = rows.sort_values('Rank', kind='stable').drop_duplicates(KEYS)
+    table = table.sort_index()[KEYS + ['Population', 'Last_Date', 'Reliable']].reset_index(drop=True)
+    _write(table, path)
+    return any(not level_population(old, level).equals(level_population(table, level)) for level in LEVEL_KEYS)
+
+
+def level_population(table, level):
+    """
+    The population of the locations of a cube level
+    :param table: DataFrame (the population table)
+    :param level: string ('world', 'country' or 'province')
+    :return: Series (in millions; indexed by the level keys, or a single value for the world)
+    """
+    keys = LEVEL_KEYS[level]
+    if keys:
+        last = table.groupby(keys, dropna=False, sort=True)['Last_Date'].transform('max')
+    else:
+        last = table.groupby('Country_Region', dropna=False, sort=True)['Last_Date'].transform('max')
+    current = table[table['Last_Date'] == last]                 # the locations reported on the last date
+    if not keys:
+        return pd.Series([current['Population'].sum(min_count=1) / 1e6], index=pd.Index(['World'], name='Location'),
+                         name='Population')
+    return current.groupby(keys, dropna=False, sort=True)['Population'].sum(min_count=1).rename('Population') / 1e6
@@ -0,0 +1,179 @@
+#-------------------------------------------------------------------------------
+# This library instruments the Covid-19 pipeline: wall time, CPU time, peak RSS and rows
+# of each stage (load_raw, clean_data, store and cube I/O, and every report call).
+#
+# Switched on by the environment or a CLI flag (--profile in oveds_main and oveds_batch):
+#     OVEDS_PROFILE=1                 write oveds_profile.json / .csv at exit
+#     OVEDS_PROFILE=run42             write run42.json / .csv at exit
+#     OVEDS_PROFILE_STAGE=clean_data  also capture a cProfile of that stage (<output>-clean_data.prof)
+# When off, an instrumented call costs one boolean check.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import cProfile
+import pstats
+import functools
+import contextlib
+
+ENABLED = False
+output = 'oveds_profile'
+cprofile_stage = None
+records = []                                                        # one dict per finished stage
+_stack = []                                                         # the stages in progress
+
+try:
+    import resource
+except ImportError:                                                 # not on Windows
+    resource = None
+
+
+def reset_peak_rss():
+    """
+    Reset the peak-RSS mark of this process (Linux only)
+    :return: Boolean (False if not supported)
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def rss_mb(field='VmRSS'):
+    """
+    Current ('VmRSS') or peak ('VmHWM') resident memory, in MB
+    :return: float, or None if unknown
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if field == 'VmHWM' and resource is not None:                   # peak of the whole process
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return None
+
+
+def enable(out=None, stage=None):
+    """
+    Switch the instrumentation on; the profile is written at exit
+    :param out: string (output path, without extension)
+    :param stage: string (name of a stage to capture with cProfile)
+    :return: None
+    """
+    global ENABLED, output, cprofile_stage
+    if out:
+        output = os.path.splitext(out)[0]
+    if stage:
+        cprofile_stage = stage
+    if not ENABLED:
+        ENABLED = True
+        atexit.register(dump)
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.peak = 0.0
+
+
+@contextlib.contextmanager
+def stage(name, rows=None):
+    """
+    Measure a block of code:  with prof.stage('parse') as st: ...; st.rows = len(df)
+    :param name: string
+    :param rows: int (rows processed; may also be set on the yielded object)
+    :return: context manager
+    """
+    if not ENABLED:
+        yield _Stage(name)
+        return
+
+    current = _Stage(name)
+    current.rows = rows
+    if _stack:                                                      # keep the parent's peak so far
+        _stack[-1].peak = max(_stack[-1].peak, rss_mb('VmHWM') or 0)
+    _stack.append(current)
+    reset_peak_rss()
+    start_rss = rss_mb()
+    profiler = cProfile.Profile() if name == cprofile_stage else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield current
+    finally:
+        if profiler:
+            profiler.disable()
+        seconds, cpu_seconds = time.perf_counter() - wall, time.process_time() - cpu
+        _stack.pop()
+        peak = max(current.peak, rss_mb('VmHWM') or 0)
+        if _stack:
+            _stack[-1].peak = max(_stack[-1].peak, peak)
+        records.append({'stage': '/'.join([item.name for item in _stack] + [name]), 'depth': len(_stack),
+                        'seconds': round(seconds, 6), 'cpu_seconds': round(cpu_seconds, 6),
+                        'rss_start_mb': start_rss, 'peak_rss_mb': peak or None, 'rows': current.rows})
+        if profiler:
+            _dump_cprofile(profiler, name)
+
+
+def timed(name=None):
+    """
+    Decorator: measure every call of a function as a stage.
+    If the function returns a DataFrame (or anything with a length), that is the number of rows
+    :param name: string (default: the function name)
+    :return: decorator
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with stage(stage_name) as current:
+                result = func(*args, **kwargs)
+                if current.rows is None and hasattr(result, '__len__') and not isinstance(result, str):
+                    current.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def _dump_cprofile(profiler, name):
+    path = output + '-' + name + '.prof'
+    profiler.dump_stats(path)
+    print('cProfile of', name, 'written to', path)
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+
+
+def dump():
+    """
+    Write the recorded stages to <output>.json and <output>.csv
+    :return: None
+    """
+    if not records:
+        return
+    with open(output + '.json', 'w') as file:
+        json.dump({'argv': sys.argv, 'pid': os.getpid(), 'stages': records}, file, indent=1)
+    with open(output + '.csv', 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+    print('Profile written to', output + '.json', 'and', output + '.csv')
+
+
+if os.environ.get('OVEDS_PROFILE', '0') not in ('', '0'):
+    enable(None if os.environ['OVEDS_PROFILE'] == '1' else os.environ['OVEDS_PROFILE'],
+           os.environ.get('OVEDS_PROFILE_STAGE'))
+elif os.environ.get('OVEDS_PROFILE_STAGE'):
+    enable(stage=os.environ['OVEDS_PROFILE_STAGE'])
@@ -0,0 +1,323 @@
+#-------------------------------------------------------------------------------
+# This library is the query layer of the Covid-19 package: the reports (oveds_func), the batch
+# renders and any other caller ask it for data, instead of filtering and grouping frames themselves.
+#     series(data, location, metric, start, end)    - time-series of a location
+#     snapshot(data, the_date, level)               - all locations of a level, on one date
+#     rank(data, metric, the_date, per_million, k)  - the top-k countries by a metric
+#     region(data, area, the_date)                  - the locations in an area (oveds_spatial), on one date
+#     rank_history(data, metric, per_million, k)    - the top-k countries on every date, in one pass
+#     rank_series(data, country, metric, per_million) - the rank of a country on every date
+# Results are memoized in an LRU cache with a memory budget, keyed on the query and the data version,
+# so repeated queries are near-free and a new day in the store invalidates the old results.
+#-------------------------------------------------------------------------------
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import oveds_prof as prof
+import oveds_store as store
+import oveds_cube as cube
+import oveds_spatial as spatial
+
+BUDGET_MB = 64                                                      # memory budget of the cache
+
+RATIO_METRICS = {'Death_Rate': ('Deaths', 'Confirmed')}             # 100 * numerator / denominator, in %
+DERIVED_PREFIXES = ('New_', 'Avg_', 'Growth_', 'Doubling_')         # series of oveds_derive
+
+
+class LRUCache:
+    """
+    A least-recently-used cache, bounded by the memory of its values (safe to share between threads)
+    """
+
+    def __init__(self, budget_mb=BUDGET_MB):
+        self.budget = budget_mb * 2**20
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()                                 # key --> (value, size), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: the cached value, or None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        """
+        Cache a value, evicting the least recently used ones beyond the budget
+        (a value larger than the whole budget is not cached)
+        :return: None
+        """
+        size = _size(value)
+        if size > self.budget:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.budget:
+                old_value, old_size = self._items.popitem(last=False)[1]
+                self.size -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return sys.getsizeof(value)
+
+
+cache = LRUCache()
+
+
+def _memoized(name, data, args, compute):
+    """
+    The cached result of a query, computed on a miss
+    :param name: string (query name)
+    :param data: Dataset (oveds_data)
+    :param args: tuple (the query arguments, hashable)
+    :param compute: function with no arguments
+    :return: DataFrame or Series (a shallow copy: callers may add columns without changing the cache)
+    """
+    key = (name, data.path, data.version) + args
+    result = cache.get(key)
+    if result is None:
+        with prof.stage('query:' + name):
+            result = compute()
+        cache.put(key, result)
+    return result.copy(deep=False)
+
+
+def _timestamp(the_date):
+    return None if the_date is None else pd.Timestamp(the_date)
+
+
+def metric_values(df, metric):
+    """
+    The values of a metric in a frame of the cube (or of the derived series)
+    :param df: DataFrame
+    :param metric: string (a column, or 'Death_Rate')
+    :return: Series
+    """
+    if metric in RATIO_METRICS:
+        numerator, denominator = RATIO_METRICS[metric]
+        return (100 * df[numerator] / df[denominator]).rename(metric)
+    return df[metric]
+
+
+def _location_frame(data, location, derived):
+    """
+    The rows of a location in the cube, or in the derived series
+    :param location: 'World', a country name, or a tuple (country, province)
+    """
+    table = data.derived if derived else data.cube
+    if isinstance(location, tuple):
+        country, province = location
+    else:
+        country, province = location, ''
+    if country == 'World':
+        return table('world')
+    if province == '':
+        sub_df = table('country')
+        return sub_df.loc[sub_df['Country_Region'] == country]
+    sub_df = table('province')
+    return sub_df.loc[(sub_df['Country_Region'] == country) & (sub_df['Province_State'] == province)]
+
+
+def series(data, location, metric, start=None, end=None):
+    """
+    The time-series of a location
+    :param data: Dataset (oveds_data)
+    :param location: 'World', a country name, or a tuple (country, province)
+    :param metric: string (a cube column, 'Death_Rate', or a derived series such as 'Avg_Deaths'),
+                   or a list of them
+    :param start: date (None --> from the first date)
+    :param end: date, inclusive (None --> up to the last date)
+    :return: Series indexed by date (a DataFrame for a list of metrics)
+    """
+    metrics = [metric] if isinstance(metric, str) else list(metric)
+    start, end = _timestamp(start), _timestamp(end)
+
+    def compute():
+        derived = any(name.startswith(DERIVED_PREFIXES) for name in metrics)
+        sub_df = _location_frame(data, location, derived).set_index('Date')
+        if derived and not all(name.startswith(DERIVED_PREFIXES) for name in metrics):
+            cube_df = _location_frame(data, location, False).set_index('Date')
+            sub_df = sub_df.join(cube_df[[col for col in cube_df.columns if col not in sub_df.columns]])
+        sub_df = sub_df.loc[start:end]
+        result = pd.concat([metric_values(sub_df, name) for name in metrics], axis=1)
+        return result[metric] if isinstance(metric, str) else result
+
+    return _memoized('series', data, (location, tuple(metrics), start, end), compute)
+
+
+def snapshot(data, the_date=None, level='country'):
+    """
+    All locations of a level on one date: the latest data on or before that date
+    :param data: Dataset (oveds_data)
+    :param the_date: date (None --> the latest data)
+    :param level: string ('world', 'country' or 'province')
+    :return: DataFrame indexed by the level keys (Country_Region; or Country_Region, Province_State),
+             with the cube columns
+    """
+    latest = data.as_of(the_date)
+
+    def compute():
+        sub_df = data.day(latest, level).drop(columns='Date')
+        if level == 'world':
+            return sub_df.set_axis(pd.Index(['World'], name='Location'))
+        return sub_df.set_index('Country_Region' if level == 'country' else ['Country_Region', 'Province_State'])
+
+    return _memoized('snapshot', data, (latest, level), compute)
+
+
+def rank(data, metric, the_date=None, per_million=False, k=10):
+    """
+    The top-k countries by a metric, on one date
+    :param data: Dataset (oveds_data)
+    :param metric: string (a cube column or 'Death_Rate')
+    :param the_date: date (None --> the latest data)
+    :param per_million: Boolean (True --> the metric per million people, from the cube;
+                        countries of unknown population are left out)
+    :param k: int (None --> all countries)
+    :return: Series indexed by country, in descending order
+    """
+    latest = data.as_of(the_date)
+
+    def compute():
+        sub_df = snapshot(data, latest, 'country')
+        if per_million:
+            values = sub_df[metric + '_per_million'][sub_df['Population'].notnull()]
+        else:
+            values = metric_values(sub_df, metric)
+        values = values.sort_values(ascending=False, kind='stable')
+        return values if k is None else values.head(k)
+
+    return _memoized('rank', data, (metric, latest, per_million, k), compute)
+
+
+def region(data, area, the_date=None):
+    """
+    The locations in an area, with their data on one date (the latest on or before it)
+    :param data: Dataset (oveds_data)
+    :param area: tuple ('radius', lat, lon, km), ('bbox', south, west, north, east) or ('nearest', lat, lon, k)
+    :param the_date: date (None --> the latest data)
+    :return: DataFrame (the location keys, Latitude, Longitude, Distance_km (not for a bbox), and the count
+             columns), one row per location reported on that date
+    """
+    latest = data.as_of(the_date)
+    kind, args = area[0], area[1:]
+    if kind not in ('radius', 'bbox', 'nearest'):
+        raise ValueError('Unknown area: ' + str(kind))
+
+    def compute():
+        locs = getattr(data.spatial(), kind)(*args)
+        day = store.read(spatial.KEYS + cube.SUM_COLUMNS, latest, latest, path=data.path)
+        day = day.astype({col: object for col in spatial.KEYS})
+        return locs.merge(day, on=spatial.KEYS, how='inner').reset_index(drop=True)
+
+    return _memoized('region', data, (tuple(area), latest), compute)
+
+
+def _rank_values(df, metric, per_million):
+    """
+    The values that countries are ranked by (see rank)
+    :param df: DataFrame (country level of the cube)
+    :return: Series (NaN for countries that are left out)
+    """
+    if per_million:
+        return df[metric + '_per_million'].where(df['Population'].notnull())
+    return metric_values(df, metric)
+
+
+def metric_matrix(data, metric, per_million=False):
+    """
+    A metric of all countries on all dates
+    :param data: Dataset (oveds_data)
+    :param metric: string (a cube column or 'Death_Rate')
+    :param per_million: Boolean (see rank)
+    :return: DataFrame (indexed by date, a column per country, in name order; NaN where there is no value)
+    """
+    def compute():
+        df = data.cube('country')
+        date_codes, dates = pd.factorize(df['Date'], sort=True)
+        country_codes, countries = pd.factorize(df['Country_Region'].astype(object), sort=True)
+        matrix = np.full((len(dates), len(countries)), np.nan)
+        matrix[date_codes, country_codes] = _rank_values(df, metric, per_million).to_numpy(dtype=np.float64)
+        return pd.DataFrame(matrix, index=pd.DatetimeIndex(dates, name='Date'),
+                            columns=pd.Index(countries, name='Country_Region'))
+
+    return _memoized('metric_matrix', data, (metric, per_million), compute)
+
+
+def rank_history(data, metric, per_million=False, k=10):
+    """
+    The top-k countries by a metric on every date, selected on all dates at once (argpartition, no full sort);
+    on each date the same countries, in the same order, as rank() gives
+    :param data: Dataset (oveds_data)
+    :param metric: string (a cube column or 'Death_Rate')
+    :param per_million: Boolean (see rank)
+    :param k: int
+    :return: DataFrame (Date, Rank (1 to k), Country_Region, and the metric), by date and rank
+    """
+    def compute():
+        matrix = metric_matrix(data, metric, per_million)
+        values = matrix.to_numpy()
+        top = min(k, values.shape[1])
+        column = metric + ('_per_million' if per_million else '')
+        if top <= 0:                                                        # no countries, or k=0
+            return pd.DataFrame({'Date': matrix.index[:0], 'Rank': np.zeros(0, dtype=np.int64),
+                                 'Country_Region': matrix.columns[:0], column: np.zeros(0, dtype=values.dtype)})
+        filled = np.where(np.isnan(values), -np.inf, values)
+        best = np.argpartition(-filled, top - 1, axis=1)[:, :top]
+        kth = np.take_along_axis(filled, best, axis=1).min(axis=1)          # the k-th largest value of each date
+        rows, cols = np.nonzero((filled >= kth[:, None]) & ~np.isnan(values))   # the top-k, and its ties
+        order = np.lexsort((cols, -values[rows, cols], rows))               # by date, value (desc), then name
+        rows, cols = rows[order], cols[order]
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)          # position within the date
+        keep = ranks < top
+        rows, cols = rows[keep], cols[keep]
+        return pd.DataFrame({'Date': matrix.index[rows], 'Rank': ranks[keep] + 1,
+                             'Country_Region': matrix.columns[cols], column: values[rows, cols]})
+
+    return _memoized('rank_history', data, (metric, per_million, k), compute)
+
+
+def rank_series(data, country, metric, per_million=False):
+    """
+    The rank of a country by a metric, on every date (1 for the highest; ties are ranked by name, as in rank)
+    :param data: Dataset (oveds_data)
+    :param country: string
+    :param metric: string (a cube column or 'Death_Rate')
+    :param per_million: Boolean (see rank)
+    :return: Series indexed by date (NaN on dates without a value for the country)
+    """
+    def compute():
+        matrix = metric_matrix(data, metric, per_million)
+        values = matrix.to_numpy()
+        col = matrix.columns.get_loc(country)
+        own = values[:, [col]]
+        ranks = 1 + (values > own).sum(axis=1) + (values[:, :col] == own).sum(axis=1)
+        return pd.Series(np.where(np.isnan(own[:, 0]), np.nan, ranks), index=matrix.index, name='Rank')
+
+    return _memoized('rank_series', data, (country, metric, per_million), compute)
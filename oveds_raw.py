@@ -0,0 +1,365 @@
+#-------------------------------------------------------------------------------
+# This library is the raw-data cache of the Covid-19 package
+# Layout of the cache directory:
+#     index.json                  - the cached dates (file name, size, content hash, ETag), and the last date
+#     locations.json, 2020-01-22.npz - the original daily files, in the compact archive format of oveds_archive:
+#                                   the locations once, and each day as arrays of numbers, predicted from
+#                                   the days before it in its month
+#     state.npz                   - the prediction state after the last day of the latest month
+# The watermark is read from the index, and adding a day after the last one writes only the file of that day
+# (and the state); a day added or revised before the end of its month also rewrites the days after it.
+# The content of a day is rebuilt byte for byte (get), or read straight into a DataFrame (read_day).
+# Caches of the former layout (a gzipped CSV file per date, 2020-01-22.csv.gz) are still read, and
+# converted by convert_files.
+# The content hash of each date tells a revised daily file (JHU rewrites past reports) from
+# an unchanged one, and the cleaned data store records the hash of the file each date was cleaned from.
+#-------------------------------------------------------------------------------
+import os
+import io
+import gzip
+import json
+import hashlib
+import pickle
+from datetime import date
+import pandas as pd
+import oveds_prof as prof
+import oveds_ingest as ingest
+import oveds_archive as archive
+
+RAW_DIR = 'raw_data'
+INDEX = 'index.json'
+STATE = 'state.npz'
+
+_locations_read = None          # the locations read last: (path, mtime), Locations
+_month = None                   # the month read last: (path, month, mtime of the index), {date: Day}
+
+
+def read_index(path=RAW_DIR):
+    """
+    Read the index of the raw cache
+    :param path: string (cache directory)
+    :return: dict {'last': iso-date or None,
+                   'dates': {iso-date: {'file': string, 'size': int, 'hash': string, 'etag': string or None}}}
+    """
+    try:
+        with open(os.path.join(path, INDEX)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'last': None, 'dates': {}}
+
+
+def _write_index(index, path):
+    tmp = os.path.join(path, INDEX + '.tmp')
+    with open(tmp, 'w') as file:
+        json.dump(index, file, indent=1)
+    os.replace(tmp, os.path.join(path, INDEX))                  # atomic: a crash never loses the index
+
+
+def exists(path=RAW_DIR):
+    return os.path.exists(os.path.join(path, INDEX))
+
+
+def watermark(path=RAW_DIR):
+    """
+    The last cached date (no data is loaded)
+    :param path: string (cache directory)
+    :return: date, or None for an empty cache
+    """
+    last = read_index(path)['last']
+    return None if last is None else date.fromisoformat(last)
+
+
+def dates(path=RAW_DIR):
+    """
+    All cached dates
+    :param path: string (cache directory)
+    :return: sorted list of dates
+    """
+    return sorted(date.fromisoformat(day) for day in read_index(path)['dates'])
+
+
+def content_hash(content):
+    """
+    :param content: bytes (CSV content of a daily file)
+    :return: string (SHA-256, hex)
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def _locations(path):
+    """
+    The locations of the archive (see oveds_archive), read once
+    :param path: string (cache directory)
+    :return: Locations
+    """
+    global _locations_read
+    full = os.path.join(path, archive.LOCATIONS)
+    key = (os.path.abspath(path), os.stat(full).st_mtime_ns if os.path.exists(full) else None)
+    if _locations_read is None or _locations_read[0] != key:
+        _locations_read = key, archive.Locations(path)
+    return _locations_read[1]
+
+
+def _chain(the_date, entries):
+    """
+    :param the_date: date
+    :param entries: dict (the dates of the index)
+    :return: sorted list of dates (the days of its month in the archive format, each decoded after the ones before)
+    """
+    days = (date.fromisoformat(day) for day, entry in entries.items() if not entry['file'].endswith('.csv.gz'))
+    return sorted(day for day in days if (day.year, day.month) == (the_date.year, the_date.month))
+
+
+def _decode(days, entries, path):
+    """
+    Decode days of a month, from its first one
+    :param days: list of dates (the start of the chain of the month)
+    :param entries: dict (the dates of the index)
+    :param path: string (cache directory)
+    :return: tuple (dict {date: Day}, Predictor (the state after the last of the days))
+    """
+    locations = _locations(path)
+    predictor = archive.Predictor()
+    decoded = {the_date: archive.read(os.path.join(path, entries[the_date.isoformat()]['file']), locations, predictor)
+               for the_date in days}
+    return decoded, predictor
+
+
+def _read_month(the_date, entries, path):
+    """
+    The days of the month of a date, decoded (the last month read is kept, as its days are usually read together)
+    :param the_date: date
+    :param entries: dict (the dates of the index)
+    :param path: string (cache directory)
+    :return: dict {date: Day}
+    """
+    global _month
+    key = (os.path.abspath(path), the_date.year, the_date.month, os.stat(os.path.join(path, INDEX)).st_mtime_ns)
+    if _month is None or _month[0] != key:                          # the index is written after the day files
+        _month = key, _decode(_chain(the_date, entries), entries, path)[0]
+    return _month[1]
+
+
+def _content(the_date, entries, path):
+    """
+    :param entries: dict (the dates of the index)
+    :return: bytes (the original CSV content)
+    """
+    entry = entries[the_date.isoformat()]
+    if entry['file'].endswith('.csv.gz'):                           # the former layout
+        with gzip.open(os.path.join(path, entry['file']), 'rb') as file:
+            return file.read()
+    return _read_month(the_date, entries, path)[the_date].content()
+
+
+def _write_days(found, index, path, etags=None):
+    """
+    Write the files of new days of a month, after the days before them: when they are after the last day of
+    the month, only their files are written (with the prediction state of the cache, if it is that day's);
+    otherwise the days after them are written again too. Entries are updated in the index
+    :param found: dict {date: bytes (the original CSV content)}, the new days of a month
+    :param index: dict (see read_index)
+    :param path: string (cache directory)
+    :param etags: dict {date: ETag} (where the source gave one)
+    :return: list of strings (the files of the former layout that are no longer used)
+    """
+    global _month
+    entries = index['dates']
+    first = min(found)
+    chain = _chain(first, entries)
+    kept = [the_date for the_date in chain if the_date < first]
+    days = {the_date: _content(the_date, entries, path) for the_date in chain if the_date >= first}
+    days.update(found)
+
+    state_file = os.path.join(path, STATE)
+    state_date, predictor = archive.read_state(state_file)
+    if state_date is not None and (state_date.year, state_date.month) == (first.year, first.month) \
+            and state_date >= first:
+        os.remove(state_file)                                       # the days it follows are written again
+    if not kept:
+        predictor = archive.Predictor()
+    elif state_date != kept[-1]:
+        predictor = _decode(kept, entries, path)[1]
+    locations = _locations(path)
+    stale = []
+    for the_date in sorted(days):
+        arrays, predictor = archive.encode(days[the_date], locations, predictor)
+        file_name = archive.day_file(the_date)
+        archive.write(os.path.join(path, file_name), arrays, locations)
+        entry = entries.get(the_date.isoformat())
+        if entry is not None and entry['file'] != file_name:
+            stale.append(entry['file'])
+        if the_date in found:
+            entries[the_date.isoformat()] = {'file': file_name, 'size': len(found[the_date]),
+                                             'hash': content_hash(found[the_date]),
+                                             'etag': (etags or {}).get(the_date)}
+        else:
+            entry['file'] = file_name
+    _month = None
+    if state_date is None or state_date <= max(days):
+        archive.write_state(state_file, max(days), predictor)
+    return stale
+
+
+@prof.timed('raw.add')
+def add(found, path=RAW_DIR, etags=None):
+    """
+    Add daily files to the cache: a file is written for each new date (see _write_days), then the index
+    is updated once (a date already cached is replaced)
+    :param found: dict {date: bytes (the original CSV content)}
+    :param path: string (cache directory)
+    :param etags: dict {date: ETag} (where the source gave one)
+    :return: None
+    """
+    if not found:
+        return
+    os.makedirs(path, exist_ok=True)
+    index = read_index(path)
+    months = {}
+    for the_date in found:
+        months.setdefault((the_date.year, the_date.month), {})[the_date] = found[the_date]
+    stale = []
+    for month in sorted(months):
+        stale += _write_days(months[month], index, path, etags)
+    index['last'] = max(index['dates'])
+    _write_index(index, path)
+    for stale_file in stale:                                        # only once the index no longer refers to them
+        os.remove(os.path.join(path, stale_file))
+
+
+def hashes(path=RAW_DIR):
+    """
+    The content hash of every cached date (hashes missing in an older index are computed once, and saved)
+    :param path: string (cache directory)
+    :return: dict {iso-date: string}
+    """
+    index = read_index(path)
+    missing = [day for day, entry in index['dates'].items() if 'hash' not in entry]
+    for day in missing:
+        index['dates'][day]['hash'] = content_hash(get(date.fromisoformat(day), path))
+    if missing:
+        _write_index(index, path)
+    return {day: entry['hash'] for day, entry in index['dates'].items()}
+
+
+def etags(days, path=RAW_DIR):
+    """
+    :param days: list of dates
+    :param path: string (cache directory)
+    :return: dict {date: ETag} (dates with one)
+    """
+    entries = read_index(path)['dates']
+    return {the_date: entries[the_date.isoformat()]['etag'] for the_date in days
+            if entries.get(the_date.isoformat(), {}).get('etag')}
+
+
+@prof.timed('raw.revise')
+def revise(checked, path=RAW_DIR):
+    """
+    Replace the cached files whose content has changed upstream (see oveds_sources.Source.recheck),
+    and keep the new ETags of the others
+    :param checked: dict {date: (bytes, or None if unchanged; ETag or None)}
+    :param path: string (cache directory)
+    :return: sorted list of dates (the revised ones)
+    """
+    known = hashes(path)
+    revised = {the_date: content for the_date, (content, etag) in checked.items()
+               if content is not None and the_date.isoformat() in known
+               and content_hash(content) != known[the_date.isoformat()]}
+    add(revised, path, {the_date: etag for the_date, (content, etag) in checked.items()})
+    index = read_index(path)
+    changed = False
+    for the_date, (content, etag) in checked.items():
+        entry = index['dates'].get(the_date.isoformat())
+        if entry is not None and etag and entry.get('etag') != etag:
+            entry['etag'] = etag
+            changed = True
+    if changed:
+        _write_index(index, path)
+    return sorted(revised)
+
+
+def get(the_date, path=RAW_DIR):
+    """
+    The original CSV content of a cached date
+    :param the_date: date
+    :param path: string (cache directory)
+    :return: bytes
+    """
+    return _content(the_date, read_index(path)['dates'], path)
+
+
+def _frame(the_date, entries, path, columns):
+    if entries[the_date.isoformat()]['file'].endswith('.csv.gz'):
+        content = _content(the_date, entries, path)
+        return pd.read_csv(io.BytesIO(content)) if columns is None else ingest.parse(content, columns)
+    return _read_month(the_date, entries, path)[the_date].frame(columns)
+
+
+def read_day(the_date, path=RAW_DIR, columns=None):
+    """
+    The raw DataFrame of a cached date, read from its arrays (no CSV text is parsed)
+    :param the_date: date
+    :param path: string (cache directory)
+    :param columns: list of (normalized) column names to keep, as oveds_ingest.parse reads them;
+                    None --> all the columns, as pandas.read_csv reads the daily file
+    :return: DataFrame
+    """
+    return _frame(the_date, read_index(path)['dates'], path, columns)
+
+
+def iter_days(days=None, path=RAW_DIR, columns=None):
+    """
+    Stream the cached dates, one DataFrame at a time
+    :param days: list of dates (None --> all cached dates)
+    :param path: string (cache directory)
+    :param columns: list of (normalized) column names to keep (see read_day)
+    :return: generator of (date, DataFrame)
+    """
+    entries = read_index(path)['dates']
+    for the_date in (dates(path) if days is None else days):
+        yield the_date, _frame(the_date, entries, path, columns)
+
+
+def convert_pickle(pickle_path='raw_data.p', path=RAW_DIR):
+    """
+    Convert the old raw data pickle (a dict {date: DataFrame}) to the per-date cache
+    :param pickle_path: string
+    :param path: string (cache directory)
+    :return: None
+    """
+    with open(pickle_path, 'rb') as file:
+        df_dict = pickle.load(file)
+    add({the_date: df_dict[the_date].to_csv(index=False).encode() for the_date in df_dict}, path)
+    print('Converted', pickle_path, 'to', path, '(' + str(len(df_dict)), 'dates)')
+
+
+@prof.timed('raw.convert')
+def convert_files(path=RAW_DIR):
+    """
+    Convert a cache of the former layout (a gzipped CSV file per date) to day files, one month at a time
+    (the ETags are kept; each file of the former layout is removed once its month is written)
+    :param path: string (cache directory)
+    :return: None
+    """
+    index = read_index(path)
+    months = {}
+    for day, entry in index['dates'].items():
+        if entry['file'].endswith('.csv.gz'):
+            the_date = date.fromisoformat(day)
+            months.setdefault((the_date.year, the_date.month), []).append(the_date)
+    if not months:
+        return
+    gz_size = sum(os.path.getsize(os.path.join(path, entry['file'])) for entry in index['dates'].values()
+                  if entry['file'].endswith('.csv.gz'))
+    for month in sorted(months):
+        entries = index['dates']
+        found = {the_date: _content(the_date, entries, path) for the_date in months[month]}
+        stale = _write_days(found, index, path, {the_date: entries[the_date.isoformat()]['etag'] for the_date in found})
+        _write_index(index, path)
+        for stale_file in stale:
+            os.remove(os.path.join(path, stale_file))
+    size = sum(os.path.getsize(os.path.join(path, file_name)) for file_name in
+               {entry['file'] for entry in index['dates'].values()} | {archive.LOCATIONS})
+    print('Converted', path, 'to day files (' + str(len(months)), 'months,', round(gz_size / 2**20, 1), 'MB -->',
+          round(size / 2**20, 1), 'MB)')
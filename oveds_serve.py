@@ -0,0 +1,377 @@
+#-------------------------------------------------------------------------------
+# This file serves the Covid-19 data over HTTP, as JSON or CSV, from a single in-memory copy
+# shared by all clients (asyncio, one process). The data is read once; when the store changes
+# (load_raw, sync_raw and clean_data brought in a new or revised day, here or in another process), a new copy is read
+# in the background and swapped in, and the old one keeps serving until then.
+#
+# Usage:  python oveds_serve.py [--host H] [--port P] [--store DIR] [--raw DIR] [--reload-seconds S]
+#                               [--update-minutes M]
+#
+# Endpoints (GET; add format=csv for CSV):
+#     /series?location=US[&province=New York]&metric=Confirmed,Avg_Deaths[&start=2020-03-01][&end=...]
+#             (location and province may be given in any case, as a country alias, or by a unique prefix)
+#     /snapshot?level=country|province|world[&date=2020-12-31]
+#     /rank?metric=Deaths[&date=...][&per_million=1][&k=10]
+#     /region?lat=40.7&lon=-74&km=100 | ?lat=..&lon=..&nearest=10 | ?bbox=south,west,north,east [&date=...]
+#     /countries
+#     /locations?q=new y[&country=US]     - the countries (or provinces of a country) a name, prefix or typo may mean
+#     /status
+# Responses carry an ETag of the data version and the query; a request with a matching If-None-Match
+# gets 304 Not Modified. Responses are gzipped for clients that accept it.
+# The queries and the compression run in worker threads; the event loop only reads and writes the connections.
+#-------------------------------------------------------------------------------
+import sys
+import gzip
+import zlib
+import json
+import asyncio
+import argparse
+import functools
+from urllib.parse import urlsplit, parse_qs
+from email.utils import formatdate
+import pandas as pd
+import oveds_accs as oda
+import oveds_data as ds
+import oveds_query as query
+import oveds_store as store
+import oveds_raw as raw
+import oveds_cube as cube
+
+HOST = '127.0.0.1'
+PORT = 8019
+RELOAD_SECONDS = 10             # how often the store is checked for new data
+IDLE_SECONDS = 30               # an idle keep-alive connection is closed after this
+MIN_GZIP = 1024                 # bytes; smaller responses are sent as is
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class BadRequest(Exception):
+    """A missing or invalid query parameter"""
+
+
+def open_dataset(path):
+    """
+    Read all that the endpoints serve into memory: the cube and the derived series of every level,
+    the spatial index and the catalog of the locations
+    :param path: string (store directory)
+    :return: Dataset
+    """
+    data = ds.Dataset(path)
+    for level in cube.LEVELS:
+        data.cube(level)
+        data.derived(level)
+    data.spatial()
+    data.catalog()
+    return data
+
+
+#-------------------------------------------------------------------------------
+
+def _param(params, name, default=None, convert=str):
+    values = params.get(name)
+    if not values or values[0] == '':
+        if default is None:
+            raise BadRequest('missing parameter: ' + name)
+        return default
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise BadRequest('invalid ' + name + ': ' + values[0])
+
+
+def _flag(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _records(df):
+    """
+    :param df: DataFrame (with any index)
+    :return: list of dicts, one per row (dates as YYYY-MM-DD, NaN as null)
+    """
+    if not isinstance(df.index, pd.RangeIndex):
+        df = df.reset_index()
+    df = df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return json.loads(df.to_json(orient='records'))
+
+
+def _location(data, params):
+    """
+    The location of a request, resolved in the catalog
+    :return: tuple (country or 'World', province or '')
+    """
+    names = data.catalog()
+    location = _param(params, 'location')
+    if location.strip().lower() == 'world':
+        return 'World', ''
+    country = names.resolve(location)
+    if country is None:
+        raise BadRequest('unknown location: ' + location + _hint(names.suggest(location)))
+    province = _param(params, 'province', '')
+    if province == '':
+        return country, ''
+    resolved = names.resolve(province, country)
+    if resolved is None:
+        raise BadRequest('unknown province of ' + country + ': ' + province + _hint(names.suggest(province, country)))
+    return country, resolved
+
+
+def _hint(suggestions):
+    return ' (did you mean: ' + ', '.join(suggestions) + '?)' if suggestions else ''
+
+
+def _series(data, params):
+    location, province = _location(data, params)
+    metrics = _param(params, 'metric').split(',')
+    result = query.series(data, (location, province), metrics, _param(params, 'start', '') or None,
+                          _param(params, 'end', '') or None)
+    if result.empty and location != 'World':
+        raise BadRequest('no data for ' + location + ((', ' + province) if province else ''))
+    return result, None
+
+
+def _snapshot(data, params):
+    level = _param(params, 'level', 'country')
+    if level not in cube.LEVELS:
+        raise BadRequest('invalid level: ' + level)
+    the_date = data.as_of(_param(params, 'date', '') or None)
+    return query.snapshot(data, the_date, level), the_date
+
+
+def _rank(data, params):
+    the_date = data.as_of(_param(params, 'date', '') or None)
+    result = query.rank(data, _param(params, 'metric'), the_date, _flag(_param(params, 'per_million', '0')),
+                        _param(params, 'k', 10, int))
+    return result.to_frame(), the_date
+
+
+def _region(data, params):
+    the_date = data.as_of(_param(params, 'date', '') or None)
+    if params.get('bbox'):
+        area = ('bbox',) + tuple(float(value) for value in _param(params, 'bbox').split(','))
+        if len(area) != 5:
+            raise BadRequest('invalid bbox: ' + _param(params, 'bbox'))
+    elif params.get('nearest'):
+        area = ('nearest', _param(params, 'lat', convert=float), _param(params, 'lon', convert=float),
+                _param(params, 'nearest', convert=int))
+    else:
+        area = ('radius', _param(params, 'lat', convert=float), _param(params, 'lon', convert=float),
+                _param(params, 'km', convert=float))
+    return query.region(data, area, the_date), the_date
+
+
+def _countries(data, params):
+    return pd.DataFrame({'Country_Region': data.countries()}), None
+
+
+def _locations(data, params):
+    names = data.catalog()
+    country = _param(params, 'country', '')
+    if country:
+        resolved = names.resolve(country)
+        if resolved is None:
+            raise BadRequest('unknown country: ' + country + _hint(names.suggest(country)))
+        query_name = _param(params, 'q', '')
+        provinces = names.suggest(query_name, resolved) if query_name else names.provinces(resolved)
+        return pd.DataFrame({'Country_Region': resolved, 'Province_State': provinces}), None
+    return pd.DataFrame({'Country_Region': names.suggest(_param(params, 'q'))}), None
+
+
+ENDPOINTS = {'/series': _series, '/snapshot': _snapshot, '/rank': _rank, '/region': _region,
+             '/countries': _countries, '/locations': _locations}
+
+
+#-------------------------------------------------------------------------------
+
+class Server:
+    """
+    The HTTP server, and the in-memory data it serves
+    """
+
+    def __init__(self, path=store.STORE_DIR, reload_seconds=RELOAD_SECONDS, update_minutes=None, raw_path=raw.RAW_DIR):
+        self.path = path
+        self.raw_path = raw_path                                    # the raw cache of the updates
+        self.reload_seconds = reload_seconds
+        self.update_minutes = update_minutes
+        self.data = None
+        self.requests = 0
+
+    async def reload(self):
+        """
+        Read a new copy of the data when the store has changed, and swap it in (checked every reload_seconds)
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            try:
+                if await loop.run_in_executor(None, ds.version, self.path) != self.data.version:
+                    data = await loop.run_in_executor(None, open_dataset, self.path)
+                    self.data = data                                # requests in progress finish on the old copy
+                    print('Reloaded data version', data.version, 'up to', data.latest().date())
+            except Exception as err:                                # the store is being written; retry later
+                print('Reload failed:', type(err).__name__, err)
+
+    async def update(self):
+        """
+        Bring in new and revised daily files to the raw cache, and clean them into the store that is served
+        (every update_minutes), in a worker thread
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                new = await loop.run_in_executor(None, functools.partial(oda.load_raw, path=self.raw_path))
+                revised = await loop.run_in_executor(None, functools.partial(oda.sync_raw, path=self.raw_path))
+                if new or revised:
+                    await loop.run_in_executor(None, functools.partial(oda.clean_data, raw_path=self.raw_path,
+                                                                       path=self.path))
+            except Exception as err:
+                print('Update failed:', type(err).__name__, err)
+            await asyncio.sleep(self.update_minutes * 60)
+
+    def respond(self, method, target, headers):
+        """
+        The response to a request
+        :param method: string
+        :param target: string (path and query string)
+        :param headers: dict {lower-case name: value}
+        :return: tuple (status, dict of headers, bytes)
+        """
+        if method not in ('GET', 'HEAD'):
+            return self.error(405, 'only GET and HEAD are supported')
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        data = self.data
+        if url.path == '/status':
+            body = {'version': data.version, 'latest': data.latest().strftime('%Y-%m-%d'),
+                    'requests': self.requests, 'cache': {'entries': len(query.cache), 'bytes': query.cache.size,
+                                                         'hits': query.cache.hits, 'misses': query.cache.misses}}
+            return 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}, json.dumps(body).encode()
+        if url.path not in ENDPOINTS:
+            return self.error(404, 'unknown endpoint: ' + url.path)
+
+        canonical = url.path + '?' + '&'.join(sorted(url.query.split('&')))
+        etag = '"%d-%08x"' % (data.version, zlib.crc32(canonical.encode()))
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, {'ETag': etag}, b''
+        try:
+            out_format = _param(params, 'format', 'json')
+            if out_format not in ('json', 'csv'):
+                raise BadRequest('invalid format: ' + out_format)
+            result, the_date = ENDPOINTS[url.path](data, params)
+        except BadRequest as err:
+            return self.error(400, str(err))
+        except ValueError as err:                                   # e.g. a date before the first data
+            return self.error(400, str(err))
+        except KeyError as err:                                     # e.g. an unknown metric
+            return self.error(400, 'unknown column: ' + str(err))
+
+        if out_format == 'csv':
+            body, content_type = result.to_csv().encode(), 'text/csv'
+        else:
+            body = json.dumps({'version': data.version, 'date': None if the_date is None else the_date.strftime('%Y-%m-%d'),
+                               'rows': _records(result)}).encode()
+            content_type = 'application/json'
+        return 200, {'Content-Type': content_type, 'ETag': etag, 'Cache-Control': 'no-cache'}, body
+
+    def error(self, status, message):
+        return status, {'Content-Type': 'application/json'}, json.dumps({'error': message}).encode()
+
+    def reply(self, method, target, headers):
+        """
+        The response to a request, gzipped for clients that accept it (run in a worker thread)
+        :param method: string
+        :param target: string (path and query string)
+        :param headers: dict {lower-case name: value}
+        :return: tuple (status, dict of headers, bytes)
+        """
+        try:
+            status, out_headers, body = self.respond(method, target, headers)
+        except Exception as err:
+            status, out_headers, body = self.error(500, '%s: %s' % (type(err).__name__, err))
+        if len(body) >= MIN_GZIP and 'gzip' in headers.get('accept-encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            out_headers['Content-Encoding'] = 'gzip'
+        return status, out_headers, body
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of one connection (HTTP/1.1, with keep-alive)
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    status, out_headers, body = self.error(400, 'bad request line')
+                    method, version = 'GET', 'HTTP/1.0'
+                else:
+                    self.requests += 1
+                    status, out_headers, body = await loop.run_in_executor(None, self.reply, method, target, headers)
+                out_headers['Vary'] = 'Accept-Encoding'
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                out_headers.update({'Content-Length': str(len(body)), 'Date': formatdate(usegmt=True),
+                                    'Connection': 'keep-alive' if keep_alive else 'close'})
+                head = 'HTTP/1.1 %d %s\r\n' % (status, REASONS[status]) + \
+                       ''.join('%s: %s\r\n' % item for item in out_headers.items()) + '\r\n'
+                writer.write(head.encode('latin-1') + (b'' if method == 'HEAD' else body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        loop = asyncio.get_running_loop()
+        self.data = await loop.run_in_executor(None, open_dataset, self.path)
+        tasks = [asyncio.create_task(self.reload())]
+        if self.update_minutes:
+            tasks.append(asyncio.create_task(self.update()))
+        server = await asyncio.start_server(self.handle, host, port)
+        print('Serving data version', self.data.version, 'up to', self.data.latest().date(),
+              'on http://%s:%d' % (host, port))
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the Covid-19 data over HTTP (JSON / CSV)')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--store', default=store.STORE_DIR, help='cleaned data store directory')
+    parser.add_argument('--raw', default=raw.RAW_DIR, help='raw data cache directory (of --update-minutes)')
+    parser.add_argument('--reload-seconds', type=float, default=RELOAD_SECONDS,
+                        help='how often to check the store for new data')
+    parser.add_argument('--update-minutes', type=float,
+                        help='also fetch and clean new (and revised) daily files every this many minutes')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(Server(args.store, args.reload_seconds, args.update_minutes, args.raw).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#-------------------------------------------------------------------------------
+# This library has the sources of the Covid-19 raw data. Every source gives the daily files
+# of a range of dates, in the JHU daily-report layout, ready for the raw cache (oveds_raw):
+#     daily        - the JHU daily reports, one file per date (oveds_fetch)
+#     timeseries   - the JHU time-series files (confirmed, deaths, recovered; the whole history in
+#                    three wide files), melted into one daily file per date; with the JHU lookup table,
+#                    the population of each location gives the Incident_Rate. The files need not have
+#                    the same locations (Canada: by province, but recovered only for the whole country):
+#                    a daily file has the locations of all three, each with the counts it has
+# The source type is chosen per run ($OVEDS_SOURCE_TYPE, or --source-type in oveds_main), and its
+# location ($OVEDS_SOURCE) may be a base URL or a local directory.
+# Country names and the cruise ships are handled by clean_data, the same for all sources.
+#-------------------------------------------------------------------------------
+import io
+import os
+import abc
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import oveds_fetch as fetch
+
+JHU_DATA_URL = 'https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/'
+TIME_SERIES_URL = JHU_DATA_URL + 'csse_covid_19_time_series/'
+
+TIME_SERIES_FILES = {'Confirmed': 'time_series_covid19_confirmed_global.csv',
+                     'Deaths': 'time_series_covid19_deaths_global.csv',
+                     'Recovered': 'time_series_covid19_recovered_global.csv'}
+LOOKUP_FILE = 'UID_ISO_FIPS_LookUp_Table.csv'                       # population of each location
+
+KEYS = ['Province_State', 'Country_Region']
+WORKERS = fetch.WORKERS                                             # concurrent requests
+
+
+class Source(abc.ABC):
+    """
+    A source of daily files (a subclass gives at least fetch)
+    """
+    default_location = None
+
+    def __init__(self, location=None):
+        self.location = location or os.environ.get('OVEDS_SOURCE') or self.default_location
+
+    @abc.abstractmethod
+    def fetch(self, first, last, workers=WORKERS):
+        """
+        The daily files from first up to (not including) last
+        :param first: date
+        :param last: date
+        :param workers: int (number of concurrent requests)
+        :return: dict {date: bytes (CSV content, in a daily-report layout)}, for consecutive dates starting at first
+        """
+
+    def recheck(self, days, etags, workers=WORKERS):
+        """
+        Fetch the daily files of dates already in the raw cache again, to find upstream revisions.
+        By default all of them are fetched; a source that can tell an unchanged file cheaply skips it
+        :param days: list of dates (consecutive)
+        :param etags: dict {date: ETag} (recorded at the last fetch)
+        :param workers: int (number of concurrent requests)
+        :return: dict {date: (bytes (CSV content), or None if unchanged; ETag or None)}
+        """
+        found = self.fetch(min(days), max(days) + timedelta(1), workers) if days else {}
+        return {the_date: (content, None) for the_date, content in found.items()}
+
+
+class DailyReports(Source):
+    """
+    The JHU daily reports: one request per date
+    """
+    default_location = fetch.DAILY_REPORTS_URL
+
+    def fetch(self, first, last, workers=WORKERS):
+        return fetch.fetch_range(first, last, self.location, workers)
+
+    def recheck(self, days, etags, workers=WORKERS):
+        return fetch.recheck(days, etags, self.location, workers)      # conditional requests
+
+
+class TimeSeries(Source):
+    """
+    The JHU time-series files: a handful of requests for the whole history
+    """
+    default_location = TIME_SERIES_URL
+
+    def _parent(self):
+        location = self.location.rstrip('/')
+        if fetch.is_url(location):
+            return location.rsplit('/', 1)[0]
+        return os.path.dirname(os.path.abspath(location))
+
+    def _fetch_all(self, workers):
+        names = dict(TIME_SERIES_FILES, Lookup=LOOKUP_FILE)
+        with ThreadPoolExecutor(max_workers=min(workers, len(names))) as pool:
+            futures = {key: pool.submit(fetch.fetch_file, self.location, name) for key, name in names.items()}
+            contents = {key: future.result() for key, future in futures.items()}
+        if contents['Lookup'] is None:                              # JHU keeps it one directory up
+            contents['Lookup'] = fetch.fetch_file(self._parent(), LOOKUP_FILE)
+        return contents
+
+    def fetch(self, first, last, workers=WORKERS):
+        contents = self._fetch_all(workers)
+        for key in ['Confirmed', 'Deaths']:
+            if contents[key] is None:
+                raise fetch.FetchError(TIME_SERIES_FILES[key] + ': not found in ' + self.location)
+
+        wide = {key: _wide(contents[key]) for key in TIME_SERIES_FILES if contents[key] is not None}
+        index = wide['Confirmed'][0].index                          # the locations of all the files
+        for key in wide:
+            index = index.append(wide[key][0].index[~wide[key][0].index.isin(index)])
+        lat_long = pd.concat([wide[key][1] for key in wide])
+        lat_long = lat_long[~lat_long.index.duplicated()].reindex(index)
+        dates = [the_date for the_date in wide['Confirmed'][0].columns if first <= the_date < last]
+        counts = {key: wide[key][0].reindex(index=index, columns=dates) if key in wide else
+                  pd.DataFrame(np.nan, index=index, columns=dates) for key in TIME_SERIES_FILES}
+        population = _population(contents['Lookup'], index)
+
+        locations = index.to_frame(index=False)
+        found = {}
+        for the_date in dates:
+            day = locations.assign(Last_Update=the_date.isoformat() + ' 23:59:59',
+                                   Lat=lat_long['Lat'].to_numpy(), Long_=lat_long['Long_'].to_numpy())
+            for key in TIME_SERIES_FILES:
+                day[key] = counts[key][the_date].to_numpy()
+            day['Active'] = day['Confirmed'] - day['Deaths'] - day['Recovered']
+            with np.errstate(invalid='ignore', divide='ignore'):
+                day['Incident_Rate'] = day['Confirmed'] / population * 1e5
+            day = day[(day['Confirmed'] > 0) | (day['Deaths'] > 0) | (day['Recovered'] > 0)]   # locations with cases
+            found[the_date] = day.to_csv(index=False, float_format='%.10g').encode()
+        print('Time-series files:', len(dates), 'dates from', self.location)
+        return found
+
+
+def _wide(content):
+    """
+    Parse a wide time-series file
+    :param content: bytes (CSV content)
+    :return: tuple (DataFrame of the counts, indexed by Province_State and Country_Region, a column per date;
+                    DataFrame of the latitude and longitude, with the same index)
+    """
+    wide = pd.read_csv(io.BytesIO(content), encoding='utf-8-sig',
+                       dtype={'Province/State': object, 'Country/Region': object})
+    wide = wide.rename(columns={'Province/State': 'Province_State', 'Country/Region': 'Country_Region',
+                                'Long': 'Long_'})
+    wide[KEYS] = wide[KEYS].fillna('')                              # a country as a whole: no province
+    wide = wide.drop_duplicates(KEYS).set_index(KEYS)
+    lat_long = wide[['Lat', 'Long_']]
+    wide = wide.drop(columns=['Lat', 'Long_'])
+    wide.columns = pd.to_datetime(wide.columns, format='%m/%d/%y').date
+    return wide, lat_long
+
+
+def _population(content, index):
+    """
+    The population of the time-series locations, from the JHU lookup table
+    :param content: bytes (CSV content of the lookup table), or None
+    :param index: MultiIndex (Province_State, Country_Region)
+    :return: numpy array (NaN where unknown)
+    """
+    if content is None:
+        return np.full(len(index), np.nan)
+    lookup = pd.read_csv(io.BytesIO(content), encoding='utf-8-sig', usecols=['Admin2'] + KEYS + ['Population'],
+                         dtype={'Admin2': object, 'Province_State': object, 'Country_Region': object})
+    lookup = lookup[lookup['Admin2'].isna()].copy()                 # province and country rows
+    lookup[KEYS] = lookup[KEYS].fillna('')
+    lookup = lookup.drop_duplicates(KEYS).set_index(KEYS)
+    return lookup['Population'].reindex(index).to_numpy(dtype=np.float64)
+
+
+SOURCES = {'daily': DailyReports, 'timeseries': TimeSeries}
+
+
+def get(source_type=None, location=None):
+    """
+    The source of a run
+    :param source_type: string ('daily' or 'timeseries'), default: $OVEDS_SOURCE_TYPE, else 'daily'
+    :param location: string (base URL or local directory), default: $OVEDS_SOURCE, else the JHU repository
+    :return: Source
+    """
+    source_type = source_type or os.environ.get('OVEDS_SOURCE_TYPE') or 'daily'
+    if source_type not in SOURCES:
+        raise ValueError('Unknown source type: ' + source_type + ' (one of: ' + ', '.join(SOURCES) + ')')
+    return SOURCES[source_type](location)
@@ -0,0 +1,179 @@
+#-------------------------------------------------------------------------------
+# This library is the spatial index of the Covid-19 locations (countries, provinces, US counties):
+# the distinct locations of the cleaned data, with their latest Latitude/Longitude, bucketed into
+# a grid of CELL_DEG x CELL_DEG degree cells (sorted by cell, so a row of cells is a row range).
+#     bbox(south, west, north, east)    - the locations in a bounding box
+#     radius(lat, lon, km)              - the locations within a distance of a point
+#     nearest(lat, lon, k)              - the k nearest locations to a point
+# Each query scans only the cells it covers. The index is built once per data version (oveds_data),
+# and the locations it returns carry the keys of the cleaned data and of the cube.
+#-------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import oveds_prof as prof
+import oveds_store as store
+
+KEYS = ['Country_Region', 'Province_State', 'Admin2']
+CELL_DEG = 1.0                                                      # grid cell size, in degrees
+EARTH_KM = 6371.0088                                                # mean radius of the Earth
+KM_PER_DEG = EARTH_KM * np.pi / 180                                 # along a meridian
+
+
+def locations(path=store.STORE_DIR):
+    """
+    The distinct locations of the cleaned data, with their latest valid coordinates, one month at a time
+    (JHU gives 0, 0 to the "Unassigned" and "Out of ..." rows: these are left out)
+    :param path: string (store directory)
+    :return: DataFrame (the KEYS, Latitude, Longitude)
+    """
+    columns = KEYS + ['Latitude', 'Longitude']
+    parts = store.read_manifest(path)['partitions']
+    found = pd.DataFrame({col: pd.Series(dtype=object if col in KEYS else np.float64) for col in columns})
+    for key in sorted(parts):
+        month = store.read(columns, parts[key]['first'], parts[key]['last'], path=path)
+        month = month[month['Latitude'].notna() & month['Longitude'].notna() &
+                      ((month['Latitude'] != 0) | (month['Longitude'] != 0))]
+        month = month.astype({col: object for col in KEYS})
+        found = pd.concat([found, month], ignore_index=True).drop_duplicates(KEYS, keep='last')
+    return found.sort_values(KEYS, na_position='first', kind='stable').reset_index(drop=True)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle (haversine) distance
+    :param lat1, lon1, lat2, lon2: floats or numpy arrays (degrees)
+    :return: float or numpy array (km)
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    hav = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_KM * np.arcsin(np.sqrt(np.minimum(hav, 1)))
+
+
+class GridIndex:
+    """
+    A grid index over the locations
+    """
+
+    def __init__(self, locs, cell_deg=CELL_DEG):
+        """
+        :param locs: DataFrame (the KEYS, Latitude, Longitude; see locations())
+        :param cell_deg: float (grid cell size, in degrees)
+        """
+        self.cell_deg = cell_deg
+        self.n_lat = int(np.ceil(180 / cell_deg))
+        self.n_lon = int(np.ceil(360 / cell_deg))
+        cells = self._cell(locs['Latitude'].to_numpy(), locs['Longitude'].to_numpy())
+        order = np.argsort(cells, kind='stable')
+        self.locations = locs.iloc[order].reset_index(drop=True)    # sorted by cell
+        self.lat = self.locations['Latitude'].to_numpy(dtype=np.float64)
+        self.lon = self.locations['Longitude'].to_numpy(dtype=np.float64)
+        self.starts = np.searchsorted(cells[order], np.arange(self.n_lat * self.n_lon + 1))   # rows of each cell
+
+    def __len__(self):
+        return len(self.locations)
+
+    def _lat_row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(np.int64), 0, self.n_lat - 1)
+
+    def _lon_col(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180) / self.cell_deg).astype(np.int64), 0, self.n_lon - 1)
+
+    def _cell(self, lat, lon):
+        return self._lat_row(lat) * self.n_lon + self._lon_col(lon)
+
+    def _candidates(self, south, west, north, east):
+        """
+        The rows in the cells that cover a box (west > east: the box crosses the 180th meridian)
+        :return: numpy array of rows
+        """
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rows = []
+        for lat_row in range(self._lat_row(south), self._lat_row(north) + 1):
+            for first, last in spans:
+                cell = lat_row * self.n_lon
+                rows.append(np.arange(self.starts[cell + self._lon_col(first)], self.starts[cell + self._lon_col(last) + 1]))
+        return np.concatenate(rows) if rows else np.array([], dtype=np.int64)
+
+    def _result(self, rows, distances=None):
+        result = self.locations.iloc[rows]
+        if distances is not None:
+            result = result.assign(Distance_km=distances)
+        return result
+
+    def bbox(self, south, west, north, east):
+        """
+        The locations in a bounding box
+        :param south, north: float (latitudes, degrees)
+        :param west, east: float (longitudes, degrees; west > east for a box across the 180th meridian)
+        :return: DataFrame (the KEYS, Latitude, Longitude)
+        """
+        rows = self._candidates(south, west, north, east)
+        lat, lon = self.lat[rows], self.lon[rows]
+        in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        return self._result(rows[(lat >= south) & (lat <= north) & in_lon])
+
+    def _box(self, lat, lon, km):
+        """
+        The bounding box of a circle
+        :return: tuple (south, west, north, east)
+        """
+        dlat = km / KM_PER_DEG
+        south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        cos_lat = np.cos(np.radians(max(abs(south), abs(north))))
+        if north >= 90 or south <= -90 or km / KM_PER_DEG >= 180 * cos_lat:
+            return south, -180.0, north, 180.0                      # around a pole: all longitudes
+        dlon = km / (KM_PER_DEG * cos_lat)
+        west, east = lon - dlon, lon + dlon
+        if west < -180:
+            west += 360
+        if east > 180:
+            east -= 360
+        return south, west, north, east
+
+    def radius(self, lat, lon, km):
+        """
+        The locations within a distance of a point, nearest first
+        :param lat, lon: float (degrees)
+        :param km: float
+        :return: DataFrame (the KEYS, Latitude, Longitude, Distance_km)
+        """
+        rows = self._candidates(*self._box(lat, lon, km))
+        distances = distance_km(lat, lon, self.lat[rows], self.lon[rows])
+        inside = distances <= km
+        rows, distances = rows[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return self._result(rows[order], distances[order])
+
+    def nearest(self, lat, lon, k=10):
+        """
+        The k nearest locations to a point: the search radius grows (doubles) until k locations are in it
+        :param lat, lon: float (degrees)
+        :param k: int
+        :return: DataFrame (the KEYS, Latitude, Longitude, Distance_km), nearest first
+        """
+        k = min(k, len(self))
+        km = self.cell_deg * KM_PER_DEG
+        while True:
+            rows = self._candidates(*self._box(lat, lon, km))
+            distances = distance_km(lat, lon, self.lat[rows], self.lon[rows])
+            inside = distances <= km
+            if inside.sum() >= k or km >= np.pi * EARTH_KM:
+                break
+            km *= 2
+        rows, distances = rows[inside], distances[inside]
+        if len(rows) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            rows, distances = rows[nearest], distances[nearest]
+        order = np.argsort(distances, kind='stable')
+        return self._result(rows[order], distances[order])
+
+
+@prof.timed('spatial.build')
+def build(path=store.STORE_DIR, cell_deg=CELL_DEG):
+    """
+    Build the grid index of the locations of a store
+    :param path: string (store directory)
+    :param cell_deg: float
+    :return: GridIndex
+    """
+    return GridIndex(locations(path), cell_deg)
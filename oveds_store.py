@@ -0,0 +1,350 @@
+#-------------------------------------------------------------------------------
+# This library stores the cleaned Covid-19 data as month-partitioned columnar files
+# Layout of the store directory:
+#     manifest.json               - schema, partitions (first/last date, rows), data version,
+#                                   and the sources (content hash of the raw file of each date)
+#     cubes/, derived/            - stores of the aggregates (oveds_cube, oveds_derive), written under it; a write
+#                                   to them is counted in the data version of this store too (see touch)
+#     2020-03/<column>.npy        - one NumPy file per column (opened memory-mapped)
+#     2020-03/<column>.json       - categories of a string column (the .npy holds int32 codes, -1 = NaN)
+# Readers load only the columns, date range and countries they need.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import json
+import shutil
+import pickle
+from datetime import date
+import numpy as np
+import pandas as pd
+import oveds_prof as prof
+
+STORE_DIR = 'cleaned_data'
+MANIFEST = 'manifest.json'
+
+
+def _kind(series):
+    """
+    The storage kind of a column: 'str', 'date' or 'num'
+    :param series: Series
+    :return: string
+    """
+    dtype = series.dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'date'
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype) or dtype == object:
+        valid = series.dropna()
+        if len(valid) and isinstance(valid.iloc[0], date):
+            return 'date'
+        return 'str'
+    return 'num'
+
+
+def read_manifest(path=STORE_DIR):
+    """
+    Read the manifest of the store
+    :param path: string (store directory)
+    :return: dict (an empty store if there is no manifest)
+    """
+    try:
+        with open(os.path.join(path, MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'version': 0, 'columns': {}, 'partitions': {}}
+
+
+def _write_manifest(manifest, path):
+    tmp = os.path.join(path, MANIFEST + '.tmp')
+    with open(tmp, 'w') as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(tmp, os.path.join(path, MANIFEST))               # atomic: readers see the old or the new one
+
+
+def exists(path=STORE_DIR):
+    return os.path.exists(os.path.join(path, MANIFEST))
+
+
+def watermark(path=STORE_DIR):
+    """
+    The last date in the store, from the manifest only (no data is loaded)
+    :param path: string (store directory)
+    :return: date, or None for an empty store
+    """
+    parts = read_manifest(path)['partitions']
+    if not parts:
+        return None
+    return date.fromisoformat(max(part['last'] for part in parts.values()))
+
+
+def version(path=STORE_DIR):
+    """
+    The data version: incremented on every write to the store
+    :param path: string (store directory)
+    :return: int
+    """
+    return read_manifest(path)['version']
+
+
+def data_version(path=STORE_DIR):
+    """
+    The version of all the data under a store directory: incremented on every write to the store and on every
+    touch (a write to the aggregates under it); it never goes down, not even when the whole store is written again
+    :param path: string (store directory)
+    :return: int
+    """
+    manifest = read_manifest(path)
+    return manifest.get('data_version', manifest['version'])
+
+
+def touch(path=STORE_DIR):
+    """
+    Count a write to the data under a store directory (e.g. its cube) in its data version
+    :param path: string (store directory)
+    :return: None
+    """
+    if exists(path):
+        manifest = read_manifest(path)
+        manifest['data_version'] = data_version(path) + 1
+        _write_manifest(manifest, path)
+
+
+#-------------------------------------------------------------------------------
+
+def _write_partition(df, columns, part_dir):
+    """
+    Write one partition (all its columns) into a fresh directory, then swap it in
+    :param df: DataFrame (sorted by date)
+    :param columns: dict {column: kind}
+    :param part_dir: string
+    :return: None
+    """
+    tmp_dir = part_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for col, kind in columns.items():
+        file_name = os.path.join(tmp_dir, col)
+        if kind == 'str':
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                codes, cats = df[col].cat.codes.to_numpy(), df[col].cat.categories
+            else:
+                codes, cats = pd.factorize(df[col].astype(object))      # NaN --> -1
+            np.save(file_name + '.npy', codes.astype(np.int32))
+            with open(file_name + '.json', 'w') as file:
+                json.dump([str(cat) for cat in cats], file)
+        elif kind == 'date':
+            np.save(file_name + '.npy', pd.to_datetime(df[col]).values.astype('datetime64[D]'))
+        else:
+            np.save(file_name + '.npy', df[col].to_numpy())
+
+    old_dir = part_dir + '.old'
+    if os.path.exists(part_dir):
+        os.replace(part_dir, old_dir)
+    os.replace(tmp_dir, part_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _read_column(part_dir, col, kind, rows=None):
+    """
+    Read a single column of a partition
+    :param part_dir: string
+    :param col: string (column name)
+    :param kind: string ('str', 'date' or 'num')
+    :param rows: slice or boolean array (rows to take), or None for all
+    :return: numpy array (for a string column: a tuple of codes and categories)
+    """
+    file_name = os.path.join(part_dir, col)
+    values = np.load(file_name + '.npy', mmap_mode='r')
+    if rows is not None:
+        values = values[rows]
+    if kind == 'str':
+        with open(file_name + '.json') as file:
+            return np.array(values), json.load(file)
+    if kind == 'date':
+        return np.asarray(values, dtype='datetime64[ns]')
+    return np.array(values)
+
+
+def _concat_categorical(parts):
+    """
+    Combine the (codes, categories) of several partitions into a single Categorical
+    :param parts: list of tuples (codes array, list of categories)
+    :return: Categorical
+    """
+    cats = sorted(set(cat for codes, part_cats in parts for cat in part_cats))
+    position = {cat: ii for ii, cat in enumerate(cats)}
+    all_codes = []
+    for codes, part_cats in parts:
+        remap = np.array([position[cat] for cat in part_cats] + [-1], dtype=np.int32)  # code -1 stays -1
+        all_codes.append(remap[codes])
+    codes = np.concatenate(all_codes) if all_codes else np.array([], dtype=np.int32)
+    return pd.Categorical.from_codes(codes, categories=cats)
+
+
+def _concat_numeric(arrays):
+    """
+    Concatenate the arrays of several partitions, in the smallest common dtype that holds them without loss
+    (int32 and float32 partitions stay float32 while the integers are exact in float32)
+    :param arrays: list of numpy arrays
+    :return: numpy array
+    """
+    dtypes = set(arr.dtype for arr in arrays)
+    if dtypes == {np.dtype('int32'), np.dtype('float32')}:
+        int_max = max(np.abs(arr).max(initial=0) for arr in arrays if arr.dtype == np.int32)
+        if int_max < 2 ** 24:
+            return np.concatenate(arrays).astype(np.float32, copy=False)
+        return np.concatenate([arr.astype(np.float64) for arr in arrays])
+    return np.concatenate(arrays)
+
+
+def _rows(part_dir, part, start, end, countries):
+    """
+    The rows of a partition within the date range and countries
+    :return: slice, or boolean array
+    """
+    rows = slice(None)
+    if start is not None or end is not None:
+        dates = np.load(os.path.join(part_dir, 'Date.npy'), mmap_mode='r')    # sorted by date
+        first = 0 if start is None else np.searchsorted(dates, np.datetime64(start, 'D'), 'left')
+        last = len(dates) if end is None else np.searchsorted(dates, np.datetime64(end, 'D'), 'right')
+        rows = slice(first, last)
+    if countries is not None:
+        with open(os.path.join(part_dir, 'Country_Region.json')) as file:
+            cats = json.load(file)
+        wanted = [cats.index(cc) for cc in countries if cc in cats]
+        codes = np.load(os.path.join(part_dir, 'Country_Region.npy'), mmap_mode='r')
+        mask = np.zeros(part['rows'], dtype=bool)
+        mask[rows] = np.isin(codes[rows], wanted)
+        rows = mask
+    return rows
+
+
+@prof.timed('store.read')
+def read(columns=None, start=None, end=None, countries=None, path=STORE_DIR):
+    """
+    Read the cleaned data from the store
+    :param columns: list of column names (None --> all columns)
+    :param start: date (None --> from the first date)
+    :param end: date, inclusive (None --> up to the last date)
+    :param countries: list of Country_Region names (None --> all countries)
+    :param path: string (store directory)
+    :return: DataFrame
+    """
+    manifest = read_manifest(path)
+    kinds = manifest['columns']
+    if columns is None:
+        columns = list(kinds)
+    if start is not None:
+        start = pd.Timestamp(start).date()
+    if end is not None:
+        end = pd.Timestamp(end).date()
+
+    arrays = {col: [] for col in columns}
+    for key in sorted(manifest['partitions']):
+        part = manifest['partitions'][key]
+        if (start is not None and part['last'] < start.isoformat()) or (end is not None and part['first'] > end.isoformat()):
+            continue                                                # partition out of the date range
+        part_dir = os.path.join(path, key)
+        rows = _rows(part_dir, part, start, end, countries)
+        for col in columns:
+            arrays[col].append(_read_column(part_dir, col, kinds[col], rows))
+
+    data = {}
+    for col in columns:
+        if kinds[col] == 'str':
+            data[col] = _concat_categorical(arrays[col])
+        elif arrays[col]:
+            data[col] = _concat_numeric(arrays[col])
+        else:
+            data[col] = np.array([], dtype='datetime64[ns]' if kinds[col] == 'date' else 'float64')
+    return pd.DataFrame(data, columns=columns)
+
+
+@prof.timed('store.append')
+def append(df, path=STORE_DIR, sources=None):
+    """
+    Add cleaned data to the store. Only the partitions (months) of the new dates are rewritten;
+    rows of a date already in the store are replaced
+    :param df: DataFrame (cleaned data, with a 'Date' column)
+    :param path: string (store directory)
+    :param sources: dict {iso-date: content hash of the raw file} (recorded in the manifest, with the data)
+    :return: None
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = read_manifest(path)
+    kinds = manifest['columns']
+    for col in df.columns:
+        if col not in kinds:
+            kinds[col] = _kind(df[col])
+
+    df = df.reindex(columns=list(kinds)).assign(Date=pd.to_datetime(df['Date']))
+    months = df['Date'].values.astype('datetime64[M]')
+    for month in np.unique(months):
+        key = str(month)                                            # 'YYYY-MM'
+        new = df[months == month]
+        part = manifest['partitions'].get(key)
+        if part is not None:                                        # merge with the stored month
+            old = read(start=part['first'], end=part['last'], path=path)
+            old = old[~old['Date'].isin(new['Date'])]
+            merged = pd.concat([old, new], ignore_index=True)
+            for col, kind in kinds.items():
+                if kind == 'num':                                   # keep the compact dtypes
+                    merged[col] = _concat_numeric([old[col].to_numpy(), new[col].to_numpy()])
+            new = merged
+        new = new.iloc[np.argsort(new['Date'].values, kind='stable')]
+        _write_partition(new, kinds, os.path.join(path, key))
+        part_dates = new['Date']
+        manifest['partitions'][key] = {'first': part_dates.min().date().isoformat(),
+                                       'last': part_dates.max().date().isoformat(),
+                                       'rows': len(new)}
+
+    if sources:
+        manifest.setdefault('sources', {}).update(sources)
+    manifest['data_version'] = manifest.get('data_version', manifest['version']) + 1
+    manifest['version'] += 1
+    _write_manifest(manifest, path)
+
+
+def source_hashes(path=STORE_DIR):
+    """
+    The content hash of the raw file each date was cleaned from
+    :param path: string (store directory)
+    :return: dict {iso-date: string}, or None for a store written before they were recorded
+    """
+    return read_manifest(path).get('sources')
+
+
+def write(df, path=STORE_DIR, sources=None):
+    """
+    Replace the whole store with the given data
+    :param df: DataFrame (cleaned data)
+    :param path: string (store directory)
+    :param sources: dict {iso-date: content hash of the raw file}
+    :return: None
+    """
+    old_version, old_data_version = version(path), data_version(path)     # the aggregates under it are deleted too
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    _write_manifest({'version': old_version, 'data_version': old_data_version, 'columns': {}, 'partitions': {}}, path)
+    append(df, path, sources)
+
+
+def convert_pickle(pickle_path='cleaned_data.p', path=STORE_DIR):
+    """
+    Convert the cleaned data pickle (a single DataFrame, or a sequence of pickled DataFrames) to the store
+    :param pickle_path: string
+    :param path: string (store directory)
+    :return: None
+    """
+    df_list = []
+    with open(pickle_path, 'rb') as file:
+        while True:
+            try:
+                df_list.append(pickle.load(file))
+            except EOFError:
+                break
+    write(pd.concat(df_list), path)
+    print('Converted', pickle_path, 'to', path, '(' + str(sum(len(df) for df in df_list)), 'rows)')
+
+
+if __name__ == '__main__':
+    convert_pickle(*sys.argv[1:])
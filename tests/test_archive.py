@@ -0,0 +1,161 @@
+#-------------------------------------------------------------------------------
+# Tests of the archive format of the raw-data cache (oveds_archive, oveds_raw): every daily file must
+# come back byte for byte, and read into the same DataFrame as pandas.read_csv reads it.
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import io
+import os
+import sys
+from datetime import date
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import oveds_archive as archive
+import oveds_raw as raw
+
+HEADER = 'FIPS,Admin2,Province_State,Country_Region,Last_Update,Lat,Long_,Confirmed,Deaths,Recovered,Active,' \
+         'Combined_Key,Incidence_Rate,Case-Fatality_Ratio'
+ROWS = ['45001,Abbeville,South Carolina,US,2020-06-01 02:33:46,34.22,-82.46,95,0,0,95,'
+        '"Abbeville, South Carolina, US",387.32,0.0',
+        ',,,Afghanistan,2020-06-01 02:33:46,33.93911,67.709953,15205,257,1328,13620,Afghanistan,39.06,1.69',
+        ',,Île-de-France,France,2020-06-01 02:33:46,48.8499,2.637,NA,,0,,"Île-de-France, France",,']
+
+QUIRKS = {
+    'plain': '\n'.join([HEADER] + ROWS) + '\n',
+    'bom': '\ufeff' + '\n'.join([HEADER] + ROWS) + '\n',
+    'crlf': '\r\n'.join([HEADER] + ROWS) + '\r\n',
+    'no final line end': '\n'.join([HEADER] + ROWS),
+    'exponent and signed zero': 'Country_Region,Confirmed,Deaths\nA,1e2,-0\nB,100,0\n',
+    'leading zeros': 'Country_Region,Confirmed\nA,007\nB,1.50\n',
+    'empty fields': 'FIPS,Country_Region,Confirmed\n,,\n1,B,\n',
+    'na tokens': 'Country_Region,Confirmed,Deaths\nNA,N/A,null\nB,1,2\n',
+    'quoted fields': 'Country_Region,Note\n"Korea, South","said ""hi"""\n"multi\nline",x\n',
+    'unicode': 'Country_Region,Province_State,Confirmed\nCôte d\'Ivoire,Abidjan,3\n中国,湖北,68000\n',
+    'header only': HEADER + '\n',
+}
+IRREGULAR = {
+    'ragged row': 'Country_Region,Confirmed\nA,1\nB\n'.encode('utf-8'),
+    'repeated column': 'Country_Region,Confirmed,Confirmed\nA,1,2\n'.encode('utf-8'),
+    'not utf-8': 'Country_Region,Province_State,Confirmed\nFrance,Île-de-France,3\n'.encode('latin-1'),
+}
+
+
+def _roundtrip(content, locations, predictor=None):
+    """
+    :return: tuple (arrays, Day decoded from them)
+    """
+    predictor = predictor or archive.Predictor()
+    arrays, after = archive.encode(content, locations, predictor)
+    return arrays, archive.Day(arrays, locations, predictor.copy())
+
+
+def _verbatim(arrays):
+    return 'verbatim' in arrays
+
+
+@pytest.mark.parametrize('name', sorted(QUIRKS))
+def test_content_roundtrip(name, tmp_path):
+    content = QUIRKS[name].encode('utf-8')
+    arrays, day = _roundtrip(content, archive.Locations(str(tmp_path)))
+    assert day.content() == content
+
+
+@pytest.mark.parametrize('name', sorted(QUIRKS))
+def test_frame_as_read_csv(name, tmp_path):
+    content = QUIRKS[name].encode('utf-8')
+    arrays, day = _roundtrip(content, archive.Locations(str(tmp_path)))
+    expected = pd.read_csv(io.BytesIO(content), encoding='utf-8-sig')
+    pd.testing.assert_frame_equal(day.frame(), expected)
+
+
+@pytest.mark.parametrize('name', ['plain', 'bom', 'crlf', 'no final line end', 'unicode'])
+def test_regular_files_not_verbatim(name, tmp_path):
+    arrays, day = _roundtrip(QUIRKS[name].encode('utf-8'), archive.Locations(str(tmp_path)))
+    assert not _verbatim(arrays)
+
+
+@pytest.mark.parametrize('name', sorted(IRREGULAR))
+def test_verbatim_fallback(name, tmp_path):
+    content = IRREGULAR[name]
+    locations = archive.Locations(str(tmp_path))
+    predictor = archive.Predictor()
+    arrays, after = archive.encode(content, locations, predictor)
+    assert _verbatim(arrays)
+    assert after is predictor                                       # a verbatim day is not predicted from
+    assert archive.Day(arrays, locations, archive.Predictor()).content() == content
+
+
+def test_verbatim_when_not_rebuilt(tmp_path, monkeypatch):
+    """A day that does not come out the same when decoded is kept verbatim"""
+    content = QUIRKS['plain'].encode('utf-8')
+    monkeypatch.setattr(archive, '_join', lambda header, fields, text_format: b'')
+    arrays, day = _roundtrip(content, archive.Locations(str(tmp_path)))
+    assert _verbatim(arrays)
+    assert day.content() == content
+
+
+def test_days_of_a_month(tmp_path):
+    """Days are decoded after the ones before them, from the files and the saved locations"""
+    rng = np.random.default_rng(1)
+    confirmed = np.cumsum(rng.integers(0, 50, size=(6, 20)), axis=0)
+    contents = []
+    for day in range(6):
+        rows = ['C%d,%d,%d,%.2f' % (loc, confirmed[day, loc], confirmed[day, loc] // 10,
+                                    100 * (confirmed[day, loc] // 10) / max(confirmed[day, loc], 1))
+                for loc in range(20 - day % 2)]                     # a location is missing every other day
+        contents.append(('Country_Region,Confirmed,Deaths,Case-Fatality_Ratio\n' + '\n'.join(rows) + '\n').encode())
+    locations = archive.Locations(str(tmp_path))
+    predictor = archive.Predictor()
+    for day, content in enumerate(contents):
+        arrays, predictor = archive.encode(content, locations, predictor)
+        assert not _verbatim(arrays)
+        archive.write(str(tmp_path / ('%d.npz' % day)), arrays, locations)
+
+    locations = archive.Locations(str(tmp_path))
+    predictor = archive.Predictor()
+    for day, content in enumerate(contents):
+        assert archive.read(str(tmp_path / ('%d.npz' % day)), locations, predictor).content() == content
+
+
+def test_state(tmp_path):
+    locations = archive.Locations(str(tmp_path))
+    arrays, predictor = archive.encode(QUIRKS['plain'].encode(), locations, archive.Predictor())
+    archive.write_state(str(tmp_path / 'state.npz'), date(2020, 6, 1), predictor)
+    the_date, state = archive.read_state(str(tmp_path / 'state.npz'))
+    assert the_date == date(2020, 6, 1)
+    assert np.array_equal(state.ids, predictor.ids)
+    assert sorted(state.previous) == sorted(predictor.previous)
+    for name, (last, before) in predictor.previous.items():
+        assert np.array_equal(state.previous[name][0], last) and np.array_equal(state.previous[name][1], before)
+    assert archive.read_state(str(tmp_path / 'none.npz')) == (None, None)
+
+
+def test_cache_add_and_revise(tmp_path):
+    """Days added at the end, in the middle, and revised, all come back (raw cache)"""
+    path = str(tmp_path)
+    content = {day: '\n'.join([HEADER] + [row.replace('95', str(95 + day)) for row in ROWS]).encode()
+               for day in range(1, 8)}
+    raw.add({date(2020, 6, day): content[day] for day in [1, 2, 3, 5]}, path)
+    raw.add({date(2020, 6, 6): content[6]}, path)                   # after the last day
+    raw.add({date(2020, 6, 4): content[4]}, path)                   # in the middle
+    raw.add({date(2020, 6, 2): content[7]}, path)                   # revised
+    raw.add({date(2020, 6, 7): content[7], date(2020, 7, 1): content[1]}, path)
+    expected = dict(content)
+    expected[2] = content[7]
+    for the_date in raw.dates(path):
+        wanted = content[1] if the_date.month == 7 else expected[the_date.day]
+        assert raw.get(the_date, path) == wanted
+        assert raw.hashes(path)[the_date.isoformat()] == raw.content_hash(wanted)
+
+
+def test_cache_not_utf8(tmp_path):
+    """A daily file that is not UTF-8 is cached verbatim, and does not stop the others"""
+    path = str(tmp_path)
+    content = {date(2020, 6, 1): QUIRKS['plain'].encode('utf-8'), date(2020, 6, 2): IRREGULAR['not utf-8']}
+    raw.add(content, path)
+    for the_date in content:
+        assert raw.get(the_date, path) == content[the_date]
@@ -0,0 +1,97 @@
+#-------------------------------------------------------------------------------
+# Tests of the headless batch mode (oveds_batch), on a store cleaned from synthetic daily files
+# (benchmarks.synth): every report of a spec is rendered to its own files.
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import os
+import sys
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks import synth
+import oveds_raw as raw
+import oveds_store as store
+import oveds_data as ds
+import oveds_accs as oda
+import oveds_batch as batch
+
+DAYS = 40
+
+
+@pytest.fixture(scope='module')
+def cleaned(tmp_path_factory):
+    """
+    :return: string (the directory of the raw data and the store, cleaned from the synthetic files)
+    """
+    mirror = str(tmp_path_factory.mktemp('mirror'))
+    synth.write(mirror, 1, DAYS)
+    found = {}
+    for file_name in os.listdir(mirror):
+        with open(os.path.join(mirror, file_name), 'rb') as file:
+            found[pd.to_datetime(file_name[:10], format='%m-%d-%Y').date()] = file.read()
+    work = tmp_path_factory.mktemp('work')
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        raw.add(found)
+        oda.clean_data(incremental=False)
+    finally:
+        os.chdir(cwd)
+    return str(work)
+
+
+def _render(cleaned, out_dir, reports, monkeypatch):
+    """
+    :return: tuple (list of failed renders, the date of the latest data)
+    """
+    monkeypatch.chdir(cleaned)
+    monkeypatch.setattr(oda, 'output_dir', out_dir)                 # for output_path, in this process
+    spec = {'output': out_dir, 'format': 'csv', 'reports': reports}
+    errors = batch.run(spec, workers=1, path=os.path.join(cleaned, store.STORE_DIR))
+    return errors, ds.Dataset(os.path.join(cleaned, store.STORE_DIR)).latest()
+
+
+def test_top_countries_table_and_plot(cleaned, tmp_path, monkeypatch):
+    out_dir = str(tmp_path / 'reports')
+    errors, latest = _render(cleaned, out_dir, [{'report': 'top_countries', 'top': 10, 'options': ['Deaths']}],
+                             monkeypatch)
+    assert errors == []
+    title = 'Deaths for top-10 countries, as of ' + latest.strftime('%d-%B-%Y')
+    table = pd.read_csv(oda.output_path(title + ' (table)', 'csv'), index_col=0)
+    plot = pd.read_csv(oda.output_path(title, 'csv'), index_col=0)
+    assert len(table) == 10 and {'Confirmed', 'Deaths'} <= set(table.columns)
+    assert len(plot) == 10 and list(plot.index) == list(table.index)
+    assert os.path.exists(oda.output_path('Deaths per million of top-10 countries, as of ' +
+                                          latest.strftime('%d-%B-%Y'), 'csv'))
+
+
+def test_region_report(cleaned, tmp_path, monkeypatch):
+    """Of the default area, and of a given one"""
+    out_dir = str(tmp_path / 'reports')
+    monkeypatch.setattr(batch, 'REGION', {'lat': 40.71, 'lon': -74.01, 'km': 3000})    # (random synthetic locations)
+    reports = [{'report': 'region_report', 'options': ['Confirmed']},
+               {'report': 'region_report', 'lat': 51.5, 'lon': -0.13, 'km': 2000, 'options': ['Deaths']}]
+    errors, latest = _render(cleaned, out_dir, reports, monkeypatch)
+    assert errors == []
+    for option, region in [('Confirmed', batch.REGION), ('Deaths', {'lat': 51.5, 'lon': -0.13, 'km': 2000})]:
+        where = 'within %g km of (%g, %g)' % (region['km'], region['lat'], region['lon'])
+        assert os.path.exists(oda.output_path('Locations ' + where + ' as of ' + latest.strftime('%d-%B-%Y'), 'csv'))
+        assert os.path.exists(oda.output_path(option + ' for locations ' + where + ', as of ' +
+                                              latest.strftime('%d-%B-%Y'), 'csv'))
+
+
+def test_ranking_changes(cleaned, tmp_path, monkeypatch):
+    out_dir = str(tmp_path / 'reports')
+    reports = [{'report': 'ranking_changes', 'top': 10, 'days': 7, 'options': ['Confirmed']}]
+    errors, latest = _render(cleaned, out_dir, reports, monkeypatch)
+    assert errors == []
+    before = latest - pd.Timedelta(days=7)
+    name = 'Confirmed'
+    table = pd.read_csv(oda.output_path('Top-10 countries in ' + name + ', as of ' + latest.strftime('%d-%B-%Y') +
+                                        ', vs ' + before.strftime('%d-%B-%Y'), 'csv'), index_col=0)
+    plot = pd.read_csv(oda.output_path('Rank in ' + name + ' of the top-10 countries, ' + before.strftime('%d-%B-%Y') +
+                                       ' to ' + latest.strftime('%d-%B-%Y'), 'csv'), index_col=0)
+    assert len(table) == 10 and sorted(plot.columns) == sorted(table.index)
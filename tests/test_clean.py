@@ -0,0 +1,167 @@
+#-------------------------------------------------------------------------------
+# Tests of the cleaning (oveds_accs.clean_data) on synthetic daily files (benchmarks.synth): cleaning
+# the days as they come in must give the same store, cube and derived series as cleaning them all
+# at once; and so must re-cleaning a revised past day, cleaning in small batches, or with a pool of workers.
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import os
+import sys
+from datetime import timedelta
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks import synth
+import oveds_raw as raw
+import oveds_store as store
+import oveds_cube as cube
+import oveds_derive as derive
+import oveds_accs as oda
+
+DAYS = 75                       # from 22-Jan-2020: three file layouts, and three months
+FIRST_BATCH = 50                # days cleaned before the others come in
+ONE_BY_ONE = 6                  # the last days, cleaned a day at a time
+REVISED = 45                    # the day revised after it was cleaned
+
+
+@pytest.fixture(scope='module')
+def contents(tmp_path_factory):
+    """
+    :return: dict {date: bytes (the CSV content of a synthetic daily file)}
+    """
+    mirror = str(tmp_path_factory.mktemp('mirror'))
+    synth.write(mirror, 1, DAYS)
+    found = {}
+    for file_name in sorted(os.listdir(mirror)):
+        with open(os.path.join(mirror, file_name), 'rb') as file:
+            found[pd.to_datetime(file_name[:10], format='%m-%d-%Y').date()] = file.read()
+    return found
+
+
+def _revised(content):
+    """
+    :return: bytes (the content of a daily file, with other counts)
+    """
+    lines = content.decode().split('\n')
+    revised = '\n'.join(lines[:1] + [line.replace(',1', ',2') for line in lines[1:]]).encode()
+    assert revised != content
+    return revised
+
+
+def _cleaned():
+    """
+    :return: dict {name: DataFrame} (the store, and the cube and derived series of every level)
+    """
+    frames = {'store': store.read()}
+    for level in cube.LEVELS:
+        frames['cube.' + level] = cube.read(level)
+        frames['derived.' + level] = derive.read(level)
+    return frames
+
+
+def _assert_same(cleaned, expected):
+    assert sorted(cleaned) == sorted(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(cleaned[name].reset_index(drop=True), expected[name].reset_index(drop=True),
+                                      obj=name)
+
+
+def _rebuilt(contents, work_dir, revised=False):
+    """
+    :param revised: Boolean (the REVISED day with other counts)
+    :return: dict {name: DataFrame} (see _cleaned), all the days cleaned at once
+    """
+    days = sorted(contents)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        raw.add(contents)
+        if revised:
+            raw.add({days[REVISED]: _revised(contents[days[REVISED]])})
+        oda.clean_data(incremental=False)
+        return _cleaned()
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope='module')
+def rebuilt(contents, tmp_path_factory):
+    return _rebuilt(contents, tmp_path_factory.mktemp('rebuilt'))
+
+
+@pytest.fixture(scope='module')
+def rebuilt_revised(contents, tmp_path_factory):
+    return _rebuilt(contents, tmp_path_factory.mktemp('rebuilt_revised'), revised=True)
+
+
+def test_incremental_as_rebuild(contents, rebuilt, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    days = sorted(contents)
+    raw.add({the_date: contents[the_date] for the_date in days[:FIRST_BATCH]})
+    oda.clean_data()
+    raw.add({the_date: contents[the_date] for the_date in days[FIRST_BATCH:-ONE_BY_ONE]})
+    oda.clean_data()
+    for the_date in days[-ONE_BY_ONE:]:
+        raw.add({the_date: contents[the_date]})
+        oda.clean_data()
+    assert store.watermark() == days[-1]
+    _assert_same(_cleaned(), rebuilt)
+
+
+def test_incremental_new_months(contents, rebuilt, tmp_path, monkeypatch):
+    """New days that start a month"""
+    monkeypatch.chdir(tmp_path)
+    days = sorted(contents)
+    first = [the_date for the_date in days if the_date < days[-1] - timedelta(20)]
+    raw.add({the_date: contents[the_date] for the_date in first})
+    oda.clean_data()
+    raw.add({the_date: contents[the_date] for the_date in days[len(first):]})
+    oda.clean_data()
+    _assert_same(_cleaned(), rebuilt)
+
+
+def test_revised_as_rebuild(contents, rebuilt_revised, tmp_path, monkeypatch):
+    """A past day revised after it was cleaned is re-cleaned"""
+    monkeypatch.chdir(tmp_path)
+    days = sorted(contents)
+    raw.add(contents)
+    oda.clean_data()
+    raw.add({days[REVISED]: _revised(contents[days[REVISED]])})
+    oda.clean_data()
+    assert store.watermark() == days[-1]
+    _assert_same(_cleaned(), rebuilt_revised)
+
+
+def test_revised_then_new_months(contents, rebuilt_revised, tmp_path, monkeypatch):
+    """New days that start a month, after the revised one was cleaned"""
+    monkeypatch.chdir(tmp_path)
+    days = sorted(contents)
+    first = [the_date for the_date in days if the_date < days[-1] - timedelta(20)]
+    raw.add({the_date: contents[the_date] for the_date in first})
+    oda.clean_data()
+    raw.add({days[REVISED]: _revised(contents[days[REVISED]])})
+    oda.clean_data()
+    raw.add({the_date: contents[the_date] for the_date in days[len(first):]})
+    oda.clean_data()
+    _assert_same(_cleaned(), rebuilt_revised)
+
+
+@pytest.mark.parametrize('budget_mb', [1, 2])
+def test_batches(contents, rebuilt, tmp_path, monkeypatch, budget_mb):
+    """Cleaned in batches of a few days, each written to the store before the next"""
+    monkeypatch.chdir(tmp_path)
+    raw.add(contents)
+    assert len(list(oda.batches(raw.dates(), budget_mb))) > 2
+    oda.clean_data(incremental=False, budget_mb=budget_mb, workers=1)
+    _assert_same(_cleaned(), rebuilt)
+
+
+@pytest.mark.parametrize('workers, budget_mb', [(2, None), (3, 2)])
+def test_workers(contents, rebuilt, tmp_path, monkeypatch, workers, budget_mb):
+    """Cleaned in a pool of workers, in one batch or in several"""
+    monkeypatch.chdir(tmp_path)
+    raw.add(contents)
+    oda.clean_data(incremental=False, budget_mb=budget_mb, workers=workers)
+    _assert_same(_cleaned(), rebuilt)
@@ -0,0 +1,64 @@
+#-------------------------------------------------------------------------------
+# Tests of the derived series (oveds_derive.derive): the daily changes are taken between calendar days,
+# also when a location is missing on some days.
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import oveds_derive as derive
+
+WINDOW = derive.WINDOW
+
+
+def _cube(countries, days=20, missing=()):
+    """
+    :param countries: list of names
+    :param missing: collection of (country, day number) not in the cube
+    :return: DataFrame (a 'country' level of the cube, in no particular order; Confirmed grows by 10 + day a day)
+    """
+    rows = []
+    for country in countries:
+        for day in range(days):
+            if (country, day) not in missing:
+                confirmed = 100 + sum(10 + d for d in range(1, day + 1))
+                rows.append({'Date': pd.Timestamp('2020-04-01') + pd.Timedelta(days=day), 'Country_Region': country,
+                             'Confirmed': confirmed, 'Deaths': confirmed // 10, 'Recovered': 0, 'Active': confirmed})
+    return pd.DataFrame(rows).sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def _series(df, country, col):
+    rows = df[df['Country_Region'] == country].sort_values('Date')
+    return pd.Series(rows[col].to_numpy(), index=(rows['Date'] - pd.Timestamp('2020-04-01')).dt.days)
+
+
+def test_consecutive_days():
+    df = derive.derive(_cube(['A', 'B']), 'country')
+    new = _series(df, 'A', 'New_Confirmed')
+    assert np.isnan(new.loc[0])
+    assert (new.loc[1:] == 10 + new.index[1:]).all()
+    avg = _series(df, 'B', 'Avg_Confirmed')
+    assert avg.loc[:WINDOW - 1].isna().all()
+    assert np.allclose(avg.loc[WINDOW:], [10 + day - (WINDOW - 1) / 2 for day in avg.index[WINDOW:]])
+
+
+def test_missing_day():
+    gap = 10
+    df = derive.derive(_cube(['A', 'B'], missing={('A', gap)}), 'country')
+    assert gap not in _series(df, 'A', 'New_Confirmed').index
+    new = _series(df, 'A', 'New_Confirmed')
+    assert np.isnan(new.loc[gap + 1])                               # not the change over two days
+    assert new.loc[gap + 2] == 10 + gap + 2
+    avg = _series(df, 'A', 'Avg_Confirmed')
+    assert avg.loc[gap + 1:gap + WINDOW].isna().all()               # a change of the window is missing
+    assert not np.isnan(avg.loc[gap + WINDOW + 1])
+    growth = _series(df, 'A', 'Growth_Confirmed')
+    assert np.isnan(growth.loc[gap + WINDOW])                       # from the missing day
+    assert not np.isnan(growth.loc[gap + WINDOW + 1])
+    pd.testing.assert_series_equal(_series(df, 'B', 'Avg_Confirmed'),
+                                   _series(derive.derive(_cube(['B']), 'country'), 'B', 'Avg_Confirmed'))
@@ -0,0 +1,63 @@
+#-------------------------------------------------------------------------------
+# Tests of the query API (oveds_query), on a store cleaned from synthetic daily files (benchmarks.synth).
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import os
+import sys
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks import synth
+import oveds_raw as raw
+import oveds_store as store
+import oveds_data as ds
+import oveds_accs as oda
+import oveds_query as query
+
+DAYS = 30
+COLUMNS = ['Date', 'Rank', 'Country_Region', 'Deaths']
+
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    """
+    :return: Dataset (of a store cleaned from the synthetic files)
+    """
+    mirror = str(tmp_path_factory.mktemp('mirror'))
+    synth.write(mirror, 1, DAYS)
+    found = {}
+    for file_name in os.listdir(mirror):
+        with open(os.path.join(mirror, file_name), 'rb') as file:
+            found[pd.to_datetime(file_name[:10], format='%m-%d-%Y').date()] = file.read()
+    work = tmp_path_factory.mktemp('work')
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        raw.add(found)
+        oda.clean_data(incremental=False)
+    finally:
+        os.chdir(cwd)
+    return ds.Dataset(os.path.join(str(work), store.STORE_DIR))
+
+
+def test_rank_history_as_rank(data):
+    history = query.rank_history(data, 'Deaths', k=5)
+    assert list(history.columns) == COLUMNS
+    latest = data.latest()
+    now = history[history['Date'] == latest]
+    assert list(now['Country_Region']) == list(query.rank(data, 'Deaths', latest, k=5).index)
+    assert list(now['Rank']) == list(range(1, len(now) + 1))
+
+
+def test_rank_history_none(data, monkeypatch):
+    """k=0, or no countries: no rows, the same columns"""
+    empty = query.rank_history(data, 'Deaths', k=0)
+    assert list(empty.columns) == COLUMNS and len(empty) == 0
+    cube = data.cube('country')
+    monkeypatch.setattr(data, 'cube', lambda level: cube.iloc[:0])
+    monkeypatch.setattr(data, 'version', -1)                       # not the cached matrix
+    none = query.rank_history(data, 'Deaths', k=10)
+    assert list(none.columns) == COLUMNS and len(none) == 0
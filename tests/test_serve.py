@@ -0,0 +1,43 @@
+#-------------------------------------------------------------------------------
+# Tests of the HTTP server (oveds_serve): the scheduled update brings new daily files (from a local
+# mirror of synthetic files, benchmarks.synth) into the raw cache and the store of the server.
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import os
+import sys
+import time
+import asyncio
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks import synth
+import oveds_raw as raw
+import oveds_store as store
+import oveds_serve as serve
+
+DAYS = 20
+TIMEOUT = 120                   # seconds, for the update to clean the days
+
+
+async def _first_update(server):
+    task = asyncio.create_task(server.update())
+    start = time.monotonic()
+    while not (store.exists(server.path) and store.watermark(server.path)) and time.monotonic() - start < TIMEOUT:
+        await asyncio.sleep(0.2)
+    task.cancel()
+
+
+def test_update_to_the_served_store(tmp_path, monkeypatch):
+    mirror = str(tmp_path / 'mirror')
+    synth.write(mirror, 1, DAYS)
+    monkeypatch.setenv('OVEDS_SOURCE', mirror)
+    monkeypatch.setenv('OVEDS_SOURCE_TYPE', 'daily')
+    work = tmp_path / 'cwd'
+    work.mkdir()
+    monkeypatch.chdir(work)
+    server = serve.Server(str(tmp_path / 'served'), update_minutes=60, raw_path=str(tmp_path / 'raw'))
+    asyncio.run(_first_update(server))
+    assert len(raw.dates(server.raw_path)) == DAYS
+    assert store.watermark(server.path) == raw.dates(server.raw_path)[-1]
+    assert os.listdir(str(work)) == []                              # nothing in the default directories
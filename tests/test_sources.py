@@ -0,0 +1,52 @@
+#-------------------------------------------------------------------------------
+# Tests of the sources of the raw data (oveds_sources), on synthetic files (benchmarks.synth).
+#
+# Usage:  python -m pytest tests
+#-------------------------------------------------------------------------------
+import io
+import os
+import sys
+from datetime import date
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+from benchmarks import synth
+import oveds_sources as sources
+
+DAYS = 40
+COUNTRY = 'China'               # a country with provinces in the synthetic files
+
+
+def test_source_needs_fetch():
+    class NoFetch(sources.Source):
+        pass
+
+    with pytest.raises(TypeError):
+        NoFetch()
+
+
+def test_time_series_recovered_by_country(tmp_path):
+    """Recovered given for a country as a whole, the other counts by province (as Canada in the JHU files)"""
+    synth.write_time_series(str(tmp_path), 1, DAYS)
+    recovered_file = os.path.join(str(tmp_path), sources.TIME_SERIES_FILES['Recovered'])
+    recovered = pd.read_csv(recovered_file)
+    by_country = recovered['Country/Region'] == COUNTRY
+    assert recovered.loc[by_country, 'Province/State'].notna().sum() > 1
+    national = recovered[by_country].groupby('Country/Region', as_index=False).sum(numeric_only=True)
+    national.insert(0, 'Province/State', None)
+    national[['Lat', 'Long']] = [56.13, -106.35]
+    pd.concat([recovered[~by_country], national[recovered.columns]]).to_csv(recovered_file, index=False)
+
+    found = sources.TimeSeries(str(tmp_path)).fetch(date(2020, 1, 22), date(2020, 3, 2))
+    last = max(found)
+    day = pd.read_csv(io.BytesIO(found[last]))
+    provinces = day[(day['Country_Region'] == COUNTRY) & day['Province_State'].notna()]
+    whole = day[(day['Country_Region'] == COUNTRY) & day['Province_State'].isna()]
+    assert len(provinces) > 1 and provinces['Confirmed'].notna().all()
+    assert provinces['Recovered'].isna().all()
+    header = '%d/%d/%s' % (last.month, last.day, last.strftime('%y'))
+    assert len(whole) == 1 and whole['Recovered'].iloc[0] == national[header].iloc[0]
+    assert whole['Confirmed'].isna().all() and whole['Lat'].iloc[0] == 56.13
+    assert (day['Country_Region'] != COUNTRY).sum() > 0 and day['Recovered'].notna().sum() > len(whole)